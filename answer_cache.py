@@ -0,0 +1,156 @@
+"""
+Caché semántica de respuestas RAG (ask, chat) por colección (opt-in).
+
+    collections:
+      proyectos:
+        answer_cache:
+          enabled: true
+          threshold: 0.95     # similitud coseno mínima entre preguntas
+          ttl: 86400          # segundos
+          max_entries: 500    # se descartan las menos usadas
+
+Una respuesta se reutiliza solo si, además de una pregunta parecida
+(embedding con similitud >= threshold), coinciden:
+  - los documentos recuperados (hash de sus ids, en orden),
+  - los filtros y el modelo de chat,
+  - la versión del índice de la colección (metadata_index.index_version):
+    reindexar invalida todas las respuestas de la colección.
+
+Las entradas se guardan en <persist_directory>/_answer_cache/<coleccion>.json.
+Las escrituras (nueva respuesta, uso de un acierto) se hacen con el archivo
+bloqueado (file_lock) para que ask/chat concurrentes no se pisen.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from config import get_chroma_config, get_collection_config
+from file_lock import locked
+from metadata_index import index_version
+from metrics import incr
+
+_DEFAULTS = {"enabled": False, "threshold": 0.95, "ttl": 86400, "max_entries": 500}
+
+
+def get_answer_cache_settings(collection_name: str) -> Dict[str, Any]:
+    """Sección `answer_cache` de la colección (deshabilitada por defecto)."""
+    try:
+        cfg = get_collection_config(collection_name).get("answer_cache") or {}
+    except ValueError:
+        cfg = {}
+    return {**_DEFAULTS, **cfg}
+
+
+def _cache_path(collection_name: str) -> str:
+    return os.path.join(get_chroma_config()["persist_directory"], "_answer_cache", f"{collection_name}.json")
+
+
+def _load(collection_name: str) -> List[Dict[str, Any]]:
+    path = _cache_path(collection_name)
+    if not os.path.isfile(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save(collection_name: str, entries: List[Dict[str, Any]]) -> None:
+    path = _cache_path(collection_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(entries, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def context_key(results: List[Dict[str, Any]], filters: Optional[Dict[str, Any]], model: str) -> str:
+    """Hash de los ids recuperados (en orden), los filtros y el modelo."""
+    raw = json.dumps([[r["id"] for r in results], sorted((filters or {}).items()), model], default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _live(entries: List[Dict[str, Any]], version: str, ttl: float) -> List[Dict[str, Any]]:
+    now = time.time()
+    return [e for e in entries if e["index_version"] == version and now - e["created"] <= ttl]
+
+
+def lookup(collection_name: str, embedding: List[float], context: str,
+           settings: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Entrada vigente con el mismo contexto y la pregunta más parecida (>= threshold)."""
+    import numpy as np
+
+    settings = settings or get_answer_cache_settings(collection_name)
+    candidates = [
+        e for e in _live(_load(collection_name), index_version(collection_name), settings["ttl"])
+        if e["context"] == context
+    ]
+    if not candidates:
+        incr("answer_cache.misses")
+        return None
+    matrix = np.array([e["embedding"] for e in candidates], dtype=np.float32)
+    query = np.array(embedding, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+    similarities = (matrix @ query) / np.where(norms == 0, 1.0, norms)
+    best = int(np.argmax(similarities))
+    if similarities[best] < settings["threshold"]:
+        incr("answer_cache.misses")
+        return None
+
+    entry = candidates[best]
+    with locked(_cache_path(collection_name)):
+        entries = _load(collection_name)
+        for e in entries:
+            if e["created"] == entry["created"] and e["query"] == entry["query"]:
+                e["hits"] = e.get("hits", 0) + 1
+                e["last_used"] = time.time()
+        _save(collection_name, entries)
+    incr("answer_cache.hits")
+    return {**entry, "similarity": float(similarities[best])}
+
+
+def store(collection_name: str, query: str, embedding: List[float], context: str, answer: str,
+          settings: Optional[Dict[str, Any]] = None) -> None:
+    """Guarda una respuesta; descarta vencidas, de otra versión del índice y las menos usadas."""
+    settings = settings or get_answer_cache_settings(collection_name)
+    version = index_version(collection_name)
+    with locked(_cache_path(collection_name)):
+        now = time.time()
+        entries = _live(_load(collection_name), version, settings["ttl"])
+        entries.append({
+            "query": query,
+            "embedding": [round(float(v), 6) for v in embedding],
+            "context": context,
+            "index_version": version,
+            "answer": answer,
+            "created": now,
+            "last_used": now,
+            "hits": 0,
+        })
+        if len(entries) > settings["max_entries"]:
+            entries.sort(key=lambda e: e["last_used"])
+            entries = entries[len(entries) - settings["max_entries"]:]
+        _save(collection_name, entries)
+
+
+def replay(answer: str) -> Iterable[str]:
+    """Entrega una respuesta guardada por palabras, como el streaming del modelo."""
+    yield from re.findall(r"\S+\s*|\s+", answer)
+
+
+def clear(collection_name: Optional[str] = None) -> int:
+    """Vacía la caché de una colección (o de todas). Retorna las respuestas eliminadas."""
+    directory = os.path.join(get_chroma_config()["persist_directory"], "_answer_cache")
+    if not os.path.isdir(directory):
+        return 0
+    names = [collection_name] if collection_name else [f[:-5] for f in os.listdir(directory) if f.endswith(".json")]
+    removed = 0
+    for name in names:
+        path = _cache_path(name)
+        with locked(path):
+            if os.path.isfile(path):
+                removed += len(_load(name))
+                os.remove(path)
+    return removed
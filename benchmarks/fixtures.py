@@ -0,0 +1,154 @@
+"""
+Datos sintéticos para benchmarks: base DuckDB, CSV de documentación y
+collections.yaml apuntando a ambos y al stub de Ollama.
+
+Todo es determinista a partir de `seed`, de modo que dos corridas con los
+mismos parámetros indexan exactamente los mismos documentos.
+"""
+
+import os
+import random
+from typing import List
+
+import pandas as pd
+import yaml
+
+COLLECTION = "bench"
+
+CLIENTES = ["GECA", "ACME", "NORTE", "SUR", "DELTA"]
+MODULOS = ["embarques", "facturacion", "inventario", "contabilidad", "compras", "ventas"]
+DIMENSIONES = ["Status", "Type", "Currency", "Direction"]
+_DIM_VALUES = {
+    "Status": ["Open", "Closed", "Pending", "Cancelled", "Posted"],
+    "Type": ["Ocean", "Air", "Ground", "Courier"],
+    "Currency": ["USD", "EUR", "PAB", "MXN"],
+    "Direction": ["Import", "Export", "Domestic"],
+}
+_VOCAB = (
+    "embarque factura cargo cliente proveedor saldo moneda tasa documento nota credito "
+    "debito pago cobro inventario bodega articulo pedido orden compra venta impuesto "
+    "periodo cierre asiento cuenta contable centro costo proyecto contrato servicio "
+    "fecha estado tipo origen destino puerto aereo maritimo terrestre peso volumen "
+    "importe total neto bruto descuento recargo vencimiento aprobacion revision"
+).split()
+
+
+def fixture_tables(n_tables: int) -> List[str]:
+    return [f"bench_t{i:03d}" for i in range(n_tables)]
+
+
+def make_fixture_db(path: str, n_tables: int = 10, rows_per_table: int = 1000, seed: int = 42) -> None:
+    """Crea (o reemplaza) la base DuckDB usada como `sql_enrich`."""
+    import duckdb
+
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    conn = duckdb.connect(path)
+    try:
+        for table in fixture_tables(n_tables):
+            df = pd.DataFrame({
+                "id": range(rows_per_table),
+                "Number": [f"GC{rng.randint(10000, 99999)}" for _ in range(rows_per_table)],
+                "Status": [rng.choice(_DIM_VALUES["Status"]) for _ in range(rows_per_table)],
+                "Type": [rng.choice(_DIM_VALUES["Type"]) for _ in range(rows_per_table)],
+                "Currency": [rng.choice(_DIM_VALUES["Currency"]) for _ in range(rows_per_table)],
+                "Direction": [rng.choice(_DIM_VALUES["Direction"]) for _ in range(rows_per_table)],
+                "Amount": [round(rng.uniform(1, 10000), 2) for _ in range(rows_per_table)],
+                "CreatedOn": pd.date_range("2024-01-01", periods=rows_per_table, freq="h"),
+            })
+            conn.register("df_fixture", df)
+            conn.execute(f"CREATE TABLE {table} AS SELECT * FROM df_fixture")
+            conn.unregister("df_fixture")
+    finally:
+        conn.close()
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_VOCAB) for _ in range(words))
+
+
+def make_csv(path: str, n_rows: int = 1000, n_tables: int = 10, seed: int = 42) -> None:
+    """CSV con el mismo formato que proyectos_documentacion.csv."""
+    rng = random.Random(seed)
+    tables = fixture_tables(n_tables)
+    rows = []
+    for i in range(n_rows):
+        cliente = CLIENTES[i % len(CLIENTES)]
+        modulo = rng.choice(MODULOS)
+        dims = rng.sample(DIMENSIONES, rng.randint(1, len(DIMENSIONES)))
+        rows.append({
+            "id": f"regla_{i:06d}",
+            "cliente": cliente,
+            "proyecto": f"{cliente}-{modulo}",
+            "modulo": modulo,
+            "entidad": rng.choice(_VOCAB),
+            "tabla": rng.choice(tables),
+            "pk": "id",
+            "fk": "",
+            "dimensiones": ",".join(dims),
+            "campos_clave": "Number,Amount,CreatedOn",
+            "descripcion": _sentence(rng, 12),
+            "logica_negocio": _sentence(rng, 20),
+            "sql": "",
+            "supuestos": _sentence(rng, 8),
+            "notas": "",
+            "owner": "equipo",
+            "estado": "activo",
+            "version": "v1",
+            "fecha": "2026-01-01",
+            "tags": f"{modulo},{cliente.lower()}",
+        })
+    pd.DataFrame(rows).to_csv(path, index=False)
+
+
+def sample_queries(csv_path: str, n: int, seed: int = 7) -> List[dict]:
+    """Preguntas derivadas de filas del CSV (con el id esperado y su cliente)."""
+    rng = random.Random(seed)
+    df = pd.read_csv(csv_path)
+    picks = rng.sample(range(len(df)), min(n, len(df)))
+    queries = []
+    for i in picks:
+        row = df.iloc[i]
+        words = str(row["descripcion"]).split()
+        queries.append({
+            "query": " ".join(words[: max(4, len(words) // 2)]),
+            "expected_id": row["id"],
+            "cliente": row["cliente"],
+        })
+    return queries
+
+
+def write_config(path: str, base_url: str, chroma_dir: str, csv_path: str, db_path: str,
+                 dim_values: int = 20) -> None:
+    """collections.yaml de benchmark (una colección con CSV + enrichment DuckDB)."""
+    config = {
+        "ollama": {
+            "base_url": base_url,
+            "embedding_model": "nomic-embed-text",
+            "chat_model": "qwen2.5-coder:3b",
+        },
+        "chroma": {"persist_directory": chroma_dir},
+        "tracing": {"enabled": False},
+        "collections": {
+            COLLECTION: {
+                "sources": [{
+                    "name": "documentacion",
+                    "type": "csv",
+                    "path": csv_path,
+                    "sql_enrich": {
+                        "type": "duckdb",
+                        "path": db_path,
+                        "max_values": dim_values,
+                        "include_schema": True,
+                        "max_columns": 200,
+                    },
+                    "vectorize": ["entidad", "tabla", "dimensiones", "campos_clave", "descripcion",
+                                  "logica_negocio", "supuestos"],
+                    "metadata": ["id", "cliente", "proyecto", "entidad", "tabla", "modulo", "estado", "tags"],
+                }],
+            },
+        },
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f, sort_keys=False, allow_unicode=True)
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Benchmarks reproducibles sin Ollama ni MSSQL reales.
+
+Levanta el stub de Ollama (embeddings deterministas, latencias
+configurables), genera una base DuckDB como `sql_enrich` y un CSV sintético,
+escribe un collections.yaml temporal (BD_VECTORIAL_CONFIG) y corre:
+
+    index    throughput de indexación (extracción + enrichment + embeddings)
+    search   latencia p50/p95/p99 de search.search, con y sin filtro
+    rag      time-to-first-token y latencia total de search.ask_stream
+    schema   generación del caché de esquemas y búsqueda de una tabla
+
+Uso:
+    python benchmarks/run.py                              # todo, tamaño por defecto
+    python benchmarks/run.py --rows 5000 --queries 200    # más grande
+    python benchmarks/run.py --scenarios index,search     # solo algunos
+    python benchmarks/run.py --embed-ms 15 --first-token-ms 300 --token-ms 20
+    python benchmarks/run.py --output bench.json          # resultados JSON
+    python benchmarks/run.py --baseline bench.json        # comparar (exit 1 si empeora)
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from fixtures import COLLECTION, make_csv, make_fixture_db, sample_queries, write_config  # noqa: E402
+from stub_ollama import start_stub  # noqa: E402
+
+SCENARIOS = ["index", "search", "rag", "schema"]
+
+# (escenario, métrica, mayor_es_mejor) que se comparan contra --baseline
+_HEADLINE = [
+    ("index", "docs_per_s", True),
+    ("search", "p50_ms", False),
+    ("search", "p99_ms", False),
+    ("search", "filtered_p50_ms", False),
+    ("search", "filtered_p99_ms", False),
+    ("rag", "ttft_p50_ms", False),
+    ("rag", "ttft_p99_ms", False),
+    ("schema", "lookup_p99_ms", False),
+]
+
+
+def _quiet():
+    """Silencia los print de los módulos medidos."""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def bench_index(args, paths):
+    import metrics
+    from config import get_collection_config
+    from db_connector import fetch_source
+    from vector_store import clear_collection, index_source
+
+    source = get_collection_config(COLLECTION)["sources"][0]
+    metrics.reset()
+    with _quiet():
+        clear_collection(COLLECTION)
+        df = fetch_source(source)
+        index_source(df, COLLECTION, source, batch_size=args.batch_size)
+    data = metrics.summary()
+    counters = data["counters"]
+    return {
+        "rows": counters.get("rows.extracted", 0),
+        "docs": counters.get("docs.prepared", 0),
+        "seconds": data["wall_seconds"],
+        "docs_per_s": counters.get("docs.prepared", 0) / data["wall_seconds"],
+        "stages": {k: v["seconds"] for k, v in data["stages"].items()},
+        "counters": counters,
+    }
+
+
+def _latency_stats(histogram: str, prefix: str = ""):
+    """Percentiles (ms) de un histograma de metrics, con `prefix` en cada clave."""
+    import metrics
+
+    hist = metrics.summary()["histograms"].get(histogram)
+    if not hist:
+        return {}
+    return {f"{prefix}{key}_ms": hist[key] for key in ("p50", "p95", "p99", "mean", "max")}
+
+
+def bench_search(args, paths):
+    import metrics
+    from evaluation import result_ids
+    from search import search
+
+    queries = sample_queries(paths["csv"], args.queries, seed=args.seed)
+    result = {"queries": len(queries), "n_results": args.k}
+    for label, use_filter in (("", False), ("filtered_", True)):
+        for q in queries[:args.warmup]:
+            search(q["query"], COLLECTION, n_results=args.k,
+                   filters={"cliente": q["cliente"]} if use_filter else None)
+        metrics.reset()
+        hits = 0
+        for q in queries:
+            filters = {"cliente": q["cliente"]} if use_filter else None
+            start = time.perf_counter()
+            results = search(q["query"], COLLECTION, n_results=args.k, filters=filters)
+            metrics.observe("bench.search_ms", (time.perf_counter() - start) * 1000)
+            hits += any(q["expected_id"] in result_ids(r) for r in results)
+        result.update(_latency_stats("bench.search_ms", label))
+        result[f"{label}hit_rate"] = hits / len(queries) if queries else 0.0
+    return result
+
+
+def bench_rag(args, paths):
+    import metrics
+    from search import ask_stream
+
+    queries = sample_queries(paths["csv"], args.rag_queries, seed=args.seed + 1)
+    for q in queries[:args.warmup]:
+        for _ in ask_stream(q["query"], COLLECTION, n_results=5):
+            pass
+    metrics.reset()
+    tokens = 0
+    for q in queries:
+        start = time.perf_counter()
+        first = None
+        for _ in ask_stream(q["query"], COLLECTION, n_results=5):
+            if first is None:
+                first = time.perf_counter()
+                metrics.observe("bench.ttft_ms", (first - start) * 1000)
+            tokens += 1
+        metrics.observe("bench.total_ms", (time.perf_counter() - start) * 1000)
+    result = {"queries": len(queries), "tokens": tokens}
+    result.update(_latency_stats("bench.ttft_ms", "ttft_"))
+    result.update(_latency_stats("bench.total_ms", "total_"))
+    return result
+
+
+def bench_schema(args, paths):
+    import metrics
+    from fixtures import fixture_tables
+    from schema_cache import generate_schemas_cache, load_schemas_cache, find_table_schema
+
+    cache_path = os.path.join(paths["workdir"], "schemas_cache.json")
+    start = time.perf_counter()
+    with _quiet():
+        generate_schemas_cache(COLLECTION, output_path=cache_path)
+    generate_seconds = time.perf_counter() - start
+
+    tables = fixture_tables(args.tables)
+    metrics.reset()
+    found = 0
+    for i in range(args.schema_lookups):
+        # Igual que `main.py schema`: lee el caché y busca sin distinguir mayúsculas
+        table = tables[i % len(tables)].upper()
+        start = time.perf_counter()
+        found += find_table_schema(load_schemas_cache(cache_path), table) is not None
+        metrics.observe("bench.lookup_ms", (time.perf_counter() - start) * 1000)
+    result = {
+        "tables": len(tables),
+        "generate_seconds": generate_seconds,
+        "lookups": args.schema_lookups,
+        "found": found,
+    }
+    result.update(_latency_stats("bench.lookup_ms", "lookup_"))
+    return result
+
+
+_RUNNERS = {"index": bench_index, "search": bench_search, "rag": bench_rag, "schema": bench_schema}
+
+
+def compare(results, baseline, max_regression):
+    """Imprime la variación de las métricas principales; retorna las regresiones."""
+    regressions = []
+    print(f"\nComparación con baseline (umbral {max_regression:.0%}):")
+    for scenario, metric, higher_better in _HEADLINE:
+        old = baseline.get("scenarios", {}).get(scenario, {}).get(metric)
+        new = results["scenarios"].get(scenario, {}).get(metric)
+        if old is None or new is None or old == 0:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_better else change
+        flag = "  ✗ REGRESIÓN" if worse > max_regression else ""
+        print(f"  {scenario + '.' + metric:<28}{old:>12.2f} → {new:>12.2f} ({change:+.1%}){flag}")
+        if flag:
+            regressions.append(f"{scenario}.{metric}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks offline (stub de Ollama + DuckDB)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Lista separada por comas: {', '.join(SCENARIOS)}")
+    parser.add_argument("--rows", type=int, default=1000, help="Filas del CSV sintético")
+    parser.add_argument("--tables", type=int, default=10, help="Tablas de la base DuckDB")
+    parser.add_argument("--table-rows", type=int, default=1000, help="Filas por tabla DuckDB")
+    parser.add_argument("--queries", type=int, default=100, help="Consultas del escenario search")
+    parser.add_argument("--rag-queries", type=int, default=20, help="Consultas del escenario rag")
+    parser.add_argument("--schema-lookups", type=int, default=200, help="Búsquedas del escenario schema")
+    parser.add_argument("--warmup", type=int, default=3, help="Consultas de calentamiento (no se miden)")
+    parser.add_argument("-k", type=int, default=10, help="n_results del escenario search")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dim", type=int, default=768, help="Dimensión de los embeddings del stub")
+    parser.add_argument("--embed-ms", type=float, default=0.0, help="Latencia simulada por embedding")
+    parser.add_argument("--first-token-ms", type=float, default=0.0, help="Latencia simulada al primer token")
+    parser.add_argument("--token-ms", type=float, default=0.0, help="Latencia simulada entre tokens")
+    parser.add_argument("--tokens", type=int, default=32, help="Tokens por respuesta generada")
+    parser.add_argument("--workdir", help="Directorio de trabajo (default: temporal, se borra al terminar)")
+    parser.add_argument("--output", help="Archivo JSON de resultados")
+    parser.add_argument("--baseline", help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Empeoramiento tolerado vs baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in _RUNNERS]
+    if unknown:
+        parser.error(f"Escenarios desconocidos: {', '.join(unknown)}")
+    if "index" not in scenarios and any(s in scenarios for s in ("search", "rag")):
+        # search/rag necesitan la colección indexada
+        scenarios.insert(0, "index")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bd_vectorial_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    paths = {
+        "workdir": workdir,
+        "csv": os.path.join(workdir, "documentacion.csv"),
+        "db": os.path.join(workdir, "fixture.duckdb"),
+        "config": os.path.join(workdir, "collections.yaml"),
+    }
+
+    stub = start_stub(dim=args.dim, embed_ms=args.embed_ms, first_token_ms=args.first_token_ms,
+                      token_ms=args.token_ms, tokens=args.tokens)
+    try:
+        make_fixture_db(paths["db"], n_tables=args.tables, rows_per_table=args.table_rows, seed=args.seed)
+        make_csv(paths["csv"], n_rows=args.rows, n_tables=args.tables, seed=args.seed)
+        write_config(paths["config"], stub.base_url, os.path.join(workdir, "chroma_data"),
+                     paths["csv"], paths["db"])
+        # Antes de importar cualquier módulo del proyecto (config lee la ruta al importarse)
+        os.environ["BD_VECTORIAL_CONFIG"] = paths["config"]
+
+        results = {
+            "meta": {
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "params": {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "workdir")},
+            },
+            "scenarios": {},
+        }
+        for name in scenarios:
+            print(f"▶ {name}...", flush=True)
+            results["scenarios"][name] = _RUNNERS[name](args, paths)
+    finally:
+        stub.shutdown()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print("\nResultados:")
+    for scenario, metric, _ in _HEADLINE:
+        value = results["scenarios"].get(scenario, {}).get(metric)
+        if value is not None:
+            print(f"  {scenario + '.' + metric:<28}{value:>12.2f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False, default=str)
+        print(f"\nResultados en {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
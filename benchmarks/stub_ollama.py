@@ -0,0 +1,180 @@
+"""
+Servidor HTTP que imita la API de Ollama para benchmarks sin red.
+
+Endpoints:
+    GET  /api/tags         modelos "instalados" (embedding y chat)
+    POST /api/embeddings   {"prompt"} -> {"embedding"}
+    POST /api/embed        {"input": str | [str]} -> {"embeddings"}
+    POST /api/generate     {"prompt", "stream"} -> respuesta completa o NDJSON
+
+Los embeddings son deterministas (hash de cada palabra a una dimensión con
+signo, normalizado L2): el mismo texto da siempre el mismo vector y textos
+con palabras en común quedan cerca, así las búsquedas tienen sentido.
+Las latencias (embedding, primer token, por token) son configurables.
+
+Uso directo:
+    python benchmarks/stub_ollama.py --port 11435 --embed-ms 5 --first-token-ms 200
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULTS = {
+    "dim": 768,
+    "embed_ms": 0.0,
+    "first_token_ms": 0.0,
+    "token_ms": 0.0,
+    "tokens": 32,
+    "embedding_model": "nomic-embed-text",
+    "chat_model": "qwen2.5-coder:3b",
+}
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def embed_text(text: str, dim: int) -> list:
+    """Vector determinista de `dim` dimensiones para `text`."""
+    vector = [0.0] * dim
+    for word in _WORD_RE.findall((text or "").lower()):
+        digest = hashlib.md5(word.encode("utf-8")).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dim
+        vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector))
+    if norm == 0:
+        vector[0] = 1.0
+        return vector
+    return [v / norm for v in vector]
+
+
+def _reply_tokens(prompt: str, count: int) -> list:
+    """Respuesta sintética: las primeras palabras del prompt, repetidas hasta `count` tokens."""
+    words = _WORD_RE.findall(prompt or "") or ["respuesta"]
+    return [f"{words[i % len(words)]} " for i in range(count)]
+
+
+def _make_handler(settings: dict):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, payload, status=200):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                models = [settings["embedding_model"], settings["chat_model"]]
+                self._send_json({"models": [{"name": f"{m}:latest" if ":" not in m else m} for m in models]})
+            else:
+                self._send_json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            payload = self._read_json()
+            if self.path == "/api/embeddings":
+                time.sleep(settings["embed_ms"] / 1000)
+                self._send_json({"embedding": embed_text(payload.get("prompt", ""), settings["dim"])})
+            elif self.path == "/api/embed":
+                inputs = payload.get("input", "")
+                inputs = inputs if isinstance(inputs, list) else [inputs]
+                time.sleep(settings["embed_ms"] * len(inputs) / 1000)
+                self._send_json({"embeddings": [embed_text(t, settings["dim"]) for t in inputs]})
+            elif self.path == "/api/generate":
+                self._generate(payload)
+            else:
+                self._send_json({"error": "not found"}, 404)
+
+        def _generate(self, payload):
+            tokens = _reply_tokens(payload.get("prompt", ""), settings["tokens"])
+            model = payload.get("model", settings["chat_model"])
+            time.sleep(settings["first_token_ms"] / 1000)
+            if not payload.get("stream", True):
+                time.sleep(settings["token_ms"] * (len(tokens) - 1) / 1000)
+                self._send_json({"model": model, "response": "".join(tokens), "done": True,
+                                 "eval_count": len(tokens)})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(settings["token_ms"] / 1000)
+                self._write_chunk({"model": model, "response": token, "done": False})
+            self._write_chunk({"model": model, "response": "", "done": True, "eval_count": len(tokens)})
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+        def _write_chunk(self, data):
+            line = (json.dumps(data) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # El cliente corta el stream al recibir "done"; no es un error
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_stub(host: str = "127.0.0.1", port: int = 0, **settings) -> ThreadingHTTPServer:
+    """Levanta el stub en un hilo daemon; `port=0` elige un puerto libre.
+
+    La URL base queda en `server.base_url`; se detiene con `server.shutdown()`.
+    """
+    unknown = set(settings) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Parámetros desconocidos del stub: {', '.join(sorted(unknown))}")
+    config = {**DEFAULTS, **settings}
+    server = _StubServer((host, port), _make_handler(config))
+    server.base_url = f"http://{host}:{server.server_address[1]}"
+    server.settings = config
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub de Ollama para benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--dim", type=int, default=DEFAULTS["dim"])
+    parser.add_argument("--embed-ms", type=float, default=DEFAULTS["embed_ms"], help="Latencia por embedding")
+    parser.add_argument("--first-token-ms", type=float, default=DEFAULTS["first_token_ms"], help="Latencia al primer token")
+    parser.add_argument("--token-ms", type=float, default=DEFAULTS["token_ms"], help="Latencia entre tokens")
+    parser.add_argument("--tokens", type=int, default=DEFAULTS["tokens"], help="Tokens por respuesta")
+    args = parser.parse_args()
+
+    server = start_stub(args.host, args.port, dim=args.dim, embed_ms=args.embed_ms,
+                        first_token_ms=args.first_token_ms, token_ms=args.token_ms, tokens=args.tokens)
+    print(f"Stub de Ollama en {server.base_url} (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 import os
 import yaml
 
-CONFIG_PATH = os.path.join(os.path.dirname(__file__), "collections.yaml")
-SECRETS_PATH = os.path.join(os.path.dirname(__file__), "collections.secrets.yaml")
+# BD_VECTORIAL_CONFIG permite apuntar a otro collections.yaml (ej: benchmarks);
+# los secretos se buscan junto a él (<nombre>.secrets.yaml)
+CONFIG_PATH = os.environ.get("BD_VECTORIAL_CONFIG") or os.path.join(os.path.dirname(__file__), "collections.yaml")
+SECRETS_PATH = os.path.splitext(CONFIG_PATH)[0] + ".secrets.yaml"
 
 
 def _load_yaml(path):
@@ -56,13 +58,40 @@ def get_chroma_config():
     return _load_config()["chroma"]
 
 
+def get_tracing_config():
+    return _load_config().get("tracing") or {}
+
+
 def list_collections():
     return list(_load_config().get("collections", {}).keys())
 
 
-def get_collection_config(name):
+# Particiones físicas de una colección con `partition_by`: <coleccion>__<valor>
+PARTITION_SEP = "__"
+
+
+def _logical_name(collections, name):
+    if name not in collections and PARTITION_SEP in name:
+        base = name.split(PARTITION_SEP, 1)[0]
+        if (collections.get(base) or {}).get("partition_by"):
+            return base
+    return name
+
+
+def logical_collection_name(name):
+    """Nombre en collections.yaml de una partición física (o el mismo nombre)."""
+    return _logical_name(_load_config().get("collections", {}), name)
+
+
+def resolve_collection(name):
+    """(nombre lógico, configuración) de una colección o de una de sus particiones."""
     collections = _load_config().get("collections", {})
-    if name not in collections:
+    logical = _logical_name(collections, name)
+    if logical not in collections:
         available = ", ".join(collections.keys()) or "(ninguna)"
-        raise ValueError(f"Colección '{name}' no encontrada. Disponibles: {available}")
-    return collections[name]
+        raise ValueError(f"Colección '{logical}' no encontrada. Disponibles: {available}")
+    return logical, collections[logical]
+
+
+def get_collection_config(name):
+    return resolve_collection(name)[1]
@@ -1,19 +1,46 @@
+import queue
+import sys
+import threading
+
 import pymssql
 import pandas as pd
+from metrics import timed, incr
+from tracing import span
+
+# Segundos para abrir la conexión si la fuente no define connect_timeout
+DEFAULT_CONNECT_TIMEOUT = 15
+
+
+class QueryTimeout(Exception):
+    """La conexión o la consulta superó connect_timeout / query_timeout."""
+
+
+def _timeouts(source):
+    """(connect_timeout, query_timeout) de la fuente; query_timeout None = sin límite."""
+    connect_timeout = source.get("connect_timeout", DEFAULT_CONNECT_TIMEOUT)
+    query_timeout = source.get("query_timeout")
+    return (int(connect_timeout) if connect_timeout else None,
+            int(query_timeout) if query_timeout else None)
+
+
+def _is_timeout(error) -> bool:
+    text = str(error).lower()
+    return "timed out" in text or "timeout" in text
 
 
 def get_connection(source):
     """Crea conexión a BD según el tipo de motor y autenticación."""
     db_type = source["type"]
 
-    if db_type == "mssql":
-        return _connect_mssql(source)
-    elif db_type == "mariadb":
-        return _connect_mariadb(source)
-    elif db_type == "duckdb":
-        return _connect_duckdb(source)
-    else:
+    connectors = {"mssql": _connect_mssql, "mariadb": _connect_mariadb, "duckdb": _connect_duckdb}
+    if db_type not in connectors:
         raise ValueError(f"Motor de BD no soportado: {db_type}")
+    try:
+        return connectors[db_type](source)
+    except Exception as e:
+        if _is_timeout(e):
+            raise QueryTimeout(f"Sin conexión a {_source_label(source)} tras {_timeouts(source)[0]}s: {e}") from e
+        raise
 
 
 def _connect_mssql(source):
@@ -27,6 +54,11 @@ def _connect_mssql(source):
     else:
         kwargs["user"] = source["user"]
         kwargs["password"] = source["password"]
+    connect_timeout, query_timeout = _timeouts(source)
+    if connect_timeout:
+        kwargs["login_timeout"] = connect_timeout
+    if query_timeout:
+        kwargs["timeout"] = query_timeout
     return pymssql.connect(**kwargs)
 
 
@@ -41,6 +73,11 @@ def _connect_mariadb(source):
     if source.get("auth") != "trusted":
         kwargs["user"] = source["user"]
         kwargs["password"] = source["password"]
+    connect_timeout, query_timeout = _timeouts(source)
+    if connect_timeout:
+        kwargs["connect_timeout"] = connect_timeout
+    if query_timeout:
+        kwargs["read_timeout"] = query_timeout
     return pymysql.connect(**kwargs)
 
 
@@ -50,8 +87,8 @@ def _connect_duckdb(source):
     return duckdb.connect(path, read_only=True)
 
 
-def execute_query(source, sql, max_rows=50):
-    """Ejecuta una consulta SELECT contra la BD y retorna un DataFrame."""
+def check_read_only(sql):
+    """Valida que la consulta sea un SELECT sin operaciones de escritura."""
     import re
     normalized = sql.strip().lstrip("(")
     if not re.match(r'(?i)^SELECT\b', normalized):
@@ -62,15 +99,146 @@ def execute_query(source, sql, max_rows=50):
     )
     if forbidden.search(sql):
         raise ValueError("Consulta contiene operaciones no permitidas")
-    conn = get_connection(source)
-    try:
-        cursor = conn.cursor()
-        cursor.execute(sql)
-        rows = cursor.fetchmany(max_rows)
-        columns = [desc[0] for desc in cursor.description]
-        return pd.DataFrame(rows, columns=columns)
-    finally:
-        conn.close()
+
+
+def _open_cursor(conn, source, streaming=False):
+    """Cursor del motor; con `streaming` en MariaDB usa un cursor del lado del
+    servidor (pymysql por defecto trae todo el resultado a memoria). pymssql y
+    DuckDB ya leen el resultado por partes con fetchmany."""
+    if streaming and source["type"] == "mariadb":
+        import pymysql.cursors
+        return conn.cursor(pymysql.cursors.SSCursor)
+    if source["type"] == "duckdb":
+        # conn.cursor() en DuckDB abre otra conexión y conn.interrupt() no la alcanzaría
+        return conn
+    return conn.cursor()
+
+
+def cancel_query(conn, source):
+    """Cancela la consulta en curso de `conn` (se llama desde otro hilo)."""
+    db_type = source["type"]
+    if db_type == "duckdb":
+        conn.interrupt()
+    elif db_type == "mssql":
+        # pymssql.Connection no tiene cancel(): lo tiene la conexión _mssql interna
+        getattr(conn, "_conn", conn).cancel()
+    elif db_type == "mariadb":
+        # pymysql no cancela en la misma conexión: KILL QUERY desde otra
+        killer = get_connection(source)
+        try:
+            killer.cursor().execute(f"KILL QUERY {int(conn.thread_id())}")
+        finally:
+            killer.close()
+
+
+_DONE = object()
+
+
+def iter_query(source, sql, max_rows=None, batch_size=500):
+    """
+    Ejecuta un SELECT y entrega los resultados por lotes: (columnas, filas).
+
+    Las filas se leen del cursor con fetchmany, sin armar el resultado
+    completo en memoria. Siempre entrega al menos un lote (vacío si no hay
+    filas) para que el consumidor conozca las columnas. `max_rows=None` lee
+    todo el resultado.
+
+    La consulta corre en un hilo aparte; si el consumidor se interrumpe
+    (Ctrl-C, cierre del generador, error) la consulta se cancela en el
+    servidor en vez de quedar abandonada. `query_timeout` de la fuente la
+    corta con QueryTimeout (nativo en MSSQL/MariaDB, interrupt en DuckDB).
+    """
+    check_read_only(sql)
+    _, query_timeout = _timeouts(source)
+    with span("sql.execute", engine=source["type"], max_rows=max_rows) as exec_span:
+        conn = get_connection(source)
+        batches = queue.Queue(maxsize=2)
+        stop = threading.Event()
+        state = {"in_db": False, "timed_out": False}
+
+        def _put(item):
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def _produce():
+            try:
+                state["in_db"] = True
+                cursor = _open_cursor(conn, source, streaming=max_rows is None)
+                cursor.execute(sql)
+                columns = [desc[0] for desc in cursor.description]
+                fetched = 0
+                while True:
+                    size = batch_size if max_rows is None else min(batch_size, max_rows - fetched)
+                    state["in_db"] = True
+                    rows = cursor.fetchmany(size) if size > 0 else []
+                    state["in_db"] = False
+                    fetched += len(rows)
+                    if (rows or fetched == 0) and not _put((columns, [tuple(row) for row in rows])):
+                        return
+                    if len(rows) < size or size == 0:
+                        break
+                _put(_DONE)
+            except BaseException as e:
+                state["in_db"] = False
+                _put(e)
+            finally:
+                conn.close()
+
+        def _on_timeout():
+            state["timed_out"] = True
+            conn.interrupt()
+
+        timer = None
+        if source["type"] == "duckdb" and query_timeout:
+            timer = threading.Timer(query_timeout, _on_timeout)
+            timer.daemon = True
+            timer.start()
+        worker = threading.Thread(target=_produce, name="sql.execute", daemon=True)
+        worker.start()
+        fetched = 0
+        try:
+            while True:
+                # get con timeout: el hilo principal sigue atendiendo Ctrl-C
+                try:
+                    item = batches.get(timeout=0.2)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    if state["timed_out"] or _is_timeout(item):
+                        incr("sql.timeouts")
+                        raise QueryTimeout(f"La consulta superó query_timeout ({query_timeout}s)") from item
+                    raise item
+                fetched += len(item[1])
+                exec_span.set(rows=fetched)
+                yield item
+        finally:
+            stop.set()
+            if timer is not None:
+                timer.cancel()
+            if worker.is_alive() and state["in_db"]:
+                incr("sql.cancelled")
+                exec_span.set(cancelled=True)
+                try:
+                    cancel_query(conn, source)
+                except Exception as e:
+                    incr("sql.cancel_errors")
+                    print(f"⚠️  No se pudo cancelar la consulta en {source['type']}: {e}", file=sys.stderr)
+            worker.join(timeout=5)
+
+
+def execute_query(source, sql, max_rows=50):
+    """Ejecuta una consulta SELECT contra la BD y retorna un DataFrame."""
+    columns, rows = [], []
+    for columns, batch in iter_query(source, sql, max_rows=max_rows, batch_size=max_rows):
+        rows.extend(batch)
+    return pd.DataFrame(rows, columns=columns)
 
 
 def _validate_identifier(name: str) -> None:
@@ -114,6 +282,15 @@ def build_distinct_query(source, table: str, column: str, limit: int) -> str:
     )
 
 
+def build_sample_query(source, table: str, limit: int) -> str:
+    db_type = source["type"]
+    _validate_identifier(table)
+    table_q = _quote_identifier(db_type, table)
+    if db_type == "mssql":
+        return f"SELECT TOP {limit} * FROM {table_q}"
+    return f"SELECT * FROM {table_q} LIMIT {limit}"
+
+
 def fetch_distinct_values(source, table: str, column: str, limit: int = 50):
     sql = build_distinct_query(source, table, column, limit)
     df = execute_query(source, sql, max_rows=limit)
@@ -152,7 +329,8 @@ def build_schema_query(source, table: str, max_columns: int):
     )
 
 
-def fetch_table_schema(source, table: str, max_columns: int = 200):
+def fetch_table_columns(source, table: str, max_columns: int = 200):
+    """Columnas de una tabla como [(nombre, tipo)] (tipo None si el motor no lo reporta)."""
     sql = build_schema_query(source, table, max_columns)
     df = execute_query(source, sql, max_rows=max_columns)
     if df.empty:
@@ -170,29 +348,39 @@ def fetch_table_schema(source, table: str, max_columns: int = 200):
         dtype = _get_ci(row, "data_type")
         if name is None:
             continue
-        if dtype is None:
-            columns.append(str(name))
-        else:
-            columns.append(f"{name} ({dtype})")
+        columns.append((str(name), None if dtype is None else str(dtype)))
     return columns
 
 
+def fetch_table_schema(source, table: str, max_columns: int = 200):
+    return [
+        name if dtype is None else f"{name} ({dtype})"
+        for name, dtype in fetch_table_columns(source, table, max_columns=max_columns)
+    ]
+
+
 def fetch_source(source, limit=None):
     """Extrae datos de un source individual."""
     source_type = source["type"]
 
-    if source_type in ("mssql", "mariadb", "duckdb"):
-        return _fetch_sql(source, limit)
-    elif source_type == "csv":
-        return _fetch_csv(source["path"], limit)
-    elif source_type == "json":
-        return _fetch_json(source["path"], limit)
-    else:
-        raise ValueError(f"Tipo de fuente no soportado: {source_type}")
+    with timed("index.extract"):
+        if source_type in ("mssql", "mariadb", "duckdb"):
+            df = _fetch_sql(source, limit)
+        elif source_type == "csv":
+            df = _fetch_csv(source["path"], limit)
+        elif source_type == "json":
+            df = _fetch_json(source["path"], limit)
+        else:
+            raise ValueError(f"Tipo de fuente no soportado: {source_type}")
+    incr("rows.extracted", len(df))
+    return df
 
 
 def _fetch_sql(source, limit=None):
-    conn = get_connection(source)
+    """
+    Extrae la consulta de la fuente con iter_query: respeta query_timeout
+    (también en DuckDB) y un Ctrl-C cancela la consulta en el servidor.
+    """
     query = source["query"]
 
     if limit:
@@ -213,8 +401,10 @@ def _fetch_sql(source, limit=None):
             else:
                 query = f"{query} LIMIT {limit}"
 
-    df = pd.read_sql(query, conn)
-    conn.close()
+    columns, rows = [], []
+    for columns, batch in iter_query(source, query, batch_size=10000):
+        rows.extend(batch)
+    df = pd.DataFrame(rows, columns=columns)
     label = _source_label(source)
     print(f"  Extraídos {len(df):,} registros de {label}")
     return df
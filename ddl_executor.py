@@ -161,6 +161,31 @@ def confirm_operation(sql, collection):
     return True
 
 
+def ddl_target(sql):
+    """Nombre de la vista/tabla afectada por el DDL (sin esquema)."""
+    match = re.match(
+        r'^\s*(?:ALTER|CREATE|DROP)\s+(?:VIEW|TABLE)\s+((?:[\w\[\]"`]+\.)*[\w\[\]"`]+)',
+        sql, re.IGNORECASE
+    )
+    return match.group(1).split(".")[-1].strip('[]"`') if match else None
+
+
+def invalidate_cached_results(sql):
+    """Descarta de la caché de consultas los resultados que usan el objeto modificado."""
+    from query_cache import invalidate_tables
+
+    target = ddl_target(sql)
+    if not target:
+        return
+    try:
+        removed = invalidate_tables([target])
+    except Exception as e:
+        print(f"⚠️  No se pudo invalidar la caché de consultas: {e}")
+        return
+    if removed:
+        print(f"🗑️  Caché de consultas: {removed} resultado(s) de '{target}' invalidados")
+
+
 def execute_ddl(collection_name, sql):
     """Ejecutar operación DDL"""
     from db_connector import get_connection
@@ -188,6 +213,7 @@ def execute_ddl(collection_name, sql):
         print("✅ Operación completada exitosamente")
         log_file = log_operation(collection_name, sql, 'SUCCESS')
         print(f"📝 Registrado en: {log_file}")
+        invalidate_cached_results(sql)
         return True
         
     except Exception as e:
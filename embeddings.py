@@ -1,14 +1,43 @@
 import requests
-from typing import List
+import time
+from typing import Any, Dict, List
 from config import get_ollama_config
+from metrics import observe, timed, incr
+
+
+def request_options(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Campos comunes de las llamadas a Ollama: `keep_alive` de la sección
+    ollama (ej: "30m", 3600, -1 = sin descargar) mantiene el modelo en memoria.
+    """
+    if cfg.get("keep_alive") is None:
+        return {}
+    return {"keep_alive": cfg["keep_alive"]}
+
+
+def truncate_embeddings(vectors, dim: int):
+    """
+    Recorta vectores a sus primeras `dim` dimensiones y los renormaliza
+    (embeddings Matryoshka, como nomic-embed-text). Retorna un array numpy.
+    """
+    import numpy as np
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.shape[-1] < dim:
+        raise ValueError(f"El embedding tiene {matrix.shape[-1]} dimensiones, menos que embedding_dim={dim}")
+    matrix = matrix[..., :dim]
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
 
 
 def get_embedding(text: str) -> List[float]:
     cfg = get_ollama_config()
+    start = time.perf_counter()
     response = requests.post(
         f"{cfg['base_url']}/api/embeddings",
-        json={"model": cfg["embedding_model"], "prompt": text}
+        json={"model": cfg["embedding_model"], "prompt": text, **request_options(cfg)}
     )
+    observe("embedding.latency_ms", (time.perf_counter() - start) * 1000)
     if response.status_code != 200:
         raise Exception(f"Error de Ollama: {response.text}")
     return response.json()["embedding"]
@@ -25,9 +54,11 @@ def get_embeddings_batch(texts: List[str], show_progress: bool = True) -> List[L
         if not text or str(text).strip() == "" or str(text).lower() == "none":
             text = "sin información"
 
-        embedding = get_embedding(str(text))
+        with timed("index.embed"):
+            embedding = get_embedding(str(text))
         embeddings.append(embedding)
 
+    incr("docs.embedded", total)
     return embeddings
 
 
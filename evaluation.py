@@ -0,0 +1,275 @@
+"""
+Evaluación de calidad y latencia de búsqueda sobre preguntas "golden".
+
+    python main.py -c proyectos eval --golden data/golden_proyectos.yaml
+
+Formato del archivo golden (YAML):
+
+    k: [3, 5, 10]                 # opcional, n_results a evaluar
+    questions:
+      - question: "¿dónde están los cargos de un embarque?"
+        expected: [shipment_charges]          # ids de regla (columna id) o de documento
+        filters: {cliente: GECA}              # opcional, se usa en modo híbrido
+
+Cada pregunta se embebe una sola vez; luego se consulta la colección con cada
+configuración (k × híbrido on/off). "Híbrido" aplica los filtros de la
+pregunta (semántica + metadata); sin híbrido la búsqueda es solo semántica.
+Por configuración se reporta recall@k, MRR, latencia de la consulta a
+ChromaDB (p50/p95, sin el embedding, que se reporta aparte) y el tamaño
+promedio del prompt RAG que generarían esos resultados.
+
+Con --dims 256,384,512 se comparan en cambio dimensiones de embedding
+recortadas (ver evaluate_dims y `embedding_dim` en collections.yaml).
+"""
+
+import time
+from typing import Any, Dict, List, Optional, Set
+
+import yaml
+
+import metrics
+from embeddings import get_embedding
+from metadata_index import parse_refs
+from search import _query_collection, _render_prompt
+
+DEFAULT_KS = [3, 5, 10]
+
+
+def load_golden(path: str) -> Dict[str, Any]:
+    """Lee y valida el archivo de preguntas golden."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    questions = []
+    for i, item in enumerate(data.get("questions") or [], 1):
+        question = item.get("question")
+        expected = item.get("expected")
+        if not question or not expected:
+            raise ValueError(f"Pregunta #{i} sin 'question' o 'expected' en {path}")
+        if isinstance(expected, str):
+            expected = [expected]
+        questions.append({
+            "question": str(question),
+            "expected": [str(e) for e in expected],
+            "filters": item.get("filters") or None,
+        })
+    if not questions:
+        raise ValueError(f"Sin preguntas en {path}")
+    return {"k": data.get("k") or DEFAULT_KS, "questions": questions}
+
+
+def result_ids(result: Dict[str, Any]) -> Set[str]:
+    """IDs con los que un resultado cuenta como acierto: documento y reglas que lo generan."""
+    ids = {str(result["id"])}
+    metadata = result.get("metadata") or {}
+    if metadata.get("id") is not None:
+        ids.update(v.strip() for v in str(metadata["id"]).split(","))
+    refs = result.get("refs") or parse_refs(metadata)
+    ids.update(str(ref["rule_id"]) for ref in refs if "rule_id" in ref)
+    return ids
+
+
+def score(results: List[Dict[str, Any]], expected: List[str]) -> Dict[str, float]:
+    """recall (ids esperados encontrados / esperados) y reciprocal rank del primer acierto."""
+    expected_set = set(expected)
+    found = set()
+    first_rank = None
+    for rank, result in enumerate(results, 1):
+        hits = result_ids(result) & expected_set
+        if hits and first_rank is None:
+            first_rank = rank
+        found |= hits
+    return {
+        "recall": len(found) / len(expected_set),
+        "rr": 1.0 / first_rank if first_rank else 0.0,
+    }
+
+
+def evaluate(collection_name: str, golden: Dict[str, Any], ks: Optional[List[int]] = None,
+             hybrid_modes: Optional[List[bool]] = None, repeat: int = 1) -> Dict[str, Any]:
+    """Corre todas las configuraciones y retorna {"embedding": {...}, "configs": [...]}.
+
+    `repeat` repite cada consulta para estabilizar la latencia (la calidad
+    se calcula con la primera repetición).
+    """
+    ks = sorted(set(ks or golden["k"]))
+    questions = golden["questions"]
+    if hybrid_modes is None:
+        has_filters = any(q["filters"] for q in questions)
+        hybrid_modes = [False, True] if has_filters else [False]
+
+    metrics.reset()
+    embeddings = []
+    for q in questions:
+        start = time.perf_counter()
+        embeddings.append(get_embedding(q["question"]))
+        metrics.observe("eval.embed_ms", (time.perf_counter() - start) * 1000)
+
+    configs = []
+    for hybrid in hybrid_modes:
+        for k in ks:
+            name = f"k={k}" + (" híbrido" if hybrid else "")
+            recalls, rrs, prompt_chars, misses = [], [], [], []
+            for q, embedding in zip(questions, embeddings):
+                filters = q["filters"] if hybrid else None
+                for attempt in range(max(1, repeat)):
+                    start = time.perf_counter()
+                    results = _query_collection(collection_name, embedding, k, filters)
+                    metrics.observe(f"eval.query_ms[{name}]", (time.perf_counter() - start) * 1000)
+                    if attempt == 0:
+                        s = score(results, q["expected"])
+                        recalls.append(s["recall"])
+                        rrs.append(s["rr"])
+                        prompt_chars.append(len(_render_prompt(q["question"], collection_name, results)))
+                        if s["recall"] < 1.0:
+                            misses.append(q["question"])
+            configs.append({
+                "name": name,
+                "k": k,
+                "hybrid": hybrid,
+                "recall": sum(recalls) / len(recalls),
+                "mrr": sum(rrs) / len(rrs),
+                "prompt_chars": sum(prompt_chars) / len(prompt_chars),
+                "misses": misses,
+            })
+
+    histograms = metrics.summary()["histograms"]
+    for config in configs:
+        hist = histograms[f"eval.query_ms[{config['name']}]"]
+        config["p50_ms"] = hist["p50"]
+        config["p95_ms"] = hist["p95"]
+    embed = histograms["eval.embed_ms"]
+    return {
+        "collection": collection_name,
+        "questions": len(questions),
+        "embedding": {"p50_ms": embed["p50"], "p95_ms": embed["p95"]},
+        "configs": configs,
+    }
+
+
+def print_report(report: Dict[str, Any], show_misses: bool = False) -> None:
+    print(f"\nEvaluación de '{report['collection']}' ({report['questions']} preguntas)")
+    emb = report["embedding"]
+    print(f"  Embedding de la pregunta: p50={emb['p50_ms']:.1f}ms p95={emb['p95_ms']:.1f}ms\n")
+    print(f"  {'Configuración':<16}{'recall@k':>10}{'MRR':>8}{'p50 ms':>9}{'p95 ms':>9}{'prompt':>9}")
+    for c in report["configs"]:
+        print(f"  {c['name']:<16}{c['recall']:>10.3f}{c['mrr']:>8.3f}{c['p50_ms']:>9.1f}"
+              f"{c['p95_ms']:>9.1f}{c['prompt_chars']:>9,.0f}")
+    if show_misses:
+        for c in report["configs"]:
+            if c["misses"]:
+                print(f"\n  Fallos en {c['name']}:")
+                for question in c["misses"]:
+                    print(f"    - {question}")
+
+
+def evaluate_dims(collection_name: str, golden: Dict[str, Any], dims: List[int], k: Optional[int] = None,
+                  repeat: int = 1) -> Dict[str, Any]:
+    """
+    Compara dimensiones de embedding (Matryoshka) sin reindexar: los vectores
+    ya guardados se recortan y renormalizan a cada `dim` en una colección en
+    memoria y se consultan con las preguntas golden (sin filtros).
+
+    Reporta recall@k, MRR, latencia de la consulta y memoria de los vectores
+    (float32) frente a la dimensión guardada.
+    """
+    import chromadb
+    from chromadb.config import Settings
+
+    from embeddings import truncate_embeddings
+    from metadata_index import REFS_KEY, dump_refs, merge_refs
+    from partitions import physical_collections
+    from search import _ann_search, _expand_refs
+    from vector_store import get_chroma_client
+
+    k = k or max(golden["k"])
+    ids, documents, metadatas, vectors = [], [], [], []
+    positions: Dict[str, int] = {}
+    # Con partition_by se leen todas las particiones; un documento compartido
+    # por varias queda una vez, con las referencias de todas
+    for name in physical_collections(collection_name):
+        source = get_chroma_client().get_collection(name)
+        total = source.count()
+        for offset in range(0, total, 5000):
+            data = source.get(limit=5000, offset=offset, include=["embeddings", "documents", "metadatas"])
+            for doc_id, document, metadata, vector in zip(data["ids"], data["documents"], data["metadatas"],
+                                                          data["embeddings"]):
+                if doc_id in positions:
+                    previous = metadatas[positions[doc_id]]
+                    refs = merge_refs(parse_refs(previous), parse_refs(metadata))
+                    if refs:
+                        previous[REFS_KEY] = dump_refs(refs)
+                    continue
+                positions[doc_id] = len(ids)
+                ids.append(doc_id)
+                documents.append(document)
+                metadatas.append(dict(metadata or {}))
+                vectors.append(vector)
+    if not ids:
+        raise ValueError(f"La colección '{collection_name}' está vacía")
+    stored_dim = len(vectors[0])
+
+    questions = golden["questions"]
+    query_vectors = [get_embedding(q["question"]) for q in questions]
+    if len(query_vectors[0]) < stored_dim:
+        raise ValueError(f"El modelo entrega {len(query_vectors[0])} dimensiones y la colección guarda {stored_dim}")
+
+    client = chromadb.EphemeralClient(settings=Settings(anonymized_telemetry=False))
+    batch = client.get_max_batch_size()
+    metrics.reset()
+    configs = []
+    for dim in sorted({d for d in dims if d < stored_dim} | {stored_dim}):
+        name = f"eval-dim-{dim}"
+        try:
+            client.delete_collection(name)
+        except Exception:
+            pass
+        collection = client.create_collection(name, metadata={"hnsw:space": "cosine"})
+        truncated = truncate_embeddings(vectors, dim)
+        for i in range(0, len(ids), batch):
+            collection.add(ids=ids[i:i + batch], embeddings=truncated[i:i + batch],
+                           documents=documents[i:i + batch], metadatas=metadatas[i:i + batch])
+        queries = truncate_embeddings(query_vectors, dim).tolist()
+
+        label = f"dim={dim}"
+        recalls, rrs = [], []
+        for q, embedding in zip(questions, queries):
+            for attempt in range(max(1, repeat)):
+                start = time.perf_counter()
+                results = [_expand_refs(r) for r in _ann_search(collection, embedding, k, None)]
+                metrics.observe(f"eval.query_ms[{label}]", (time.perf_counter() - start) * 1000)
+                if attempt == 0:
+                    s = score(results, q["expected"])
+                    recalls.append(s["recall"])
+                    rrs.append(s["rr"])
+        client.delete_collection(name)
+        configs.append({
+            "name": label,
+            "dim": dim,
+            "recall": sum(recalls) / len(recalls),
+            "mrr": sum(rrs) / len(rrs),
+            "vector_mb": len(ids) * dim * 4 / 1024 / 1024,
+            "saved": 1 - dim / stored_dim,
+        })
+
+    histograms = metrics.summary()["histograms"]
+    for config in configs:
+        hist = histograms[f"eval.query_ms[{config['name']}]"]
+        config["p50_ms"] = hist["p50"]
+        config["p95_ms"] = hist["p95"]
+    return {
+        "collection": collection_name,
+        "questions": len(questions),
+        "documents": len(ids),
+        "stored_dim": stored_dim,
+        "k": k,
+        "configs": configs,
+    }
+
+
+def print_dims_report(report: Dict[str, Any]) -> None:
+    print(f"\nDimensiones de embedding en '{report['collection']}' ({report['documents']:,} documentos, "
+          f"{report['questions']} preguntas, k={report['k']}, guardada: {report['stored_dim']})\n")
+    print(f"  {'dim':>6}{'recall@k':>10}{'MRR':>8}{'p50 ms':>9}{'p95 ms':>9}{'vectores MB':>13}{'ahorro':>8}")
+    for c in report["configs"]:
+        print(f"  {c['dim']:>6}{c['recall']:>10.3f}{c['mrr']:>8.3f}{c['p50_ms']:>9.2f}{c['p95_ms']:>9.2f}"
+              f"{c['vector_mb']:>13.2f}{c['saved']:>8.0%}")
@@ -0,0 +1,52 @@
+"""
+Bloqueo de archivos JSON compartidos entre hilos y procesos (caché de
+consultas, caché de respuestas): varios `ask`/`chat`/MCP pueden leer,
+modificar y reescribir el mismo archivo a la vez.
+
+    with locked(path):
+        data = _load()
+        ...
+        _save(data)
+
+Usa un archivo `<path>.lock` con flock (POSIX) o msvcrt.locking (Windows),
+más un lock de hilos por ruta dentro del proceso.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _thread_lock(path: str) -> threading.Lock:
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(path, threading.Lock())
+
+
+@contextmanager
+def locked(path: str):
+    """Acceso exclusivo a `path` mientras dura el bloque."""
+    path = os.path.abspath(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _thread_lock(path):
+        with open(f"{path}.lock", "a+b") as handle:
+            if os.name == "nt":
+                import msvcrt
+
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    handle.seek(0)
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
@@ -0,0 +1,221 @@
+"""
+Ajuste de parámetros HNSW por colección (python main.py -c <col> tune).
+
+    collections:
+      proyectos:
+        hnsw:
+          M: 16                 # vecinos por nodo (al crear la colección)
+          construction_ef: 100  # calidad de construcción (al crear la colección)
+          search_ef: 50         # candidatos por búsqueda (se aplica al indexar)
+
+Procedimiento:
+  1. Se leen los vectores de la colección (sin Ollama) y se apartan
+     `sample` como preguntas (held-out: no quedan en el índice de prueba).
+  2. La verdad de referencia es la búsqueda exacta (coseno, fuerza bruta)
+     de cada pregunta sobre el resto; un resultado ANN cuenta como acierto
+     si es al menos tan similar como el k-ésimo vecino exacto.
+  3. Por cada M x construction_ef se construye un índice en memoria y por
+     cada search_ef se mide recall@k y la latencia por consulta.
+  4. Se recomienda la combinación más rápida (p50) con recall >= target;
+     si ninguna llega, la de mayor recall.
+
+Con --apply: si solo cambia search_ef se modifica la colección; si cambian
+M o construction_ef se reconstruye con los mismos vectores (export/import
+a un archivo temporal, sin re-embeber).
+
+En una colección con `partition_by` se mide sobre los vectores de todas las
+particiones y --apply se aplica a cada partición.
+"""
+
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import metrics
+from partitions import physical_collections
+from vector_store import collection_metadata, current_hnsw, get_chroma_client, set_search_ef
+
+DEFAULT_GRID = {
+    "M": [8, 16, 32],
+    "construction_ef": [100, 200],
+    "search_ef": [10, 20, 50, 100, 200],
+}
+_READ_BATCH = 5000
+
+
+def _load_vectors(collection):
+    import numpy as np
+
+    ids, vectors = [], []
+    total = collection.count()
+    for offset in range(0, total, _READ_BATCH):
+        data = collection.get(limit=_READ_BATCH, offset=offset, include=["embeddings"])
+        ids.extend(data["ids"])
+        vectors.append(np.asarray(data["embeddings"], dtype=np.float32))
+    return ids, np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+
+def _open_physical(collection_name: str):
+    """Colecciones de ChromaDB detrás de `collection_name` (todas sus particiones)."""
+    client = get_chroma_client()
+    names = physical_collections(collection_name)
+    if not names:
+        raise ValueError(f"La colección '{collection_name}' no tiene particiones en ChromaDB")
+    collections = []
+    for name in names:
+        try:
+            collections.append(client.get_collection(name))
+        except Exception:
+            raise ValueError(f"La colección '{name}' no existe en ChromaDB")
+    return collections
+
+
+def _exact_kth_similarity(base, queries, k: int):
+    """Similitud del k-ésimo vecino exacto de cada pregunta (empates cuentan como acierto)."""
+    import numpy as np
+
+    def normalize(m):
+        norms = np.linalg.norm(m, axis=1, keepdims=True)
+        return m / np.where(norms == 0, 1.0, norms)
+
+    similarities = normalize(queries) @ normalize(base).T
+    return -np.partition(-similarities, k - 1, axis=1)[:, k - 1]
+
+
+def tune(collection_name: str, sample: int = 100, k: int = 10, target_recall: float = 0.95,
+         grid: Optional[Dict[str, List[int]]] = None, seed: int = 0) -> Dict[str, Any]:
+    """Mide la grilla y retorna {"rows": [...], "recommended": {...}, "current": {...}}."""
+    import chromadb
+    import numpy as np
+    from chromadb.config import Settings
+
+    grid = {**DEFAULT_GRID, **(grid or {})}
+    collections = _open_physical(collection_name)
+    ids, vectors = [], []
+    for collection in collections:
+        part_ids, part_vectors = _load_vectors(collection)
+        if part_ids:
+            ids.extend(part_ids)
+            vectors.append(part_vectors)
+    vectors = np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+    if len(ids) < 2 * k:
+        raise ValueError(f"La colección '{collection_name}' tiene muy pocos documentos ({len(ids)}) para ajustar")
+
+    rng = np.random.default_rng(seed)
+    n_queries = min(sample, len(ids) // 5 or 1)
+    held_out = rng.choice(len(ids), size=n_queries, replace=False)
+    mask = np.ones(len(ids), dtype=bool)
+    mask[held_out] = False
+    base, queries = vectors[mask], vectors[held_out]
+    k = min(k, len(base))
+    kth = _exact_kth_similarity(base, queries, k)
+
+    client = chromadb.EphemeralClient(settings=Settings(anonymized_telemetry=False))
+    max_batch = client.get_max_batch_size()
+    base_ids = [str(i) for i in range(len(base))]
+    query_list = queries.tolist()
+
+    metrics.reset()
+    rows = []
+    for m in grid["M"]:
+        for construction_ef in grid["construction_ef"]:
+            name = f"tune-{m}-{construction_ef}"
+            try:
+                client.delete_collection(name)
+            except Exception:
+                pass
+            test = client.create_collection(name, metadata=collection_metadata(
+                collection_name, {"M": m, "construction_ef": construction_ef}))
+            start = time.perf_counter()
+            for i in range(0, len(base), max_batch):
+                test.add(ids=base_ids[i:i + max_batch], embeddings=base[i:i + max_batch])
+            build_s = time.perf_counter() - start
+
+            for search_ef in grid["search_ef"]:
+                set_search_ef(test, search_ef)
+                label = f"{m}/{construction_ef}/{search_ef}"
+                hits = 0
+                for query, threshold in zip(query_list, kth):
+                    start = time.perf_counter()
+                    found = test.query(query_embeddings=[query], n_results=k, include=["distances"])
+                    metrics.observe(f"tune.query_ms[{label}]", (time.perf_counter() - start) * 1000)
+                    hits += sum(1 for d in found["distances"][0] if 1 - d >= threshold - 1e-5)
+                rows.append({"M": m, "construction_ef": construction_ef, "search_ef": search_ef,
+                             "build_s": build_s, "recall": hits / (k * len(query_list)), "label": label})
+            client.delete_collection(name)
+
+    histograms = metrics.summary()["histograms"]
+    for row in rows:
+        hist = histograms[f"tune.query_ms[{row.pop('label')}]"]
+        row["p50_ms"] = hist["p50"]
+        row["p95_ms"] = hist["p95"]
+
+    passing = [r for r in rows if r["recall"] >= target_recall]
+    if passing:
+        recommended = min(passing, key=lambda r: (r["p50_ms"], r["M"], r["construction_ef"]))
+    else:
+        recommended = max(rows, key=lambda r: (r["recall"], -r["p50_ms"]))
+    return {
+        "collection": collection_name,
+        "documents": len(ids),
+        "queries": len(query_list),
+        "k": k,
+        "target_recall": target_recall,
+        "partitions": len(collections),
+        "current": current_hnsw(collections[0]),
+        "rows": rows,
+        "recommended": recommended,
+        "meets_target": bool(passing),
+    }
+
+
+def print_tune_report(report: Dict[str, Any]) -> None:
+    print(f"\nAjuste HNSW de '{report['collection']}' ({report['documents']:,} documentos, "
+          f"{report['queries']} preguntas held-out, recall@{report['k']} vs búsqueda exacta)\n")
+    print(f"  {'M':>4}{'constr_ef':>11}{'search_ef':>11}{'build s':>9}{'recall':>9}{'p50 ms':>9}{'p95 ms':>9}")
+    for r in report["rows"]:
+        mark = "  ←" if r is report["recommended"] else ""
+        print(f"  {r['M']:>4}{r['construction_ef']:>11}{r['search_ef']:>11}{r['build_s']:>9.2f}"
+              f"{r['recall']:>9.3f}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{mark}")
+    best = report["recommended"]
+    current = report["current"]
+    print(f"\n  Actual: M={current['M']} construction_ef={current['construction_ef']} search_ef={current['search_ef']}")
+    if not report["meets_target"]:
+        print(f"  ⚠️  Ninguna combinación llega a recall {report['target_recall']}; se recomienda la de mayor recall")
+    print("  Recomendado (collections.yaml):")
+    print(f"    hnsw:\n      M: {best['M']}\n      construction_ef: {best['construction_ef']}\n"
+          f"      search_ef: {best['search_ef']}")
+
+
+def _apply_one(collection, settings: Dict[str, int]) -> str:
+    from snapshot import export_collection, import_collection
+
+    current = current_hnsw(collection)
+    if settings["M"] == current["M"] and settings["construction_ef"] == current["construction_ef"]:
+        set_search_ef(collection, settings["search_ef"])
+        return f"search_ef={settings['search_ef']} aplicado"
+    if collection.count() == 0:
+        return "vacía, sin cambios"
+
+    # M / construction_ef solo se fijan al crear: se reconstruye con los mismos vectores
+    fd, path = tempfile.mkstemp(suffix=".arrow", prefix=f"{collection.name}-")
+    os.close(fd)
+    export_collection(collection.name, path)
+    try:
+        import_collection(path, collection.name, clear=True, force=True, hnsw=settings)
+    except Exception as e:
+        raise RuntimeError(f"{e} (snapshot de '{collection.name}' en {path}; "
+                           f"restaurar con: main.py -c {collection.name} import {path} --clear)")
+    os.remove(path)
+    return (f"colección reconstruida con M={settings['M']} construction_ef={settings['construction_ef']} "
+            f"search_ef={settings['search_ef']}")
+
+
+def apply_settings(collection_name: str, settings: Dict[str, int]) -> str:
+    """Aplica M/construction_ef/search_ef a la colección (o a cada partición). Retorna qué se hizo."""
+    collections = _open_physical(collection_name)
+    if len(collections) == 1 and collections[0].name == collection_name:
+        return _apply_one(collections[0], settings)
+    done = [f"{c.name}: {_apply_one(c, settings)}" for c in collections]
+    return f"{len(done)} particiones\n    " + "\n    ".join(done)
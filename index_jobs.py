@@ -0,0 +1,66 @@
+"""
+Checkpoints de indexación reanudables (`main.py index --resume`).
+
+Un job por colección, persistido en:
+    <persist_directory>/_jobs/<coleccion>.json
+
+Por cada fuente guarda el estado ("running", "partial", "done"), el offset
+del último lote confirmado en ChromaDB, un digest de la lista de IDs (para
+validar que el offset sigue correspondiendo a los mismos documentos) y los
+resultados de enrichment ya obtenidos (esquemas y catálogos), de modo que al
+reanudar no se repiten consultas SQL ni embeddings ya confirmados.
+"""
+
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+from config import get_chroma_config
+
+
+def _job_path(collection_name: str) -> str:
+    cfg = get_chroma_config()
+    return os.path.join(cfg["persist_directory"], "_jobs", f"{collection_name}.json")
+
+
+def load_job(collection_name: str) -> Optional[Dict[str, Any]]:
+    path = _job_path(collection_name)
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def new_job(collection_name: str) -> Dict[str, Any]:
+    return {
+        "collection": collection_name,
+        "started": datetime.now().isoformat(),
+        "sources": {}
+    }
+
+
+def save_job(job: Dict[str, Any]) -> None:
+    """Escribe el checkpoint de forma atómica (archivo temporal + rename)."""
+    path = _job_path(job["collection"])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    job["updated"] = datetime.now().isoformat()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(job, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def finish_job(collection_name: str) -> None:
+    path = _job_path(collection_name)
+    if os.path.isfile(path):
+        os.remove(path)
+
+
+def source_state(job: Dict[str, Any], source_name: str) -> Dict[str, Any]:
+    """Estado de una fuente dentro del job (se crea vacío si no existe)."""
+    return job["sources"].setdefault(source_name, {
+        "status": "running",
+        "offset": 0,
+        "ids_digest": None,
+        "enrich": {"schema": {}, "distinct": {}}
+    })
@@ -13,8 +13,18 @@ Uso:
     python main.py -c geca index                      # Indexar todas las fuentes
     python main.py -c geca index --source shipments   # Indexar solo una fuente
     python main.py -c geca index --limit 100          # Indexar con límite
+    python main.py -c geca index --resume             # Reanudar indexación interrumpida
+    python main.py -c geca index --jobs 2             # Indexar fuentes en paralelo
     python main.py -c geca search "texto"             # Buscar en todo
     python main.py -c geca search "texto" -f _source=shipments  # Filtrar por fuente
+    python main.py -c geca eval --golden preguntas.yaml  # recall@k, MRR y latencia
+    python main.py -c geca sql "SELECT ..." --export out.parquet  # Extracción completa por lotes
+    python main.py -c geca mirror --sample 1000       # Copia local (DuckDB) para enrichment sin túnel
+    python main.py warmup                             # Precargar modelos e índices (tras reiniciar Ollama)
+    python main.py -c geca tune --apply               # Ajustar HNSW (recall vs latencia)
+    python main.py -c geca export geca.arrow          # Snapshot con vectores (sin reindexar al restaurar)
+    python main.py import geca.arrow                  # Restaurar el snapshot (sin Ollama ni BD)
+    python main.py cache --invalidate vi_sage_jobs_facturas  # Invalidar resultados SQL en caché
     python main.py -c geca stats                      # Estadísticas
     python main.py -c geca interactive                # Modo interactivo
 """
@@ -68,11 +78,17 @@ def cmd_collections():
         print()
 
 
-def cmd_index(collection_name, source_name=None, limit=None, clear=False):
+def cmd_index(collection_name, source_name=None, limit=None, clear=False, resume=False, jobs=1,
+              metrics_json=None):
+    import metrics
     from config import get_collection_config
     from db_connector import fetch_source
-    from vector_store import index_source, clear_collection, get_collection_stats
+    from vector_store import (
+        index_source, clear_collection, get_collection_stats, sync_hnsw_settings, check_embedding_dim
+    )
     from schema_cache import generate_schemas_cache
+    from partitions import physical_collections
+    from index_jobs import load_job, new_job, save_job, finish_job
 
     cfg = get_collection_config(collection_name)
     sources = cfg["sources"]
@@ -84,17 +100,71 @@ def cmd_index(collection_name, source_name=None, limit=None, clear=False):
             print(f"Error: Fuente '{source_name}' no encontrada. Disponibles: {available}")
             sys.exit(1)
 
+    if clear and resume:
+        print("Error: --clear y --resume no se pueden combinar")
+        sys.exit(1)
+
+    metrics.reset()
+
+    job = load_job(collection_name) if resume else None
+    if resume and job is None:
+        print("No hay un job de indexación pendiente; se indexa desde el inicio")
+    elif resume:
+        print(f"Reanudando job de indexación iniciado {job['started']}")
+    elif load_job(collection_name) is not None:
+        print("  (se descarta el checkpoint de una indexación anterior incompleta)")
+    if job is None:
+        job = new_job(collection_name)
+        save_job(job)
+
     if clear:
         print(f"Limpiando colección '{collection_name}'...")
         clear_collection(collection_name)
+    for name in physical_collections(collection_name):
+        for warning in sync_hnsw_settings(name):
+            print(f"  ⚠️  {warning}")
+        try:
+            check_embedding_dim(name)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
 
+    to_index = []
     for source in sources:
         if source.get("mode") == "sql":
             print(f"\n  Saltando '{source['name']}' (mode: sql, no se indexa)")
             continue
-        print(f"\nIndexando fuente '{source['name']}'...")
-        df = fetch_source(source, limit=limit)
-        index_source(df, collection_name, source)
+        if job["sources"].get(source["name"], {}).get("status") == "done":
+            print(f"\n  Saltando '{source['name']}' (completada en el job anterior)")
+            continue
+        to_index.append(source)
+
+    if jobs > 1 and len(to_index) > 1:
+        from parallel_index import index_sources_parallel
+        print(f"\nIndexando {len(to_index)} fuentes en paralelo ({min(jobs, len(to_index))} procesos)...")
+        try:
+            index_sources_parallel(collection_name, to_index, limit, job, jobs, prune=limit is None)
+        except Exception as e:
+            print(f"\nError indexando: {e}")
+            print(f"Checkpoint guardado. Reanuda con: python main.py -c {collection_name} index --resume")
+            sys.exit(1)
+    else:
+        for source in to_index:
+            print(f"\nIndexando fuente '{source['name']}'...")
+            try:
+                df = fetch_source(source, limit=limit)
+                index_source(df, collection_name, source, job=job, prune=limit is None)
+            except Exception as e:
+                print(f"\nError indexando '{source['name']}': {e}")
+                print(f"Checkpoint guardado. Reanuda con: python main.py -c {collection_name} index --resume")
+                sys.exit(1)
+
+    pending = [name for name, state in job["sources"].items() if state.get("status") != "done"]
+    if pending:
+        print(f"\n⚠️  Fuentes con enrichment incompleto: {', '.join(pending)}")
+        print(f"Reintenta con: python main.py -c {collection_name} index --resume")
+    else:
+        finish_job(collection_name)
 
     stats = get_collection_stats(collection_name)
     print(f"\nTotal en '{collection_name}': {stats['total_documents']:,} documentos")
@@ -102,24 +172,45 @@ def cmd_index(collection_name, source_name=None, limit=None, clear=False):
     # Generar/refrescar caché de esquemas automáticamente
     print(f"\nGenerando caché de esquemas...")
     try:
-        generate_schemas_cache(collection_name)
+        with metrics.timed("index.schema_cache"):
+            generate_schemas_cache(collection_name)
     except Exception as e:
         print(f"  ⚠️  Error al generar caché de esquemas: {e}")
 
+    metrics.print_summary("Métricas de indexación")
+    if metrics_json:
+        metrics.write_json(metrics_json)
+        print(f"  Métricas guardadas en {metrics_json}")
+
 
 def cmd_search(collection_name, query, n_results=10, filters=None):
-    from search import search, print_results
+    """Búsqueda en una colección, en varias separadas por coma o en todas (-c '*')."""
+    from search import search, federated_search, resolve_collections, print_results
 
     print(f"\nBuscando en '{collection_name}': '{query}'")
     if filters:
         print(f"  Filtros: {filters}")
 
-    results = search(
-        query=query,
-        collection_name=collection_name,
-        n_results=n_results,
-        filters=filters
-    )
+    try:
+        names = resolve_collections(collection_name)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if len(names) > 1:
+        timings = {}
+        results = federated_search(query, names, n_results=n_results, filters=filters, timings=timings)
+        print("  Latencia por colección: " + ", ".join(f"{n} {ms:.0f}ms" for n, ms in timings.items()))
+    else:
+        try:
+            results = search(
+                query=query,
+                collection_name=names[0],
+                n_results=n_results,
+                filters=filters
+            )
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
 
     print_results(results)
 
@@ -148,9 +239,25 @@ def cmd_stats(collection_name):
     stats = get_collection_stats(collection_name)
     print(f"\nEstadísticas de '{collection_name}':")
     print(f"  Documentos indexados: {stats['total_documents']:,}")
+    for name, count in stats.get("partitions", {}).items():
+        print(f"    {name}: {count:,}")
+
+
+def _toggle_timings(show_timings):
+    """Alterna /timings: activa las trazas y el desglose tras cada respuesta."""
+    import tracing
+
+    show_timings = not show_timings
+    if show_timings:
+        tracing.set_enabled(True)
+    else:
+        tracing.setup_from_config()
+    print(f"Desglose de tiempos: {'activado' if show_timings else 'desactivado'}")
+    return show_timings
 
 
 def cmd_chat(collection_name):
+    import tracing
     from config import get_collection_config
     from search import chat_stream
 
@@ -183,10 +290,12 @@ def cmd_chat(collection_name):
     print("  /filter campo=valor  - Aplicar filtro")
     print("  /clear               - Limpiar filtros")
     print("  /filters             - Ver filtros activos")
+    print("  /timings             - Mostrar/ocultar desglose de tiempos")
     print("  /quit                - Salir")
     print("\nSin /sql responde con conocimiento (RAG).\n")
 
     filters = {}
+    show_timings = False
 
     while True:
         try:
@@ -209,6 +318,9 @@ def cmd_chat(collection_name):
         elif query == "/filters":
             print(f"Filtros activos: {filters if filters else '(ninguno)'}")
 
+        elif query == "/timings":
+            show_timings = _toggle_timings(show_timings)
+
         elif query.startswith("/filter"):
             parts = query[7:].strip().split()
             for part in parts:
@@ -229,18 +341,29 @@ def cmd_chat(collection_name):
             stream = chat_stream(sql_query, collection_name, filters=active_filters,
                                  status_callback=show_status, force_sql=True)
             cancelled = False
-            for token in stream:
-                if isinstance(token, tuple) and token[0] == "__SQL_CONFIRM__":
-                    print(f"\n  SQL> {token[1]}")
-                    confirm = input("  Ejecutar? (s/n): ").strip().lower()
-                    if confirm != "s":
-                        print("  Cancelado.")
-                        cancelled = True
-                        break
-                    continue
-                print(token, end="", flush=True)
+            try:
+                for token in stream:
+                    if isinstance(token, tuple) and token[0] == "__SQL_CONFIRM__":
+                        print(f"\n  SQL> {token[1]}")
+                        if len(token) > 2 and token[2]:
+                            print(f"  {token[2]}")
+                        confirm = input("  Ejecutar? (s/n): ").strip().lower()
+                        if confirm != "s":
+                            print("  Cancelado.")
+                            cancelled = True
+                            stream.close()
+                            break
+                        continue
+                    print(token, end="", flush=True)
+            except KeyboardInterrupt:
+                # Cerrar el stream cancela la consulta en curso en el servidor
+                stream.close()
+                print("\n  Consulta cancelada.\n")
+                cancelled = True
             if not cancelled:
                 print("\n")
+            if show_timings:
+                print(tracing.format_trace() + "\n")
 
         else:
             active_filters = filters if filters else None
@@ -248,12 +371,15 @@ def cmd_chat(collection_name):
                                      status_callback=show_status, force_sql=False):
                 print(token, end="", flush=True)
             print("\n")
+            if show_timings:
+                print(tracing.format_trace() + "\n")
 
 
-def cmd_sql(collection_name, query, limit=None):
-    """Ejecutar consulta SQL directo contra la BD del collection."""
+def cmd_sql(collection_name, query, limit=None, output=None, use_cache=True, export=None):
+    """Ejecutar consulta SQL directo contra la BD del collection (filas impresas a medida que llegan)."""
     from config import get_collection_config
-    from db_connector import execute_query
+    from query_cache import cached_query, get_cache_settings
+    from sql_results import TablePrinter, ResultWriter
     
     cfg = get_collection_config(collection_name)
     
@@ -271,6 +397,7 @@ def cmd_sql(collection_name, query, limit=None):
     # Cargar credenciales
     import yaml
     import os
+    import time
     secrets_path = os.path.join(os.path.dirname(__file__), "collections.secrets.yaml")
     
     if os.path.exists(secrets_path):
@@ -286,49 +413,208 @@ def cmd_sql(collection_name, query, limit=None):
                     sql_source['password'] = source_secret['sql_enrich']['password']
                     break
     
+    if export:
+        # Extracción completa por lotes (sin límite salvo --limit explícito, sin caché)
+        from sql_results import export_query
+        try:
+            print(f"Exportando a {export}...")
+            rows = export_query(sql_source, query, export, max_rows=limit)
+        except KeyboardInterrupt:
+            print("\nExportación cancelada (la consulta se canceló en el servidor).")
+            sys.exit(130)
+        except Exception as e:
+            print(f"\nError: {e}")
+            sys.exit(1)
+        print(f"✓ {rows:,} filas exportadas a {export}")
+        return
+
     try:
         max_rows = limit if limit else 100
-        df = execute_query(sql_source, query, max_rows=max_rows)
-        
-        if len(df) == 0:
+        cache = get_cache_settings(collection_name)
+
+        def on_hit(entry):
+            print(f"(resultado desde caché local, hace {time.time() - entry['created']:.0f}s; --no-cache para consultar la BD)")
+
+        printer = TablePrinter()
+        writer = ResultWriter(output) if output else None
+        rows = 0
+        try:
+            batches = cached_query(sql_source, query, max_rows=max_rows, ttl=cache["ttl"],
+                                   use_cache=use_cache and cache["enabled"], on_hit=on_hit)
+            for columns, batch in batches:
+                if rows == 0 and batch:
+                    print("\n=== RESULTADOS ===\n")
+                printer.print_batch(columns, batch)
+                if writer:
+                    writer.write(columns, batch)
+                rows += len(batch)
+        finally:
+            if writer:
+                writer.close()
+
+        if rows == 0:
             print("0 filas devueltas")
         else:
-            print(f"\n=== RESULTADOS ({len(df)} filas) ===\n")
-            # Mostrar resultados con formato tabla
-            print(df.to_string(index=False))
-            
-            if len(df) == max_rows:
+            print(f"\n({rows} filas)")
+            if rows == max_rows:
                 print(f"\n⚠️  Resultados limitados a {max_rows} filas. Usa --limit para cambiar.")
+        if writer:
+            print(f"Resultados guardados en {output}")
         
+    except KeyboardInterrupt:
+        print("\nConsulta cancelada.")
+        sys.exit(130)
     except Exception as e:
         print(f"Error: {e}")
         sys.exit(1)
 
 
+def cmd_mirror(collection_name, source_name=None, sample=1000, output_dir=None, max_values=None):
+    from mirror import build_mirror
+
+    try:
+        manifest = build_mirror(collection_name, source_name=source_name, sample=sample,
+                                output_dir=output_dir, max_values=max_values)
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if manifest["failed"]:
+        print(f"\n⚠️  {len(manifest['failed'])} tabla(s) no se copiaron: {', '.join(manifest['failed'])}")
+
+
+def cmd_cache(invalidate=None, clear=False, clear_answers=None):
+    from query_cache import cache_stats, clear_cache, invalidate_tables
+
+    if clear_answers:
+        from answer_cache import clear as clear_answer_cache
+        collection = None if clear_answers == "*" else clear_answers
+        print(f"Caché de respuestas vaciada ({clear_answer_cache(collection)} respuesta(s))")
+        return
+    if clear:
+        print(f"Caché vaciada ({clear_cache()} resultado(s))")
+        return
+    if invalidate:
+        print(f"Invalidados {invalidate_tables(invalidate)} resultado(s) que usan: {', '.join(invalidate)}")
+        return
+
+    entries = cache_stats()
+    if not entries:
+        print("Caché de resultados vacía")
+        return
+    print(f"\nCaché de resultados ({len(entries)}):\n")
+    for entry in entries:
+        sql = " ".join(entry["sql"].split())
+        print(f"  hace {entry['age']:>7.0f}s  {entry['rows']:>7} filas  [{', '.join(entry['tables'])}]  {sql[:80]}")
+
+
+def cmd_export(collection_name, path, dtype="float32"):
+    import os
+    import time
+    from snapshot import export_collection
+
+    start = time.perf_counter()
+    try:
+        manifest = export_collection(collection_name, path, dtype=dtype)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    size = os.path.getsize(path) / 1024 / 1024
+    print(f"\n✓ {manifest['count']} documentos exportados a {path} ({size:.1f} MB, "
+          f"{manifest['embedding_model']} dim {manifest['dimension']} {manifest['dtype']}) "
+          f"en {time.perf_counter() - start:.1f}s")
+
+
+def cmd_import(path, collection_name=None, clear=False, force=False):
+    import time
+    from snapshot import import_collection
+
+    start = time.perf_counter()
+    try:
+        manifest = import_collection(path, collection_name=collection_name, clear=clear, force=force)
+    except (ValueError, FileNotFoundError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"\n✓ {manifest['count']} documentos importados en '{manifest['collection']}' "
+          f"({manifest['embedding_model']} dim {manifest['dimension']}) en {time.perf_counter() - start:.1f}s")
+
+
+def cmd_warmup(collection_spec=None, chat=True):
+    from warmup import print_warmup_report, warmup
+
+    collections = None
+    if collection_spec and collection_spec != "*":
+        collections = [c.strip() for c in collection_spec.split(",") if c.strip()]
+    print("Precargando modelos e índices...")
+    print_warmup_report(warmup(collections, chat=chat))
+
+
+def cmd_tune(collection_name, sample=100, k=10, target=0.95, grid=None, apply=False):
+    from hnsw_tune import apply_settings, print_tune_report, tune
+
+    try:
+        report = tune(collection_name, sample=sample, k=k, target_recall=target, grid=grid)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print_tune_report(report)
+    if apply:
+        best = report["recommended"]
+        settings = {key: best[key] for key in ("M", "construction_ef", "search_ef")}
+        try:
+            done = apply_settings(collection_name, settings)
+        except (ValueError, RuntimeError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print(f"\n✓ {done}")
+        print("  Copia la sección hnsw a collections.yaml para que un index --clear la conserve")
+
+
+def cmd_eval(collection_name, golden_path, ks=None, hybrid="auto", repeat=1, output=None, show_misses=False,
+             dims=None):
+    import json
+    from evaluation import load_golden, evaluate, evaluate_dims, print_dims_report, print_report
+
+    golden = load_golden(golden_path)
+    if dims:
+        try:
+            report = evaluate_dims(collection_name, golden, dims, k=max(ks) if ks else None, repeat=repeat)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print_dims_report(report)
+        if output:
+            with open(output, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            print(f"\n  Reporte en {output}")
+        return
+    modes = {"auto": None, "on": [True], "off": [False], "both": [False, True]}[hybrid]
+    report = evaluate(collection_name, golden, ks=ks, hybrid_modes=modes, repeat=repeat)
+    print_report(report, show_misses=show_misses)
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n  Reporte en {output}")
+
+
 def cmd_schema(table_name):
     """Buscar esquema literal de una tabla (sin embeddings, búsqueda directa)."""
-    import json
-    import os
+    from schema_cache import DEFAULT_CACHE_PATH, load_schemas_cache, find_table_schema
 
-    cache_path = os.path.join(os.path.dirname(__file__), "data", "schemas_cache.json")
-    
-    if not os.path.isfile(cache_path):
-        print(f"Error: Caché de esquemas no encontrado en {cache_path}")
+    schemas = load_schemas_cache()
+    if schemas is None:
+        print(f"Error: Caché de esquemas no encontrado en {DEFAULT_CACHE_PATH}")
         print("Ejecuta: python main.py -c <coleccion> index")
         sys.exit(1)
     
-    with open(cache_path, "r", encoding="utf-8") as f:
-        schemas = json.load(f)
-    
-    table_lower = table_name.lower()
-    
     # Búsqueda exacta
-    for tabla, cols in schemas.items():
-        if tabla.lower() == table_lower:
-            print(f"\nEsquema {tabla} ({len(cols)} columnas):\n")
-            for col in cols:
-                print(f"  {col}")
-            return
+    found = find_table_schema(schemas, table_name)
+    if found:
+        tabla, cols = found
+        print(f"\nEsquema {tabla} ({len(cols)} columnas):\n")
+        for col in cols:
+            print(f"  {col}")
+        return
     
     # Si no hay coincidencia exacta, sugerir similares
     print(f"\n✗ Tabla '{table_name}' no encontrada")
@@ -339,6 +625,7 @@ def cmd_schema(table_name):
 
 
 def cmd_interactive(collection_name):
+    import tracing
     from config import get_collection_config
     from search import search, print_results
 
@@ -352,12 +639,14 @@ def cmd_interactive(collection_name):
     print("  /filter campo=valor  - Aplicar filtro")
     print("  /clear               - Limpiar filtros")
     print("  /filters             - Ver filtros activos")
+    print("  /timings             - Mostrar/ocultar desglose de tiempos")
     print("  /quit                - Salir")
     print(f"\nFuentes: {', '.join(source_names)}")
     print("Tip: usa /filter _source=shipments para filtrar por fuente")
     print("\nO escribe tu búsqueda semántica.\n")
 
     filters = {}
+    show_timings = False
 
     while True:
         try:
@@ -380,6 +669,9 @@ def cmd_interactive(collection_name):
         elif query == "/filters":
             print(f"Filtros activos: {filters if filters else '(ninguno)'}")
 
+        elif query == "/timings":
+            show_timings = _toggle_timings(show_timings)
+
         elif query.startswith("/filter"):
             parts = query[7:].strip().split()
             for part in parts:
@@ -399,6 +691,8 @@ def cmd_interactive(collection_name):
                 filters=active_filters
             )
             print_results(results)
+            if show_timings:
+                print(tracing.format_trace() + "\n")
 
 
 def main():
@@ -408,7 +702,7 @@ def main():
         epilog=__doc__
     )
 
-    parser.add_argument("-c", "--collection", help="Nombre de la colección")
+    parser.add_argument("-c", "--collection", help="Nombre de la colección (search: varias separadas por coma, o '*')")
 
     subparsers = parser.add_subparsers(dest="command", help="Comandos disponibles")
 
@@ -419,6 +713,11 @@ def main():
     index_parser.add_argument("--source", help="Indexar solo esta fuente")
     index_parser.add_argument("--limit", type=int, help="Límite de registros por fuente")
     index_parser.add_argument("--clear", action="store_true", help="Limpiar colección antes de indexar")
+    index_parser.add_argument("--resume", action="store_true",
+                              help="Reanudar la última indexación interrumpida desde su checkpoint")
+    index_parser.add_argument("--jobs", type=int, default=1,
+                              help="Fuentes a indexar en paralelo (procesos, default: 1)")
+    index_parser.add_argument("--metrics-json", help="Guardar métricas por etapa en este archivo JSON")
 
     search_parser = subparsers.add_parser("search", help="Buscar en la colección")
     search_parser.add_argument("query", help="Texto de búsqueda")
@@ -433,16 +732,67 @@ def main():
     sql_parser = subparsers.add_parser("sql", help="Ejecutar consulta SQL directo")
     sql_parser.add_argument("query", help="Consulta SQL")
     sql_parser.add_argument("--limit", type=int, help="Límite de filas (default: 100)")
+    sql_parser.add_argument("--output", help="Guardar las filas en CSV o Parquet (.csv / .parquet)")
+    sql_parser.add_argument("--no-cache", action="store_true", help="Consultar la BD aunque haya resultado en caché")
+    sql_parser.add_argument("--export", help="Exportar el resultado completo (sin límite) a .parquet o .csv, por lotes")
+
+    mirror_parser = subparsers.add_parser("mirror", help="Copiar tablas documentadas a DuckDB/Parquet local")
+    mirror_parser.add_argument("--source", help="Fuente con sql_enrich (default: la primera)")
+    mirror_parser.add_argument("--sample", type=int, default=1000, help="Filas de muestra por tabla (default: 1000)")
+    mirror_parser.add_argument("--max-values", type=int, help="Valores distintos por dimensión (default: max_values de sql_enrich)")
+    mirror_parser.add_argument("--output", help="Directorio del espejo (default: data/mirror/<coleccion>)")
+
+    cache_parser = subparsers.add_parser("cache", help="Caché local de resultados SQL")
+    cache_parser.add_argument("--invalidate", nargs="+", metavar="TABLA", help="Invalidar resultados que usan estas tablas/vistas")
+    cache_parser.add_argument("--clear", action="store_true", help="Vaciar la caché")
+    cache_parser.add_argument("--clear-answers", nargs="?", const="*", metavar="COLECCION",
+                              help="Vaciar la caché de respuestas RAG (de una colección o de todas)")
+
+    export_parser = subparsers.add_parser("export", help="Exportar la colección (vectores incluidos) a .arrow/.parquet")
+    export_parser.add_argument("path", help="Archivo destino (.arrow o .parquet)")
+    export_parser.add_argument("--dtype", choices=["float32", "float16"], default="float32",
+                               help="Tipo de los vectores (float16: mitad de tamaño)")
+
+    import_parser = subparsers.add_parser("import", help="Restaurar una colección desde un export (sin Ollama ni BD)")
+    import_parser.add_argument("path", help="Archivo .arrow o .parquet de export")
+    import_parser.add_argument("--clear", action="store_true", help="Reemplazar la colección si ya tiene documentos")
+    import_parser.add_argument("--force", action="store_true",
+                               help="Importar aunque el modelo de embeddings no coincida con la configuración")
 
     schema_parser = subparsers.add_parser("schema", help="Consultar esquema de tabla (búsqueda literal)")
     schema_parser.add_argument("table", help="Nombre de la tabla")
 
+    eval_parser = subparsers.add_parser("eval", help="Evaluar recall/MRR/latencia con preguntas golden")
+    eval_parser.add_argument("--golden", required=True, help="YAML con preguntas e IDs esperados")
+    eval_parser.add_argument("-k", help="Valores de n_results separados por coma (default: los del golden)")
+    eval_parser.add_argument("--hybrid", choices=["auto", "on", "off", "both"], default="auto",
+                             help="Aplicar filtros de cada pregunta (auto: ambos si hay filtros)")
+    eval_parser.add_argument("--repeat", type=int, default=1, help="Repeticiones por consulta para la latencia")
+    eval_parser.add_argument("--output", help="Guardar el reporte en JSON")
+    eval_parser.add_argument("--misses", action="store_true", help="Listar preguntas sin recall completo")
+    eval_parser.add_argument("--dims", help="Comparar dimensiones de embedding recortadas (ej: 256,384,512)")
+
+    warmup_parser = subparsers.add_parser("warmup", help="Precargar modelos de Ollama e índices (latencia fría vs caliente)")
+    warmup_parser.add_argument("--no-chat", action="store_true", help="No precargar el modelo de chat")
+
+    tune_parser = subparsers.add_parser("tune", help="Ajustar parámetros HNSW (recall vs latencia)")
+    tune_parser.add_argument("--sample", type=int, default=100, help="Preguntas held-out (default: 100)")
+    tune_parser.add_argument("-k", type=int, default=10, help="Vecinos para recall@k (default: 10)")
+    tune_parser.add_argument("--target", type=float, default=0.95, help="Recall mínimo (default: 0.95)")
+    tune_parser.add_argument("--m", help="Valores de M separados por coma (default: 8,16,32)")
+    tune_parser.add_argument("--construction-ef", help="Valores de construction_ef (default: 100,200)")
+    tune_parser.add_argument("--search-ef", help="Valores de search_ef (default: 10,20,50,100,200)")
+    tune_parser.add_argument("--apply", action="store_true", help="Aplicar la recomendación a la colección")
+
     subparsers.add_parser("chat", help="Chat interactivo con RAG (como ollama run pero con BD vectorial)")
     subparsers.add_parser("stats", help="Mostrar estadísticas")
     subparsers.add_parser("interactive", help="Modo interactivo (búsqueda)")
 
     args = parser.parse_args()
 
+    from tracing import setup_from_config
+    setup_from_config()
+
     if args.command == "check":
         success = cmd_check()
         sys.exit(0 if success else 1)
@@ -453,7 +803,16 @@ def main():
     elif args.command == "schema":
         cmd_schema(args.table)
 
-    elif args.command in ("index", "search", "ask", "sql", "chat", "stats", "interactive"):
+    elif args.command == "cache":
+        cmd_cache(invalidate=args.invalidate, clear=args.clear, clear_answers=args.clear_answers)
+
+    elif args.command == "warmup":
+        cmd_warmup(args.collection, chat=not args.no_chat)
+
+    elif args.command == "import":
+        cmd_import(args.path, collection_name=args.collection, clear=args.clear, force=args.force)
+
+    elif args.command in ("index", "search", "ask", "sql", "eval", "mirror", "export", "tune", "chat", "stats", "interactive"):
         if not args.collection:
             print("Error: Debes especificar una colección con -c/--collection")
             sys.exit(1)
@@ -463,7 +822,10 @@ def main():
                 args.collection,
                 source_name=args.source,
                 limit=args.limit,
-                clear=args.clear
+                clear=args.clear,
+                resume=args.resume,
+                jobs=args.jobs,
+                metrics_json=args.metrics_json
             )
 
         elif args.command == "search":
@@ -496,7 +858,49 @@ def main():
             cmd_sql(
                 args.collection,
                 query=args.query,
-                limit=args.limit
+                limit=args.limit,
+                output=args.output,
+                use_cache=not args.no_cache,
+                export=args.export
+            )
+
+        elif args.command == "mirror":
+            cmd_mirror(
+                args.collection,
+                source_name=args.source,
+                sample=args.sample,
+                output_dir=args.output,
+                max_values=args.max_values
+            )
+
+        elif args.command == "export":
+            cmd_export(args.collection, args.path, dtype=args.dtype)
+
+        elif args.command == "tune":
+            grid = {}
+            for key, value in (("M", args.m), ("construction_ef", args.construction_ef),
+                               ("search_ef", args.search_ef)):
+                if value:
+                    grid[key] = [int(v) for v in value.split(",")]
+            cmd_tune(
+                args.collection,
+                sample=args.sample,
+                k=args.k,
+                target=args.target,
+                grid=grid,
+                apply=args.apply
+            )
+
+        elif args.command == "eval":
+            cmd_eval(
+                args.collection,
+                golden_path=args.golden,
+                ks=[int(k) for k in args.k.split(",")] if args.k else None,
+                hybrid=args.hybrid,
+                repeat=args.repeat,
+                output=args.output,
+                show_misses=args.misses,
+                dims=[int(d) for d in args.dims.split(",")] if args.dims else None
             )
 
         elif args.command == "chat":
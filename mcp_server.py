@@ -32,10 +32,10 @@ def listar_colecciones() -> str:
 @mcp.tool()
 def buscar(coleccion: str, consulta: str, n_resultados: int = 5, fuente: str = None) -> str:
     """
-    Búsqueda semántica en una colección vectorial.
+    Búsqueda semántica en una o varias colecciones vectoriales.
 
     Args:
-        coleccion: Nombre de la colección (ej: geca, mides)
+        coleccion: Nombre de la colección (ej: geca, mides), varias separadas por coma, o * para todas
         consulta: Texto de búsqueda en lenguaje natural
         n_resultados: Número de resultados a retornar (default 5)
         fuente: Filtrar por fuente específica (ej: shipments, conceptos). Opcional.
@@ -60,8 +60,9 @@ def buscar(coleccion: str, consulta: str, n_resultados: int = 5, fuente: str = N
         source = meta.get("_source", "?")
         sim = r["similarity"]
 
-        meta_str = " | ".join(f"{k}: {v}" for k, v in meta.items() if k != "_source")
-        lines.append(f"[{i}] (similitud: {sim:.3f}, fuente: {source})")
+        meta_str = " | ".join(f"{k}: {v}" for k, v in meta.items() if k not in ("_source", "_collection"))
+        origin = f", colección: {meta['_collection']}" if "_collection" in meta else ""
+        lines.append(f"[{i}] (similitud: {sim:.3f}, fuente: {source}{origin})")
         lines.append(f"    Documento: {r['document']}")
         if meta_str:
             lines.append(f"    Metadata: {meta_str}")
@@ -84,5 +85,18 @@ def estadisticas(coleccion: str) -> str:
     return f"Colección '{coleccion}': {stats['total_documents']:,} documentos indexados"
 
 
+def _warmup_in_background():
+    """Precarga modelos e índices sin bloquear el inicio (stdout es del protocolo MCP)."""
+    from warmup import print_warmup_report, warmup
+
+    try:
+        print_warmup_report(warmup(), print_fn=lambda line: print(line, file=sys.stderr))
+    except Exception as e:
+        print(f"warmup falló: {e}", file=sys.stderr)
+
+
 if __name__ == "__main__":
+    import threading
+
+    threading.Thread(target=_warmup_in_background, daemon=True).start()
     mcp.run(transport="stdio")
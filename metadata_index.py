@@ -0,0 +1,243 @@
+"""
+Índice invertido local de metadata para búsquedas filtradas.
+
+Mapea campo=valor -> documentos (posición = orden de alta del ID). Lo
+mantiene index_source y lo usa search para estimar la selectividad de un
+filtro antes de consultar ChromaDB.
+
+Cada valor se guarda como bitmap (un int de Python usado como bitset) si lo
+tienen al menos 1/_SPARSE_RATIO de los documentos, o como conjunto de
+posiciones si es raro: un campo de alta cardinalidad (un `numero` único por
+documento) ocupa memoria lineal, no un bitmap de N bits por valor.
+
+Se persiste como JSON junto a los datos de ChromaDB:
+    <persist_directory>/_metadata_index/<coleccion>.json
+
+Los documentos deduplicados guardan en `_refs` (JSON) la lista de
+referencias fuente/regla/cliente que los generan; cada valor de esas
+referencias también se indexa, así `_source=x` encuentra un documento
+compartido por varias fuentes.
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional
+from config import PARTITION_SEP, get_chroma_config
+
+
+REFS_KEY = "_refs"
+
+# Un valor pasa a bitmap cuando lo tiene al menos 1 de cada _SPARSE_RATIO documentos
+_SPARSE_RATIO = 64
+
+
+def parse_refs(metadata: Optional[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Lista de referencias de un documento (vacía si no está deduplicado)."""
+    raw = (metadata or {}).get(REFS_KEY)
+    if not raw:
+        return []
+    try:
+        return json.loads(raw)
+    except (TypeError, ValueError):
+        return []
+
+
+def dump_refs(refs: List[Dict[str, str]]) -> str:
+    return json.dumps(refs, ensure_ascii=False, sort_keys=True)
+
+
+def merge_refs(base: List[Dict[str, str]], extra: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Unión de referencias conservando el orden de aparición."""
+    merged = list(base)
+    seen = {tuple(sorted(ref.items())) for ref in base}
+    for ref in extra:
+        key = tuple(sorted(ref.items()))
+        if key not in seen:
+            seen.add(key)
+            merged.append(ref)
+    return merged
+
+
+def _field_values(metadata: Optional[Dict[str, Any]]):
+    """Pares (campo, valor) indexables: metadata escalar + valores de `_refs`."""
+    for field, value in (metadata or {}).items():
+        if field != REFS_KEY:
+            yield field, str(value)
+    for ref in parse_refs(metadata):
+        for field, value in ref.items():
+            yield field, str(value)
+
+
+def _index_path(collection_name: str) -> str:
+    cfg = get_chroma_config()
+    return os.path.join(cfg["persist_directory"], "_metadata_index", f"{collection_name}.json")
+
+
+def _empty_index() -> Dict[str, Any]:
+    return {"ids": [], "fields": {}}
+
+
+def _is_dense(count: int, total: int) -> bool:
+    return count * _SPARSE_RATIO >= total
+
+
+def _to_bits(entry) -> int:
+    """Bitmap de un valor, esté guardado denso (int) o disperso (posiciones)."""
+    if isinstance(entry, int):
+        return entry
+    if not entry:
+        return 0
+    buffer = bytearray(max(entry) // 8 + 1)
+    for position in entry:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def _entry_count(entry) -> int:
+    return entry.bit_count() if isinstance(entry, int) else len(entry)
+
+
+def load_index(collection_name: str) -> Optional[Dict[str, Any]]:
+    """Carga el índice de la colección. None si la colección no tiene índice."""
+    path = _index_path(collection_name)
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    fields = {
+        field: {value: int(entry, 16) if isinstance(entry, str) else set(entry) for value, entry in values.items()}
+        for field, values in raw.get("fields", {}).items()
+    }
+    ids = raw.get("ids", [])
+    return {"ids": ids, "positions": {doc_id: i for i, doc_id in enumerate(ids)}, "fields": fields}
+
+
+def save_index(collection_name: str, index: Dict[str, Any]) -> None:
+    """
+    Escribe el índice de forma atómica (archivo temporal + rename). Cada
+    valor se guarda como bitmap hex o como lista de posiciones según su
+    frecuencia actual.
+    """
+    path = _index_path(collection_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    total = len(index["ids"])
+    fields = {}
+    for field, values in index["fields"].items():
+        encoded = {}
+        for value, entry in values.items():
+            count = _entry_count(entry)
+            if not count:
+                continue
+            if _is_dense(count, total):
+                encoded[value] = format(_to_bits(entry), "x")
+            elif isinstance(entry, int):
+                encoded[value] = _positions(entry)
+            else:
+                encoded[value] = sorted(entry)
+        fields[field] = encoded
+    raw = {"ids": index["ids"], "fields": fields}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(raw, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def index_version(collection_name: str) -> str:
+    """
+    Token que cambia cada vez que se reescribe el índice (indexar, --clear).
+    Una colección particionada combina los índices de sus particiones.
+    """
+    path = _index_path(collection_name)
+    directory = os.path.dirname(path)
+    paths = [path] if os.path.isfile(path) else []
+    if os.path.isdir(directory):
+        prefix = f"{collection_name}{PARTITION_SEP}"
+        paths += sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                        if f.startswith(prefix) and f.endswith(".json"))
+    if not paths:
+        return "none"
+    stats = [os.stat(p) for p in paths]
+    return ".".join(f"{stat.st_mtime_ns:x}-{stat.st_size:x}" for stat in stats)
+
+
+def drop_index(collection_name: str) -> None:
+    path = _index_path(collection_name)
+    if os.path.isfile(path):
+        os.remove(path)
+
+
+def update_index(index: Optional[Dict[str, Any]], ids: List[str], metadatas: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Agrega (o reemplaza) los documentos al índice en memoria.
+
+    Los IDs ya existentes conservan su posición; sus bits previos se limpian
+    antes de registrar la metadata nueva.
+    """
+    if index is None:
+        index = _empty_index()
+    index.setdefault("positions", {doc_id: i for i, doc_id in enumerate(index["ids"])})
+    positions = index["positions"]
+    fields = index["fields"]
+
+    replaced = {positions[doc_id] for doc_id in ids if doc_id in positions}
+    if replaced:
+        mask = _to_bits(replaced)
+        for values in fields.values():
+            for value, entry in values.items():
+                if isinstance(entry, int):
+                    values[value] = entry & ~mask
+                else:
+                    entry -= replaced
+
+    for doc_id, meta in zip(ids, metadatas):
+        if doc_id not in positions:
+            positions[doc_id] = len(index["ids"])
+            index["ids"].append(doc_id)
+        position = positions[doc_id]
+        for field, value in _field_values(meta):
+            values = fields.setdefault(field, {})
+            entry = values.get(value)
+            if entry is None:
+                values[value] = {position}
+            elif isinstance(entry, int):
+                values[value] = entry | (1 << position)
+            else:
+                entry.add(position)
+                if len(entry) > 1 and _is_dense(len(entry), len(index["ids"])):
+                    values[value] = _to_bits(entry)
+    return index
+
+
+def rebuild_index(collection_name: str, collection, batch_size: int = 5000) -> Dict[str, Any]:
+    """Reconstruye y guarda el índice leyendo la metadata de la colección (sin vectores)."""
+    index = _empty_index()
+    total = collection.count()
+    for offset in range(0, total, batch_size):
+        data = collection.get(limit=batch_size, offset=offset, include=["metadatas"])
+        index = update_index(index, data["ids"], [m or {} for m in data["metadatas"]])
+    save_index(collection_name, index)
+    return index
+
+
+def match_filters(index: Dict[str, Any], filters: Dict[str, Any]) -> int:
+    """Bitmap de los documentos que cumplen todos los filtros campo=valor."""
+    bits = (1 << len(index["ids"])) - 1
+    for field, value in filters.items():
+        bits &= _to_bits(index["fields"].get(field, {}).get(str(value), 0))
+        if not bits:
+            break
+    return bits
+
+
+def bitmap_count(bits: int) -> int:
+    return bits.bit_count()
+
+
+def _positions(bits: int) -> List[int]:
+    # bin() es big-endian: se invierte para que el carácter i sea la posición i
+    return [i for i, flag in enumerate(bin(bits)[:1:-1]) if flag == "1"]
+
+
+def bitmap_ids(index: Dict[str, Any], bits: int) -> List[str]:
+    ids = index["ids"]
+    return [ids[i] for i in _positions(bits)]
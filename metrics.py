@@ -0,0 +1,198 @@
+"""
+Instrumentación ligera: tiempos por etapa, contadores e histogramas.
+
+API mínima para que cualquier módulo registre lo que hace:
+
+    from metrics import timed, incr, observe
+
+    with timed("index.embed"):
+        ...
+    incr("docs.embedded", len(batch))
+    observe("embedding.latency_ms", 12.3)
+
+Los datos viven en un registro en memoria por proceso; `snapshot()` y
+`merge()` permiten juntar los de varios procesos (indexación en paralelo).
+Cada histograma guarda conteo, suma, máximo y buckets exactos y una muestra
+acotada (reservoir) para los percentiles: la memoria no crece en procesos
+largos (MCP, chat) aunque se registre una muestra por embedding.
+`summary()` calcula percentiles y throughput, `print_summary()` muestra la
+tabla final y `write_json()` la exporta (`main.py index --metrics-json`).
+"""
+
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+_HISTOGRAM_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+# Muestras guardadas por histograma (percentiles exactos hasta este tamaño)
+_RESERVOIR_SIZE = 2048
+
+_lock = threading.Lock()
+_registry = {"stages": {}, "counters": {}, "histograms": {}, "started": time.perf_counter()}
+
+
+def reset() -> None:
+    with _lock:
+        _registry["stages"] = {}
+        _registry["counters"] = {}
+        _registry["histograms"] = {}
+        _registry["started"] = time.perf_counter()
+
+
+def record_time(stage: str, seconds: float) -> None:
+    with _lock:
+        entry = _registry["stages"].setdefault(stage, {"seconds": 0.0, "calls": 0})
+        entry["seconds"] += seconds
+        entry["calls"] += 1
+
+
+@contextmanager
+def timed(stage: str):
+    """Mide el tiempo del bloque y lo acumula en la etapa `stage`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_time(stage, time.perf_counter() - start)
+
+
+def incr(name: str, value: int = 1) -> None:
+    with _lock:
+        _registry["counters"][name] = _registry["counters"].get(name, 0) + value
+
+
+def _new_histogram() -> Dict[str, Any]:
+    return {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * len(_HISTOGRAM_BUCKETS_MS), "samples": []}
+
+
+def observe(name: str, value: float) -> None:
+    """Agrega una muestra al histograma `name`."""
+    with _lock:
+        hist = _registry["histograms"].get(name)
+        if hist is None:
+            hist = _registry["histograms"][name] = _new_histogram()
+        hist["count"] += 1
+        hist["sum"] += value
+        hist["max"] = max(hist["max"], value) if hist["count"] > 1 else value
+        for i, bound in enumerate(_HISTOGRAM_BUCKETS_MS):
+            if value <= bound:
+                hist["buckets"][i] += 1
+        samples = hist["samples"]
+        if len(samples) < _RESERVOIR_SIZE:
+            samples.append(value)
+        else:
+            # Reservoir sampling: cada muestra vista queda con la misma probabilidad
+            j = random.randrange(hist["count"])
+            if j < _RESERVOIR_SIZE:
+                samples[j] = value
+
+
+def snapshot() -> Dict[str, Any]:
+    """Copia serializable del registro (para enviarla entre procesos)."""
+    with _lock:
+        return {
+            "stages": {k: dict(v) for k, v in _registry["stages"].items()},
+            "counters": dict(_registry["counters"]),
+            "histograms": {k: {**v, "buckets": list(v["buckets"]), "samples": list(v["samples"])}
+                           for k, v in _registry["histograms"].items()},
+        }
+
+
+def merge(other: Dict[str, Any]) -> None:
+    """Suma al registro local un snapshot de otro proceso."""
+    for stage, entry in other.get("stages", {}).items():
+        with _lock:
+            local = _registry["stages"].setdefault(stage, {"seconds": 0.0, "calls": 0})
+            local["seconds"] += entry["seconds"]
+            local["calls"] += entry["calls"]
+    for name, value in other.get("counters", {}).items():
+        incr(name, value)
+    with _lock:
+        for name, hist in other.get("histograms", {}).items():
+            local = _registry["histograms"].get(name)
+            if local is None:
+                local = _registry["histograms"][name] = _new_histogram()
+            total = local["count"] + hist["count"]
+            if total == 0:
+                continue
+            # Cada muestra conserva un peso proporcional a las observaciones que representa
+            if len(local["samples"]) + len(hist["samples"]) > _RESERVOIR_SIZE:
+                keep = round(_RESERVOIR_SIZE * local["count"] / total)
+                local["samples"] = (random.sample(local["samples"], min(keep, len(local["samples"])))
+                                    + random.sample(hist["samples"],
+                                                    min(_RESERVOIR_SIZE - keep, len(hist["samples"]))))
+            else:
+                local["samples"].extend(hist["samples"])
+            local["max"] = max(local["max"], hist["max"]) if local["count"] else hist["max"]
+            local["count"] = total
+            local["sum"] += hist["sum"]
+            local["buckets"] = [a + b for a, b in zip(local["buckets"], hist["buckets"])]
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def _histogram(hist: Dict[str, Any]) -> Dict[str, Any]:
+    values = sorted(hist["samples"])
+    buckets = {f"<={bound}": n for bound, n in zip(_HISTOGRAM_BUCKETS_MS, hist["buckets"])}
+    buckets["+inf"] = hist["count"]
+    return {
+        "count": hist["count"],
+        "mean": hist["sum"] / hist["count"] if hist["count"] else 0.0,
+        "p50": _percentile(values, 50),
+        "p95": _percentile(values, 95),
+        "p99": _percentile(values, 99),
+        "max": hist["max"],
+        "buckets": buckets,
+    }
+
+
+def summary() -> Dict[str, Any]:
+    """Resumen con tiempos por etapa, contadores, throughput e histogramas."""
+    data = snapshot()
+    with _lock:
+        wall = time.perf_counter() - _registry["started"]
+    counters = data["counters"]
+    throughput = {}
+    if wall > 0:
+        for counter, label in (("rows.extracted", "rows_per_s"), ("docs.prepared", "docs_per_s"),
+                               ("docs.embedded", "embeddings_per_s")):
+            if counter in counters:
+                throughput[label] = counters[counter] / wall
+    return {
+        "wall_seconds": wall,
+        "stages": data["stages"],
+        "counters": counters,
+        "throughput": throughput,
+        "histograms": {name: _histogram(hist) for name, hist in data["histograms"].items()},
+    }
+
+
+def print_summary(title: str = "Métricas") -> None:
+    data = summary()
+    wall = data["wall_seconds"]
+    print(f"\n{title} ({wall:.1f}s):")
+    if data["stages"]:
+        print(f"  {'Etapa':<24}{'Tiempo (s)':>12}{'Llamadas':>10}{'% total':>9}")
+        for stage, entry in sorted(data["stages"].items(), key=lambda kv: -kv[1]["seconds"]):
+            share = entry["seconds"] / wall * 100 if wall else 0.0
+            print(f"  {stage:<24}{entry['seconds']:>12.2f}{entry['calls']:>10}{share:>8.1f}%")
+    for name, value in sorted(data["counters"].items()):
+        print(f"  {name:<24}{value:>12,}")
+    for label, value in data["throughput"].items():
+        print(f"  {label:<24}{value:>12.1f}")
+    for name, hist in data["histograms"].items():
+        print(f"  {name:<24} p50={hist['p50']:.1f} p95={hist['p95']:.1f} "
+              f"p99={hist['p99']:.1f} max={hist['max']:.1f} (n={hist['count']})")
+
+
+def write_json(path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary(), f, indent=2, ensure_ascii=False)
@@ -0,0 +1,208 @@
+"""
+Espejo local (DuckDB + Parquet) de las tablas documentadas de una colección.
+
+    python main.py -c proyectos mirror --sample 1000
+
+Por cada tabla de la columna `tabla` del CSV de la fuente con `sql_enrich`
+se copian, desde la BD de producción:
+  - las columnas con su tipo (mapeado a un tipo DuckDB),
+  - una muestra de filas (`--sample`),
+  - los valores distintos de cada dimensión (`dimensiones`), hasta
+    `max_values`, agregados como filas para que un SELECT DISTINCT local
+    devuelva el mismo catálogo que la BD.
+
+Resultado en `data/mirror/<coleccion>/`:
+    mirror.duckdb        una tabla por tabla documentada
+    <tabla>.parquet      la misma tabla en Parquet
+    manifest.json        origen, fecha, filas y columnas por tabla
+
+Para indexar sin túnel, apuntar `sql_enrich` al espejo:
+    sql_enrich:
+      type: duckdb
+      path: "./data/mirror/proyectos/mirror.duckdb"
+
+Los esquemas muestran los tipos DuckDB (VARCHAR, BIGINT...) en vez de los
+del motor original.
+"""
+
+import json
+import os
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from config import get_collection_config
+from db_connector import build_sample_query, fetch_distinct_values, fetch_table_columns, iter_query
+from metrics import timed, incr
+from vector_store import _split_list
+
+# Tipo del motor origen (MSSQL / MariaDB) -> tipo DuckDB; lo demás queda VARCHAR
+_TYPE_MAP = [
+    (r"^(tinyint|smallint|int|integer|bigint|mediumint)$", "BIGINT"),
+    (r"^(bit|bool|boolean)$", "BOOLEAN"),
+    (r"^(decimal|numeric|money|smallmoney|float|real|double)", "DOUBLE"),
+    (r"^date$", "DATE"),
+    (r"^(datetime|datetime2|smalldatetime|timestamp|datetimeoffset)", "TIMESTAMP"),
+    (r"^time$", "TIME"),
+]
+
+
+def duckdb_type(source_type: Optional[str]) -> str:
+    dtype = (source_type or "").strip().lower()
+    for pattern, target in _TYPE_MAP:
+        if re.match(pattern, dtype):
+            return target
+    return "VARCHAR"
+
+
+def default_mirror_dir(collection_name: str) -> str:
+    return os.path.join(os.path.dirname(__file__), "data", "mirror", collection_name)
+
+
+def _documented_tables(source: Dict[str, Any]) -> Dict[str, List[str]]:
+    """{tabla: [dimensiones]} según el CSV de la fuente."""
+    df = pd.read_csv(source["path"])
+    tables: Dict[str, List[str]] = {}
+    for _, row in df.iterrows():
+        table = row.get("tabla") or row.get("table")
+        if not table or pd.isna(table):
+            continue
+        dims = tables.setdefault(str(table).strip(), [])
+        dims_raw = row.get("dimensiones") or row.get("dimensions")
+        for dim in _split_list(None if pd.isna(dims_raw) else dims_raw):
+            if dim not in dims:
+                dims.append(dim)
+    return tables
+
+
+def _quote(name: str) -> str:
+    return ".".join(f'"{part}"' for part in name.split("."))
+
+
+def _snapshot_table(sql_enrich: Dict[str, Any], table: str, dims: List[str], sample: int,
+                    max_values: int, max_columns: int) -> Tuple[List[Tuple[str, str]], pd.DataFrame, int]:
+    """Columnas (nombre, tipo DuckDB), filas a copiar y cuántas son de muestra."""
+    columns = [(name, duckdb_type(dtype)) for name, dtype in
+               fetch_table_columns(sql_enrich, table, max_columns=max_columns)]
+    if not columns:
+        raise ValueError("sin columnas (¿la tabla existe?)")
+    names = [name for name, _ in columns]
+
+    rows = []
+    if sample:
+        with timed("mirror.sample"):
+            for result_columns, batch in iter_query(sql_enrich, build_sample_query(sql_enrich, table, sample),
+                                                    max_rows=sample):
+                positions = [result_columns.index(n) if n in result_columns else None for n in names]
+                rows.extend(tuple(row[p] if p is not None else None for p in positions) for row in batch)
+    sampled = len(rows)
+
+    # Un registro por valor de catálogo (el resto de columnas en NULL)
+    for dim in dims:
+        if dim not in names:
+            continue
+        with timed("mirror.distinct"):
+            values = fetch_distinct_values(sql_enrich, table, dim, limit=max_values)
+        position = names.index(dim)
+        for value in values:
+            row = [None] * len(names)
+            row[position] = value
+            rows.append(tuple(row))
+
+    df = pd.DataFrame(rows, columns=names, dtype=object)
+    # Todo como texto; DuckDB lo convierte al tipo de la columna con TRY_CAST
+    df = df.apply(lambda col: col.map(lambda v: None if v is None else str(v)))
+    return columns, df, sampled
+
+
+def build_mirror(collection_name: str, source_name: Optional[str] = None, sample: int = 1000,
+                 output_dir: Optional[str] = None, max_values: Optional[int] = None) -> Dict[str, Any]:
+    """Crea/reemplaza el espejo local de la colección. Retorna el manifest."""
+    import duckdb
+
+    cfg = get_collection_config(collection_name)
+    sources = [s for s in cfg["sources"] if s.get("sql_enrich") and (not source_name or s["name"] == source_name)]
+    if not sources:
+        raise ValueError(f"La colección '{collection_name}' no tiene una fuente con sql_enrich"
+                         + (f" llamada '{source_name}'" if source_name else ""))
+    source = sources[0]
+    sql_enrich = source["sql_enrich"]
+    max_values = int(max_values or sql_enrich.get("max_values", 50))
+    max_columns = int(sql_enrich.get("max_columns", 200))
+
+    output_dir = output_dir or default_mirror_dir(collection_name)
+    os.makedirs(output_dir, exist_ok=True)
+    db_path = os.path.join(output_dir, "mirror.duckdb")
+    if sql_enrich["type"] == "duckdb" and os.path.abspath(sql_enrich.get("path", "")) == os.path.abspath(db_path):
+        raise ValueError("sql_enrich ya apunta a este espejo; restaura la conexión original para refrescarlo")
+    tmp_db_path = f"{db_path}.tmp"
+    if os.path.exists(tmp_db_path):
+        os.remove(tmp_db_path)
+
+    tables = _documented_tables(source)
+    print(f"Espejo de '{collection_name}' ({source['name']}): {len(tables)} tabla(s), "
+          f"muestra {sample} filas, hasta {max_values} valores por dimensión\n")
+
+    manifest = {
+        "collection": collection_name,
+        "source": source["name"],
+        "origin": f"{sql_enrich['type']}://{sql_enrich.get('server', '')}/{sql_enrich.get('database', '')}",
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "sample": sample,
+        "max_values": max_values,
+        "tables": {},
+        "failed": {},
+    }
+
+    conn = duckdb.connect(tmp_db_path)
+    try:
+        for table, dims in tables.items():
+            try:
+                columns, df, sampled = _snapshot_table(sql_enrich, table, dims, sample, max_values, max_columns)
+            except Exception as e:
+                print(f"  ✗ {table}: {e}")
+                manifest["failed"][table] = str(e)
+                incr("mirror.failures")
+                continue
+
+            if "." in table:
+                conn.execute(f'CREATE SCHEMA IF NOT EXISTS "{table.split(".")[0]}"')
+            column_defs = ", ".join(f'"{name}" {dtype}' for name, dtype in columns)
+            conn.execute(f"CREATE TABLE {_quote(table)} ({column_defs})")
+            if len(df):
+                conn.register("mirror_rows", df)
+                casts = ", ".join(f'TRY_CAST("{name}" AS {dtype})' for name, dtype in columns)
+                conn.execute(f"INSERT INTO {_quote(table)} SELECT {casts} FROM mirror_rows")
+                conn.unregister("mirror_rows")
+            parquet_path = os.path.join(output_dir, f"{table}.parquet")
+            conn.execute(f"COPY {_quote(table)} TO '{parquet_path}' (FORMAT PARQUET)")
+
+            manifest["tables"][table] = {
+                "columns": [f"{name} ({dtype})" for name, dtype in columns],
+                "sample_rows": sampled,
+                "catalog_rows": len(df) - sampled,
+                "dimensions": [d for d in dims if d in {name for name, _ in columns}],
+            }
+            incr("mirror.tables")
+            print(f"  ✓ {table}: {len(columns)} columnas, {sampled} filas de muestra, "
+                  f"{len(df) - sampled} valores de catálogo")
+    finally:
+        conn.close()
+
+    # El espejo anterior se reemplaza solo cuando el nuevo está completo
+    os.replace(tmp_db_path, db_path)
+    with open(os.path.join(output_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+    print(f"\nEspejo: {db_path}")
+    print("Para usarlo en el enrichment:")
+    print("  sql_enrich:")
+    print("    type: duckdb")
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    shown = os.path.abspath(db_path)
+    if shown.startswith(repo_dir + os.sep):
+        shown = "./" + os.path.relpath(shown, repo_dir)
+    print(f"    path: \"{shown}\"")
+    return manifest
@@ -0,0 +1,270 @@
+"""
+Indexación de varias fuentes en paralelo (`main.py index --jobs N`).
+
+Cada fuente corre en un proceso del pool: extracción, enrichment y
+embeddings son independientes entre fuentes. Los workers no tocan ChromaDB;
+envían sus lotes ya embebidos por una cola y el proceso padre es el único
+que escribe en la colección (y en el índice de metadata y el checkpoint),
+serializando las escrituras. El progreso de todos los workers se muestra en
+una sola línea. Las métricas de cada worker se suman a las del padre al
+terminar (los tiempos por etapa quedan como suma entre procesos).
+
+Un mismo contenido (mismo id) se embebe una sola vez en todo el job: los
+workers reservan los IDs en un registro compartido (`_Claims`, en el
+proceso del Manager) y solo embeben los que reservan ellos. El padre toma
+el vector de un documento ya escrito en otra partición de esa partición,
+sin volver a embeberlo.
+"""
+
+import contextlib
+import io
+import multiprocessing
+import queue as queue_module
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.managers import SyncManager
+from typing import Any, Dict, Iterable, List
+
+
+class _Claims:
+    """IDs ya en la colección o reservados por un worker (vive en el proceso del Manager)."""
+
+    def __init__(self, ids: Iterable[str]):
+        self._owners = dict.fromkeys(ids, "")
+        self._lock = threading.Lock()
+
+    def claim(self, ids: List[str], owner: str) -> List[str]:
+        """Reserva para `owner` los IDs que nadie tenía; retorna esos."""
+        with self._lock:
+            new = [doc_id for doc_id in dict.fromkeys(ids) if doc_id not in self._owners]
+            for doc_id in new:
+                self._owners[doc_id] = owner
+            return new
+
+
+class _Manager(SyncManager):
+    pass
+
+
+_Manager.register("Claims", _Claims)
+
+
+def _source_worker(collection_name: str, source: dict, limit, state: Dict[str, Any], claims,
+                   batch_size: int, queue) -> None:
+    """Pipeline de una fuente en un proceso aparte; todo se comunica por `queue`."""
+    import itertools
+
+    import metrics
+    from db_connector import fetch_source
+    from embeddings import get_embeddings_batch
+    from partitions import plan_writes
+    from vector_store import build_documents, resume_offset
+
+    metrics.reset()
+    name = source["name"]
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        queue.put(("progress", name, "extrayendo", 0, 0))
+        df = fetch_source(source, limit=limit)
+
+        def on_enrich(kind, key, value):
+            # El padre registra la clave en el checkpoint del job
+            queue.put(("enrich", name, kind, key, value))
+
+        queue.put(("progress", name, "enriqueciendo", 0, 0))
+        ids, documents, metadatas, failed = build_documents(df, source, state, on_enrich=on_enrich)
+
+        # Mismos lotes y claves de checkpoint que index_source: un job se puede
+        # reanudar con o sin --jobs
+        targets, entries, keys = plan_writes(collection_name, ids, documents, metadatas)
+        total = len(entries)
+        start = resume_offset(state, keys)
+        queue.put(("plan", name, state["ids_digest"], start, total))
+
+        for i in range(start, total, batch_size):
+            end = min(i + batch_size, total)
+            groups = []
+            for target, group in itertools.groupby(entries[i:end], key=lambda e: e[0]):
+                positions = [j for _, j in group]
+                t_ids, t_documents, t_metadatas = targets[target]
+                groups.append((target, [t_ids[j] for j in positions], [t_documents[j] for j in positions],
+                               [t_metadatas[j] for j in positions]))
+            # Un documento compartido por varias particiones o fuentes se embebe una vez
+            documents_by_id = {doc_id: document for _, g_ids, g_documents, _ in groups
+                               for doc_id, document in zip(g_ids, g_documents)}
+            pending = {doc_id: documents_by_id[doc_id] for doc_id in claims.claim(list(documents_by_id), name)}
+            vectors = get_embeddings_batch(list(pending.values()), show_progress=False) if pending else []
+            embeddings = dict(zip(pending, vectors))
+            queue.put(("batch", name, groups, embeddings, end, total))
+
+    kept = {target: target_ids for target, (target_ids, _, _) in targets.items()}
+    queue.put(("done", name, total, failed, log.getvalue(), metrics.snapshot(), kept))
+
+
+def _stored_vectors(collections: Dict[str, Any], homes: Dict[str, str], target: str, ids: List[str],
+                    embeddings: Dict[str, Any]) -> Dict[str, Any]:
+    """Vectores de los IDs sin embedding en el lote que ya están escritos en otra partición."""
+    by_home: Dict[str, List[str]] = {}
+    for doc_id in ids:
+        home = homes.get(doc_id)
+        if doc_id not in embeddings and home is not None and home != target:
+            by_home.setdefault(home, []).append(doc_id)
+    vectors = {}
+    for home, home_ids in by_home.items():
+        stored = collections[home].get(ids=home_ids, include=["embeddings"])
+        vectors.update(zip(stored["ids"], stored["embeddings"]))
+    return vectors
+
+
+def _ready(msg, homes: Dict[str, str]) -> bool:
+    """Un lote se puede escribir si cada id trae su vector o ya está escrito."""
+    if msg[0] != "batch":
+        return True
+    _, _, groups, embeddings, _, _ = msg
+    return all(doc_id in embeddings or doc_id in homes for _, t_ids, _, _ in groups for doc_id in t_ids)
+
+
+def _release(held: Dict[str, list], apply, homes: Dict[str, str], force: bool = False) -> None:
+    """Aplica en orden los mensajes retenidos de cada fuente que ya están listos."""
+    progressed = True
+    while progressed:
+        progressed = False
+        for msgs in held.values():
+            while msgs and (force or _ready(msgs[0], homes)):
+                apply(msgs.pop(0))
+                progressed = True
+
+
+def _render(progress: Dict[str, str]) -> None:
+    line = " | ".join(f"{name}: {status}" for name, status in progress.items())
+    sys.stdout.write("\r  " + line[:200].ljust(120))
+    sys.stdout.flush()
+
+
+def index_sources_parallel(collection_name: str, sources: List[dict], limit, job: Dict[str, Any],
+                           jobs: int, batch_size: int = 100, prune: bool = False) -> None:
+    """
+    Indexa `sources` con hasta `jobs` procesos; las escrituras las hace este
+    proceso. Con `prune`, al final se quitan las referencias de cada fuente
+    completa al contenido que ya no genera (vector_store.prune_source).
+    """
+    import metrics
+    from vector_store import get_or_create_collection, prune_source, _write_batch
+    from metadata_index import load_index, update_index, save_index
+    from index_jobs import source_state, save_job
+    from partitions import physical_collections
+
+    # Con partition_by los lotes de los workers ya vienen repartidos por partición
+    collections = {name: get_or_create_collection(name) for name in physical_collections(collection_name)}
+    # Partición donde ya está escrito cada id (de ahí se copia su vector)
+    homes: Dict[str, str] = {}
+    for name, collection in collections.items():
+        homes.update(dict.fromkeys(collection.get(include=[])["ids"], name))
+    meta_indexes = {name: load_index(name) for name in collections}
+
+    progress = {source["name"]: "en cola" for source in sources}
+    stats = {source["name"]: {"embedded": 0, "merged": 0} for source in sources}
+    logs = {}
+    to_prune: Dict[str, Dict[str, List[str]]] = {}
+
+    ctx = multiprocessing.get_context("spawn")
+    with _Manager(ctx=ctx) as manager, ProcessPoolExecutor(max_workers=jobs, mp_context=ctx) as pool:
+        queue = manager.Queue()
+        claims = manager.Claims(homes)
+        futures = {
+            pool.submit(
+                _source_worker, collection_name, source, limit, source_state(job, source["name"]),
+                claims, batch_size, queue
+            ): source["name"]
+            for source in sources
+        }
+        def _apply(msg):
+            kind, name = msg[0], msg[1]
+            state = source_state(job, name)
+            if kind == "batch":
+                _, _, groups, embeddings, end, total = msg
+                for target, t_ids, t_documents, t_metadatas in groups:
+                    if target not in collections:
+                        collections[target] = get_or_create_collection(target)
+                        meta_indexes[target] = load_index(target)
+                    embeddings.update(_stored_vectors(collections, homes, target, t_ids, embeddings))
+                    final_metadatas, n_new, n_merged = _write_batch(
+                        collections[target], t_ids, t_documents, t_metadatas, embeddings=embeddings
+                    )
+                    for doc_id in t_ids:
+                        homes.setdefault(doc_id, target)
+                    stats[name]["embedded"] += n_new
+                    stats[name]["merged"] += n_merged
+                    meta_indexes[target] = update_index(meta_indexes[target], t_ids, final_metadatas)
+                    save_index(target, meta_indexes[target])
+                state["offset"] = end
+                save_job(job)
+                progress[name] = f"{end}/{total}"
+            else:
+                _, _, total, failed, log, worker_metrics, kept = msg
+                metrics.merge(worker_metrics)
+                if prune and not failed:
+                    to_prune[name] = kept
+                state["status"] = "partial" if failed else "done"
+                save_job(job)
+                progress[name] = f"{total}/{total} ✓" if not failed else f"{total}/{total} ({failed} fallidas)"
+                logs[name] = log
+
+        # Lotes retenidos por fuente (en orden) hasta que llegan los vectores
+        # que embebe otro worker
+        held: Dict[str, list] = {}
+        running = set(futures)
+        _render(progress)
+
+        while running or not queue.empty():
+            try:
+                msg = queue.get(timeout=0.2)
+            except queue_module.Empty:
+                running = {f for f in running if not f.done()}
+                continue
+
+            kind, name = msg[0], msg[1]
+            state = source_state(job, name)
+            if kind == "progress":
+                progress[name] = msg[2]
+            elif kind == "enrich":
+                _, _, enrich_kind, key, value = msg
+                state["enrich"][enrich_kind][key] = value
+                save_job(job)
+            elif kind == "plan":
+                _, _, ids_digest, start, total = msg
+                state["ids_digest"] = ids_digest
+                state["offset"] = start
+                save_job(job)
+                progress[name] = f"{start}/{total}"
+            elif kind in ("batch", "done"):
+                held.setdefault(name, []).append(msg)
+                _release(held, _apply, homes)
+            if kind != "enrich":
+                _render(progress)
+
+        # Lo que sigue retenido es de un worker que falló: se embebe aquí
+        _release(held, _apply, homes, force=True)
+        errors = {}
+        for future, name in futures.items():
+            exc = future.exception()
+            if exc is not None:
+                errors[name] = exc
+                progress[name] = "error"
+        _render(progress)
+        print()
+
+    # Después de todas las escrituras: los índices de metadata en disco están completos
+    for name, kept in to_prune.items():
+        prune_source(collection_name, name, kept)
+
+    for name, log in logs.items():
+        if log.strip():
+            print(f"\n[{name}]\n{log.rstrip()}")
+        s = stats[name]
+        print(f"  '{name}' completado: {s['embedded']} nuevos, {s['merged']} ya existentes con referencias fusionadas")
+
+    if errors:
+        detail = "; ".join(f"{name}: {exc}" for name, exc in errors.items())
+        raise RuntimeError(f"Fuentes con error: {detail}")
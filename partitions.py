@@ -0,0 +1,132 @@
+"""
+Particionado físico por tenant (opcional, por colección):
+
+    collections:
+      proyectos:
+        partition_by: cliente     # o proyecto
+
+index_source escribe cada documento en la sub-colección de ChromaDB de su
+valor, `proyectos__<slug>-<hash>` (un documento compartido por varios
+clientes va a cada una, solo con las referencias de ese cliente). El hash
+corto del valor exacto distingue valores con el mismo slug ("ACME S.A." y
+"acme-s-a"). Los documentos sin valor (catálogos o esquemas sin cliente) van
+a `proyectos___comun`.
+
+Para el usuario la colección sigue siendo `proyectos`: search.
+_query_collection enruta una búsqueda con filtro `cliente=X` solo a la
+partición de X (y conserva el filtro) y sin ese filtro consulta todas en
+paralelo. Cada partición
+usa la configuración de la colección lógica (config.logical_collection_name).
+Cambiar `partition_by` requiere index --clear.
+"""
+
+import hashlib
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import PARTITION_SEP, resolve_collection
+from metadata_index import REFS_KEY, dump_refs, parse_refs
+
+# Sufijo de la partición de documentos sin valor (un slug nunca empieza con "_")
+SHARED_SUFFIX = "_comun"
+
+
+def get_partition_field(collection_name: str) -> Optional[str]:
+    """Campo `partition_by` de la colección lógica (None si no se particiona)."""
+    try:
+        logical, cfg = resolve_collection(collection_name)
+    except ValueError:
+        return None
+    if logical != collection_name:
+        return None  # ya es una partición física
+    return cfg.get("partition_by")
+
+
+def _slug(value: str) -> str:
+    text = unicodedata.normalize("NFKD", str(value)).encode("ascii", "ignore").decode().lower()
+    return re.sub(r"[^a-z0-9._-]+", "_", text).strip("._-")
+
+
+def partition_name(collection_name: str, value: Optional[str]) -> str:
+    if value is None:
+        return f"{collection_name}{PARTITION_SEP}{SHARED_SUFFIX}"
+    digest = hashlib.sha1(str(value).encode("utf-8")).hexdigest()[:8]
+    slug = _slug(value)
+    return f"{collection_name}{PARTITION_SEP}{slug}-{digest}" if slug else f"{collection_name}{PARTITION_SEP}{digest}"
+
+
+def split_by_partition(collection_name: str, field: str, ids: List[str], documents: List[str],
+                       metadatas: List[Dict[str, Any]]) -> Dict[str, Tuple[List[str], List[str], List[Dict[str, Any]]]]:
+    """
+    Reparte los documentos por valor de `field` (de la metadata y de `_refs`):
+    {partición: (ids, documents, metadatas)}.
+    """
+    targets: Dict[str, Tuple[List[str], List[str], List[Dict[str, Any]]]] = {}
+    for doc_id, document, metadata in zip(ids, documents, metadatas):
+        refs = parse_refs(metadata)
+        values = list(dict.fromkeys(str(ref[field]) for ref in refs if ref.get(field)))
+        if not values and metadata.get(field) is not None:
+            values = [str(metadata[field])]
+        for value in values or [None]:
+            meta = dict(metadata)
+            if value is not None:
+                meta[field] = value
+                if refs:
+                    meta[REFS_KEY] = dump_refs([ref for ref in refs if str(ref.get(field)) == value])
+            target = targets.setdefault(partition_name(collection_name, value), ([], [], []))
+            target[0].append(doc_id)
+            target[1].append(document)
+            target[2].append(meta)
+    return targets
+
+
+def plan_writes(collection_name: str, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]):
+    """
+    Orden de escritura de una fuente, común a index_source y a index --jobs
+    (el offset del checkpoint vale para ambos): (targets, entries, keys).
+
+    `targets` es {colección física: (ids, documents, metadatas)}, `entries`
+    la lista plana (colección, posición) que recorren los lotes y `keys` la
+    clave de reanudación de cada entrada ("<partición>/<id>" con partition_by,
+    el id si no).
+    """
+    field = get_partition_field(collection_name)
+    if field:
+        targets = split_by_partition(collection_name, field, ids, documents, metadatas)
+        print(f"  Particiones por '{field}': {len(targets)}")
+    else:
+        targets = {collection_name: (ids, documents, metadatas)}
+    entries = [(name, j) for name in sorted(targets) for j in range(len(targets[name][0]))]
+    keys = [f"{name}/{targets[name][0][j]}" for name, j in entries] if field else list(ids)
+    return targets, entries, keys
+
+
+def list_partitions(collection_name: str) -> List[str]:
+    """Particiones físicas existentes en ChromaDB de una colección lógica."""
+    from vector_store import get_chroma_client
+
+    prefix = f"{collection_name}{PARTITION_SEP}"
+    names = [getattr(c, "name", c) for c in get_chroma_client().list_collections()]
+    return sorted(n for n in names if n.startswith(prefix))
+
+
+def physical_collections(collection_name: str) -> List[str]:
+    """Colecciones de ChromaDB detrás de un nombre lógico (él mismo si no se particiona)."""
+    if not get_partition_field(collection_name):
+        return [collection_name]
+    return list_partitions(collection_name)
+
+
+def route(collection_name: str, field: str, filters: Optional[Dict[str, Any]]):
+    """
+    Particiones a consultar y filtros a aplicar en ellas (`field` es el
+    partition_by de la colección). Con filtro por ese campo se consulta solo
+    su partición; el filtro se mantiene para que ninguna colisión de nombres
+    devuelva documentos de otro valor.
+    """
+    existing = list_partitions(collection_name)
+    if filters and field in filters:
+        target = partition_name(collection_name, filters[field])
+        return [target] if target in existing else [], filters
+    return existing, filters
@@ -0,0 +1,269 @@
+"""
+Caché local de resultados de consultas SELECT (opt-in por colección).
+
+    collections:
+      proyectos_prod:
+        query_cache:
+          enabled: true
+          ttl: 1800          # segundos
+
+Clave: (identidad de la fuente sin credenciales, SQL normalizado, max_rows).
+Cada resultado se guarda como Parquet en:
+    <persist_directory>/_query_cache/<clave>.parquet
+y el índice (`index.json`) registra SQL, tablas referenciadas, columnas,
+filas y fecha. Un acierto vigente se lee del Parquet por lotes, sin abrir
+conexión a la BD. Los resultados se invalidan por TTL o por nombre de
+tabla/vista (`invalidate_tables`, lo usa ddl_executor tras un DDL exitoso y
+`main.py cache --invalidate`). Las modificaciones de `index.json` se hacen
+con el archivo bloqueado (file_lock): consultas concurrentes del MCP y la
+CLI no pierden entradas.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from config import get_chroma_config, get_collection_config
+from file_lock import locked
+from metrics import incr
+
+_DEFAULTS = {"enabled": False, "ttl": 900}
+_TABLE_RE = re.compile(r'\b(?:FROM|JOIN)\s+((?:[\w\[\]"`]+\.)*[\w\[\]"`]+)', re.IGNORECASE)
+_LITERAL_RE = re.compile(r"('(?:[^']|'')*')")
+
+
+def get_cache_settings(collection_name: str) -> Dict[str, Any]:
+    """Sección `query_cache` de la colección (deshabilitada por defecto)."""
+    try:
+        cfg = get_collection_config(collection_name).get("query_cache") or {}
+    except ValueError:
+        cfg = {}
+    return {**_DEFAULTS, **cfg}
+
+
+def _cache_dir() -> str:
+    return os.path.join(get_chroma_config()["persist_directory"], "_query_cache")
+
+
+def _index_path() -> str:
+    return os.path.join(_cache_dir(), "index.json")
+
+
+def _load_index() -> Dict[str, Any]:
+    path = _index_path()
+    if not os.path.isfile(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_index(index: Dict[str, Any]) -> None:
+    path = _index_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _remove_entry(index: Dict[str, Any], key: str) -> None:
+    index.pop(key, None)
+    path = os.path.join(_cache_dir(), f"{key}.parquet")
+    if os.path.isfile(path):
+        os.remove(path)
+
+
+def source_identity(source: Dict[str, Any]) -> str:
+    """Motor + servidor/puerto/base (o ruta), sin usuario ni contraseña."""
+    if source["type"] == "duckdb":
+        return f"duckdb://{os.path.abspath(source.get('path', ':memory:'))}"
+    return f"{source['type']}://{source.get('server')}:{source.get('port', '')}/{source.get('database', '')}"
+
+
+def normalize_sql(sql: str) -> str:
+    """Espacios colapsados y minúsculas fuera de literales; sin ';' final."""
+    parts = _LITERAL_RE.split(sql.strip().rstrip(";").strip())
+    return "".join(
+        part if i % 2 else re.sub(r"\s+", " ", part).lower()
+        for i, part in enumerate(parts)
+    )
+
+
+def referenced_tables(sql: str) -> List[str]:
+    """Tablas/vistas en FROM/JOIN (sin esquema ni comillas, en minúsculas)."""
+    tables = []
+    for match in _TABLE_RE.finditer(_LITERAL_RE.sub("''", sql)):
+        name = match.group(1).split(".")[-1].strip('[]"`').lower()
+        if name not in tables:
+            tables.append(name)
+    return tables
+
+
+def cache_key(source: Dict[str, Any], sql: str, max_rows: Optional[int]) -> str:
+    raw = json.dumps([source_identity(source), normalize_sql(sql), max_rows])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _read_entry(key: str, entry: Dict[str, Any], batch_size: int):
+    import pyarrow.parquet as pq
+
+    columns = entry["columns"]
+    parquet = pq.ParquetFile(os.path.join(_cache_dir(), f"{key}.parquet"))
+    yielded = False
+    for batch in parquet.iter_batches(batch_size=batch_size):
+        rows = list(zip(*(column.to_pylist() for column in batch.columns)))
+        if rows:
+            yielded = True
+            yield columns, rows
+    if not yielded:
+        yield columns, []
+
+
+def _is_fresh(key: str, entry: Dict[str, Any], ttl: float) -> bool:
+    return (time.time() - entry["created"] <= ttl
+            and os.path.isfile(os.path.join(_cache_dir(), f"{key}.parquet")))
+
+
+def is_cached(source: Dict[str, Any], sql: str, max_rows: Optional[int] = None,
+              ttl: Optional[float] = None) -> bool:
+    """Hay un resultado vigente para la consulta (sin leerlo ni tocar la BD)."""
+    ttl = _DEFAULTS["ttl"] if ttl is None else ttl
+    key = cache_key(source, sql, max_rows)
+    entry = _load_index().get(key)
+    return entry is not None and _is_fresh(key, entry, ttl)
+
+
+def cached_query(source: Dict[str, Any], sql: str, max_rows: Optional[int] = None,
+                 ttl: Optional[float] = None, use_cache: bool = True, batch_size: int = 500,
+                 on_hit: Optional[Callable[[Dict[str, Any]], None]] = None) -> Iterable:
+    """
+    Como db_connector.iter_query, pero pasando por la caché.
+
+    Con un acierto vigente los lotes salen del Parquet local (se invoca
+    `on_hit(entrada)`); si no, se consulta la BD y el resultado se guarda al
+    terminar de leerlo completo. `use_cache=False` consulta siempre la BD y
+    no guarda nada.
+    """
+    from db_connector import check_read_only, iter_query
+
+    if not use_cache:
+        yield from iter_query(source, sql, max_rows=max_rows, batch_size=batch_size)
+        return
+
+    check_read_only(sql)
+    ttl = _DEFAULTS["ttl"] if ttl is None else ttl
+    key = cache_key(source, sql, max_rows)
+    index = _load_index()
+    entry = index.get(key)
+    if entry is not None:
+        if _is_fresh(key, entry, ttl):
+            incr("query_cache.hits")
+            if on_hit:
+                on_hit(entry)
+            yield from _read_entry(key, entry, batch_size)
+            return
+        with locked(_index_path()):
+            # Se relee: otro proceso pudo haberla renovado mientras tanto
+            index = _load_index()
+            entry = index.get(key)
+            if entry is not None and not _is_fresh(key, entry, ttl):
+                _remove_entry(index, key)
+                _save_index(index)
+
+    incr("query_cache.misses")
+    writer = _CacheWriter(key)
+    columns = []
+    completed = False
+    try:
+        for columns, rows in iter_query(source, sql, max_rows=max_rows, batch_size=batch_size):
+            writer.write(columns, rows)
+            yield columns, rows
+        completed = True
+    finally:
+        # Un resultado leído a medias (error o cancelación) no se guarda
+        if completed:
+            writer.commit({
+                "source": source_identity(source),
+                "sql": sql,
+                "max_rows": max_rows,
+                "tables": referenced_tables(sql),
+                "columns": list(columns),
+            })
+        else:
+            writer.discard()
+
+
+class _CacheWriter:
+    """Escribe el resultado a un Parquet temporal; si algo falla, se descarta sin afectar la consulta."""
+
+    def __init__(self, key: str):
+        from sql_results import ResultWriter
+
+        self.key = key
+        self.path = os.path.join(_cache_dir(), f"{key}.parquet")
+        self.tmp_path = f"{self.path}.tmp.parquet"
+        self.writer = ResultWriter(self.tmp_path)
+        self.failed = False
+
+    def write(self, columns, rows) -> None:
+        if self.failed:
+            return
+        try:
+            self.writer.write(columns, rows)
+        except Exception as e:
+            self.failed = True
+            incr("query_cache.write_errors")
+            print(f"⚠️  No se guardó el resultado en la caché: {e}", file=sys.stderr)
+            self.writer.close()
+
+    def discard(self) -> None:
+        self.writer.close()
+        if os.path.isfile(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def commit(self, entry: Dict[str, Any]) -> None:
+        if self.failed:
+            self.discard()
+            return
+        self.writer.close()
+        with locked(_index_path()):
+            os.replace(self.tmp_path, self.path)
+            index = _load_index()
+            index[self.key] = {**entry, "rows": self.writer.rows, "created": time.time()}
+            _save_index(index)
+
+
+def invalidate_tables(tables: Iterable[str]) -> int:
+    """Elimina los resultados que referencian alguna de `tables`. Retorna cuántos."""
+    names = {t.split(".")[-1].strip('[]"`').lower() for t in tables}
+    with locked(_index_path()):
+        index = _load_index()
+        stale = [key for key, entry in index.items() if names & set(entry.get("tables", []))]
+        for key in stale:
+            _remove_entry(index, key)
+        if stale:
+            _save_index(index)
+    return len(stale)
+
+
+def clear_cache() -> int:
+    with locked(_index_path()):
+        index = _load_index()
+        keys = list(index)
+        for key in keys:
+            _remove_entry(index, key)
+        _save_index(index)
+    return len(keys)
+
+
+def cache_stats() -> List[Dict[str, Any]]:
+    """Entradas de la caché con su antigüedad en segundos."""
+    now = time.time()
+    return [
+        {"key": key, "age": now - entry["created"], **entry}
+        for key, entry in sorted(_load_index().items(), key=lambda kv: -kv[1]["created"])
+    ]
@@ -7,13 +7,22 @@ Requiere que el túnel SSH esté activo: ./scripts/geca_prod.sh start
 Uso:
     python query_prod.py "SELECT * FROM temp_sage_chart LIMIT 10"
     python query_prod.py "SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_TYPE='VIEW'" --limit 50
+    python query_prod.py "SELECT TOP 10 * FROM vi_sage_jobs_facturas" --no-cache
+    python query_prod.py "SELECT * FROM vi_sage_jobs_facturas" --export facturas.parquet
+
+Si proyectos_prod tiene `query_cache` habilitado, los resultados se reutilizan
+desde la caché local mientras no venza el TTL (ver query_cache.py).
 """
 
 import sys
 import argparse
 import yaml
 import os
-from db_connector import execute_query
+import time
+from query_cache import cached_query, get_cache_settings
+from sql_results import TablePrinter, export_query
+
+COLLECTION = "proyectos_prod"
 
 
 def load_prod_config():
@@ -30,9 +39,9 @@ def load_prod_config():
         secrets = yaml.safe_load(f)
     
     # Configurar conexión a producción
-    sql_config = config['collections']['proyectos_prod']['sources'][0]['sql_enrich'].copy()
-    sql_config['user'] = secrets['collections']['proyectos_prod']['sources'][0]['sql_enrich']['user']
-    sql_config['password'] = secrets['collections']['proyectos_prod']['sources'][0]['sql_enrich']['password']
+    sql_config = config['collections'][COLLECTION]['sources'][0]['sql_enrich'].copy()
+    sql_config['user'] = secrets['collections'][COLLECTION]['sources'][0]['sql_enrich']['user']
+    sql_config['password'] = secrets['collections'][COLLECTION]['sources'][0]['sql_enrich']['password']
     
     return sql_config
 
@@ -46,25 +55,45 @@ def main():
     
     parser.add_argument("query", help="Consulta SQL a ejecutar")
     parser.add_argument("--limit", type=int, default=100, help="Límite de filas (default: 100)")
+    parser.add_argument("--no-cache", action="store_true", help="Consultar la BD aunque haya resultado en caché")
+    parser.add_argument("--export", help="Exportar el resultado completo a .parquet o .csv (ignora --limit)")
     
     args = parser.parse_args()
     
     try:
         sql_config = load_prod_config()
         
+        if args.export:
+            print(f"Exportando a {args.export}...")
+            print(f"SQL: {args.query}")
+            rows = export_query(sql_config, args.query, args.export)
+            print(f"✓ {rows:,} filas exportadas a {args.export}")
+            return
+        
         print(f"Ejecutando consulta (límite: {args.limit} filas)...")
         print(f"SQL: {args.query}")
         print("=" * 60)
         
-        df = execute_query(sql_config, args.query, max_rows=args.limit)
+        cache = get_cache_settings(COLLECTION)
+
+        def on_hit(entry):
+            print(f"(resultado desde caché local, hace {time.time() - entry['created']:.0f}s)")
+
+        printer = TablePrinter()
+        rows = 0
+        batches = cached_query(sql_config, args.query, max_rows=args.limit, ttl=cache["ttl"],
+                               use_cache=cache["enabled"] and not args.no_cache, on_hit=on_hit)
+        for columns, batch in batches:
+            if rows == 0 and batch:
+                print("\n=== RESULTADOS ===\n")
+            printer.print_batch(columns, batch)
+            rows += len(batch)
         
-        if len(df) == 0:
+        if rows == 0:
             print("0 filas devueltas")
         else:
-            print(f"\n=== RESULTADOS ({len(df)} filas) ===\n")
-            print(df.to_string(index=False))
-            
-            if len(df) == args.limit:
+            print(f"\n({rows} filas)")
+            if rows == args.limit:
                 print(f"\n⚠️  Resultados limitados a {args.limit} filas. Usa --limit para cambiar.")
                 
     except FileNotFoundError as e:
@@ -10,6 +10,8 @@ from config import get_collection_config
 from db_connector import fetch_table_schema
 import pandas as pd
 
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), "data", "schemas_cache.json")
+
 
 def generate_schemas_cache(collection_name: str, output_path: str = None):
     """
@@ -24,7 +26,7 @@ def generate_schemas_cache(collection_name: str, output_path: str = None):
     """
     
     if output_path is None:
-        output_path = os.path.join(os.path.dirname(__file__), "data", "schemas_cache.json")
+        output_path = DEFAULT_CACHE_PATH
     
     # Obtener configuración de la colección
     cfg = get_collection_config(collection_name)
@@ -70,3 +72,21 @@ def generate_schemas_cache(collection_name: str, output_path: str = None):
         json.dump(schemas, f, indent=2, ensure_ascii=False)
     
     print(f"\n  Caché de esquemas: {len(schemas)} tabla(s) en {output_path}")
+
+
+def load_schemas_cache(cache_path: str = None):
+    """Lee el caché de esquemas ({tabla: [columnas]}); None si no existe."""
+    cache_path = cache_path or DEFAULT_CACHE_PATH
+    if not os.path.isfile(cache_path):
+        return None
+    with open(cache_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def find_table_schema(schemas: dict, table_name: str):
+    """Busca una tabla sin distinguir mayúsculas. Retorna (tabla, columnas) o None."""
+    table_lower = table_name.lower()
+    for tabla, cols in schemas.items():
+        if tabla.lower() == table_lower:
+            return tabla, cols
+    return None
@@ -1,7 +1,13 @@
 from typing import List, Dict, Any, Optional
-from vector_store import get_or_create_collection
-from embeddings import get_embedding
-from config import get_collection_config
+from vector_store import get_embedding_dim, open_collection, prepare_query_embedding
+from embeddings import get_embedding, request_options
+from config import get_collection_config, resolve_collection
+from partitions import route as route_partitions
+from metadata_index import load_index, match_filters, bitmap_count, bitmap_ids, parse_refs, rebuild_index, REFS_KEY
+from tracing import current, span
+from metrics import incr
+import math
+import re
 
 
 def _build_schema_description(collection_name: str) -> str:
@@ -28,6 +34,131 @@ def _build_schema_description(collection_name: str) -> str:
     return "\n".join(parts)
 
 
+_SEARCH_DEFAULTS = {
+    "exact_max_docs": 5000,
+    "exact_selectivity": 0.1,
+}
+
+
+# MMR (Maximal Marginal Relevance): entre los fetch_k candidatos más cercanos
+# elige n_results relevantes y poco parecidos entre sí
+_MMR_DEFAULTS = {
+    "enabled": False,
+    "lambda": 0.7,
+    "fetch_k": 20,
+    "redundancy": 0.97,
+}
+
+
+def _get_search_config(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """Parámetros de búsqueda de la colección (sección `search` de su configuración)."""
+    return {**_SEARCH_DEFAULTS, **(cfg.get("search") or {})}
+
+
+def _get_mmr_config(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """Sección `mmr` de la colección (deshabilitada por defecto)."""
+    return {**_MMR_DEFAULTS, **(cfg.get("mmr") or {})}
+
+
+def _format_result(doc_id, document, metadata, distance) -> Dict[str, Any]:
+    return {
+        "id": doc_id,
+        "document": document,
+        "metadata": metadata,
+        "distance": distance,
+        "similarity": max(0, 1 - distance)
+    }
+
+
+def _ann_search(collection, query_embedding, n_results, where, embeddings=False) -> List[Dict[str, Any]]:
+    """Búsqueda aproximada (HNSW) con filtro de ChromaDB."""
+    include = ["documents", "metadatas", "distances"] + (["embeddings"] if embeddings else [])
+    results = collection.query(
+        query_embeddings=[query_embedding],
+        n_results=n_results,
+        where=where,
+        include=include
+    )
+    formatted = []
+    for i in range(len(results["ids"][0])):
+        result = _format_result(
+            results["ids"][0][i],
+            results["documents"][0][i],
+            results["metadatas"][0][i],
+            results["distances"][0][i]
+        )
+        if embeddings:
+            result["embedding"] = results["embeddings"][0][i]
+        formatted.append(result)
+    return formatted
+
+
+def _exact_search(collection, query_embedding, n_results, candidate_ids, embeddings=False) -> List[Dict[str, Any]]:
+    """Búsqueda exacta (fuerza bruta coseno) sobre un subconjunto de IDs."""
+    import numpy as np
+
+    if not candidate_ids:
+        return []
+    data = collection.get(ids=candidate_ids, include=["embeddings", "documents", "metadatas"])
+    if len(data["ids"]) == 0:
+        return []
+
+    matrix = np.asarray(data["embeddings"], dtype=np.float32)
+    query_vec = np.asarray(query_embedding, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vec)
+    norms[norms == 0] = 1.0
+    distances = 1.0 - (matrix @ query_vec) / norms
+
+    k = min(n_results, len(distances))
+    top = np.argpartition(distances, k - 1)[:k]
+    top = top[np.argsort(distances[top])]
+    results = []
+    for i in top:
+        result = _format_result(data["ids"][i], data["documents"][i], data["metadatas"][i], float(distances[i]))
+        if embeddings:
+            result["embedding"] = matrix[i]
+        results.append(result)
+    return results
+
+
+def _mmr_select(query_embedding, results: List[Dict[str, Any]], k: int,
+                lambda_mult: float, redundancy: float) -> List[Dict[str, Any]]:
+    """
+    Selección MMR sobre candidatos con `embedding`: cada paso elige el que
+    maximiza lambda * sim(pregunta) - (1 - lambda) * max sim(elegidos).
+
+    Los candidatos con similitud >= `redundancy` a uno ya elegido se
+    descartan, así que pueden quedar menos de k resultados.
+    """
+    import numpy as np
+
+    if len(results) <= 1:
+        return results[:k]
+    matrix = np.asarray([r["embedding"] for r in results], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.where(norms == 0, 1.0, norms)
+    query_vec = np.asarray(query_embedding, dtype=np.float32)
+    query_vec = query_vec / (np.linalg.norm(query_vec) or 1.0)
+
+    relevance = matrix @ query_vec
+    pairwise = matrix @ matrix.T
+    first = int(np.argmax(relevance))
+    selected = [first]
+    available = np.ones(len(results), dtype=bool)
+    available[first] = False
+    max_similarity = pairwise[first].copy()
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available | (max_similarity >= redundancy)] = -np.inf
+        best = int(np.argmax(scores))
+        if scores[best] == -np.inf:
+            break
+        selected.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, pairwise[best])
+    return [results[i] for i in selected]
+
+
 def search(
         query: str,
         collection_name: str,
@@ -37,43 +168,316 @@ def search(
     """
     Búsqueda híbrida: semántica (vectorial) + filtros (metadata).
 
+    Con filtros, usa el índice invertido de metadata para medir la
+    selectividad: filtros muy selectivos se resuelven con búsqueda exacta
+    sobre el subconjunto filtrado; filtros amplios usan ANN (HNSW) y se
+    filtran con el bitmap. Los documentos deduplicados se devuelven con sus
+    referencias expandidas (`refs`).
+
     Args:
         query: Texto de búsqueda
         collection_name: Nombre de la colección
         n_results: Número de resultados
         filters: Filtros sobre metadata (ej: {"Status": "Delivered"})
     """
-    collection = get_or_create_collection(collection_name)
-
-    query_embedding = get_embedding(query)
-
-    where = filters if filters else None
+    names = resolve_collections(collection_name)
+    if len(names) > 1:
+        return federated_search(query, names, n_results=n_results, filters=filters)
+    return _search_with_embedding(query, names[0], n_results, filters)[1]
 
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=n_results,
-        where=where,
-        include=["documents", "metadatas", "distances"]
-    )
 
-    formatted = []
-    for i in range(len(results["ids"][0])):
-        distance = results["distances"][0][i]
-        similarity = max(0, 1 - distance)
+def _search_with_embedding(query: str, collection_name: str, n_results: int,
+                           filters: Optional[Dict[str, Any]], cancelled=None):
+    """
+    Como search (una colección), retornando también el embedding de la
+    pregunta. Con `cancelled` (threading.Event) ya activado después del
+    embedding no se consulta ChromaDB y los resultados son None.
+    """
+    with span("search", collection=collection_name, n_results=n_results, filters=bool(filters)) as search_span:
+        with span("search.embed"):
+            query_embedding = get_embedding(query)
+        if cancelled is not None and cancelled.is_set():
+            search_span.set(cancelled=True)
+            return query_embedding, None
+        return query_embedding, _query_collection(collection_name, query_embedding, n_results, filters)
+
+
+def resolve_collections(spec) -> List[str]:
+    """'a', 'a,b', ['a', 'b'] o '*' (todas las de collections.yaml) -> lista de nombres."""
+    from config import list_collections
+
+    names = spec if isinstance(spec, (list, tuple)) else str(spec).split(",")
+    names = [n.strip() for n in names if n and n.strip()]
+    if "*" in names:
+        return list(list_collections())
+    names = list(dict.fromkeys(names))
+    if len(names) > 1:
+        # Un nombre mal escrito daría 0 resultados sin aviso
+        unknown = [n for n in names if n not in list_collections()]
+        if unknown:
+            raise ValueError(f"Colecciones no definidas en collections.yaml: {', '.join(unknown)}")
+    return names
+
+
+def federated_search(query: str, collection_names: List[str], n_results: int = 10,
+                     filters: Optional[Dict[str, Any]] = None,
+                     timings: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+    """
+    Búsqueda en varias colecciones: un solo embedding y una consulta por
+    colección en paralelo.
+
+    Todas las colecciones usan el mismo modelo de embeddings y distancia
+    coseno, así que la similitud es comparable entre ellas; los resultados
+    se mezclan por similitud. Un documento presente en varias colecciones
+    (mismo id de contenido) aparece una vez, con todas en `_collection`.
+    La latencia de cada colección queda en el histograma
+    `search.collection_ms[<nombre>]` (y en `timings`, si se pasa).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    import time
+    import metrics
+
+    with span("search", collection=",".join(collection_names), n_results=n_results,
+              filters=bool(filters)) as search_span:
+        with span("search.embed"):
+            query_embedding = get_embedding(query)
+
+        parent = current()
+
+        def _one(name):
+            start = time.perf_counter()
+            with span("search.collection", parent=parent, collection=name) as col_span:
+                try:
+                    return name, _query_collection(name, query_embedding, n_results, filters), None
+                except Exception as e:
+                    col_span.set(error=str(e))
+                    return name, [], e
+                finally:
+                    elapsed = (time.perf_counter() - start) * 1000
+                    metrics.observe(f"search.collection_ms[{name}]", elapsed)
+                    if timings is not None:
+                        timings[name] = elapsed
+
+        with ThreadPoolExecutor(max_workers=min(len(collection_names), 8)) as executor:
+            outcomes = list(executor.map(_one, collection_names))
+
+        errors = [(name, e) for name, _, e in outcomes if e is not None]
+        if errors and len(errors) == len(outcomes):
+            raise errors[0][1]
+        for name, e in errors:
+            incr("search.collection_errors")
+            print(f"  ⚠️  Colección '{name}' omitida: {e}")
+
+        merged: Dict[str, Dict[str, Any]] = {}
+        for name, results, _ in outcomes:
+            for r in results:
+                existing = merged.get(r["id"])
+                if existing is None:
+                    r["metadata"] = {**r["metadata"], "_collection": name}
+                    merged[r["id"]] = r
+                    continue
+                existing["metadata"]["_collection"] += f", {name}"
+                if r["similarity"] > existing["similarity"]:
+                    r["metadata"] = {**r["metadata"], "_collection": existing["metadata"]["_collection"]}
+                    merged[r["id"]] = r
+        results = sorted(merged.values(), key=lambda r: -r["similarity"])[:n_results]
+        search_span.set(collections=len(collection_names), results=len(results))
+        return results
+
+
+# Con fuentes fragmentadas se piden más resultados: varios pueden ser del mismo documento
+_CHUNK_OVERSAMPLE = 3
+
+
+def _has_chunking(cfg: Dict[str, Any]) -> bool:
+    return any(s.get("chunking") for s in cfg.get("sources") or [])
+
+
+def _merge_chunks(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Fusiona fragmentos hermanos (mismo parent_id) en un resultado por documento.
 
-        formatted.append({
-            "id": results["ids"][0][i],
-            "document": results["documents"][0][i],
-            "metadata": results["metadatas"][0][i],
-            "distance": distance,
-            "similarity": similarity
-        })
+    El texto es solo el de los fragmentos que coincidieron, en su orden
+    original; la similitud y la metadata son las del mejor fragmento.
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for r in results:
+        parent_id = r["metadata"].get("parent_id")
+        if not parent_id:
+            merged[r["id"]] = r
+            continue
+        if parent_id not in merged:
+            merged[parent_id] = {**r, "id": parent_id, "chunks": [r]}
+        else:
+            merged[parent_id]["chunks"].append(r)
+    for result in merged.values():
+        chunks = result.pop("chunks", None)
+        if not chunks:
+            continue
+        chunks.sort(key=lambda c: int(c["metadata"].get("chunk_index", 0)))
+        result["document"] = "\n".join(c["document"] for c in chunks)
+        result["metadata"] = {k: v for k, v in result["metadata"].items() if k not in ("chunk_index",)}
+        result["metadata"]["chunks"] = ",".join(str(c["metadata"].get("chunk_index")) for c in chunks)
+    return list(merged.values())
+
+
+def _query_partitions(collection_name: str, cfg: Dict[str, Any], partitions: List[str],
+                      query_embedding: List[float], n_results: int,
+                      filters: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Consulta las particiones en paralelo; un documento compartido por varias aparece una vez."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    with span("search.partitions", collection=collection_name, partitions=len(partitions)):
+        if len(partitions) <= 1:
+            return [r for name in partitions for r in _query_physical(name, cfg, query_embedding, n_results, filters)]
+        parent = current()
+
+        def _one(name):
+            with span("search.partition", parent=parent, collection=name):
+                return _query_physical(name, cfg, query_embedding, n_results, filters)
+
+        with ThreadPoolExecutor(max_workers=min(len(partitions), 8)) as executor:
+            outcomes = list(executor.map(_one, partitions))
+
+    merged: Dict[str, Dict[str, Any]] = {}
+    for results in outcomes:
+        for r in results:
+            if r["id"] not in merged or r["similarity"] > merged[r["id"]]["similarity"]:
+                merged[r["id"]] = r
+    return sorted(merged.values(), key=lambda r: -r["similarity"])[:n_results]
+
+
+def _query_collection(collection_name: str, query_embedding: List[float], n_results: int,
+                      filters: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Consulta una colección con un embedding ya calculado (ver search)."""
+    # collections.yaml se lee una vez por consulta y se pasa a las etapas
+    try:
+        logical_name, cfg = resolve_collection(collection_name)
+    except ValueError:
+        logical_name, cfg = collection_name, {}
+    field = cfg.get("partition_by") if logical_name == collection_name else None
+    if field:
+        # Colección con partition_by: solo la partición del filtro, o todas
+        partitions, partition_filters = route_partitions(collection_name, field, filters)
+        return _query_partitions(collection_name, cfg, partitions, query_embedding, n_results, partition_filters)
+    return _query_physical(collection_name, cfg, query_embedding, n_results, filters)
+
+
+def _query_physical(collection_name: str, cfg: Dict[str, Any], query_embedding: List[float], n_results: int,
+                    filters: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Consulta una colección de ChromaDB (o partición) con la configuración ya leída."""
+    collection = open_collection(collection_name)
+    if collection is None:
+        return []  # sin indexar
+    query_embedding = prepare_query_embedding(collection, query_embedding, get_embedding_dim(collection_name, cfg))
+    chunked = _has_chunking(cfg)
+    mmr = _get_mmr_config(cfg)
+    search_cfg = _get_search_config(cfg)
+    if not mmr["enabled"]:
+        if not chunked:
+            return _query_documents(collection_name, collection, query_embedding, n_results, filters, search_cfg)
+        results = _query_documents(collection_name, collection, query_embedding, n_results * _CHUNK_OVERSAMPLE,
+                                   filters, search_cfg)
+        return _merge_chunks(results)[:n_results]
+
+    fetch_k = max(int(mmr["fetch_k"]), n_results)
+    if chunked:
+        fetch_k *= _CHUNK_OVERSAMPLE
+    results = _query_documents(collection_name, collection, query_embedding, fetch_k, filters, search_cfg,
+                               embeddings=True)
+    if chunked:
+        results = _merge_chunks(results)
+    with span("search.mmr", candidates=len(results)) as mmr_span:
+        selected = _mmr_select(query_embedding, results, n_results, float(mmr["lambda"]), float(mmr["redundancy"]))
+        mmr_span.set(selected=len(selected))
+    for r in results:
+        r.pop("embedding", None)
+    return selected
+
+
+def _query_documents(collection_name: str, collection, query_embedding: List[float], n_results: int,
+                     filters: Optional[Dict[str, Any]], search_cfg: Dict[str, Any],
+                     embeddings: bool = False) -> List[Dict[str, Any]]:
+    with span("search.query") as query_span:
+        if not filters:
+            query_span.set(strategy="ann")
+            results = _ann_search(collection, query_embedding, n_results, None, embeddings)
+            return [_expand_refs(r) for r in results]
+
+        meta_index = load_index(collection_name)
+        total = collection.count()
+        if meta_index is None or len(meta_index["ids"]) != total:
+            # Sin índice (o desactualizado) se reconstruye desde la metadata: el
+            # `where` de ChromaDB no ve los valores que solo están en `_refs`
+            query_span.set(index_rebuilt=True)
+            meta_index = rebuild_index(collection_name, collection)
+            total = len(meta_index["ids"])
+
+        bits = match_filters(meta_index, filters)
+        matched = bitmap_count(bits)
+        query_span.set(matched=matched, total=total)
+        if matched == 0:
+            return []
+
+        selectivity = matched / total
+        use_exact = matched <= search_cfg["exact_max_docs"] and (
+            selectivity <= search_cfg["exact_selectivity"] or matched <= n_results
+        )
+        if use_exact:
+            query_span.set(strategy="exact")
+            results = _exact_search(collection, query_embedding, n_results, bitmap_ids(meta_index, bits), embeddings)
+            return [_expand_refs(r, filters) for r in results]
+
+        # Filtro amplio: ANN sin `where` sobre-muestreando según la selectividad y
+        # filtrando con el bitmap (cubre también valores dentro de `_refs`)
+        query_span.set(strategy="ann_bitmap")
+        fetch = min(total, max(n_results * 2, math.ceil(n_results / selectivity * 1.5)))
+        positions = meta_index["positions"]
+        results = [
+            r for r in _ann_search(collection, query_embedding, fetch, None, embeddings)
+            if r["id"] in positions and (bits >> positions[r["id"]]) & 1
+        ][:n_results]
+        if len(results) < min(n_results, matched) and matched <= search_cfg["exact_max_docs"]:
+            # HNSW no encontró suficientes vecinos que pasen el filtro
+            query_span.set(strategy="ann_bitmap+exact")
+            results = _exact_search(collection, query_embedding, n_results, bitmap_ids(meta_index, bits), embeddings)
+        return [_expand_refs(r, filters) for r in results]
+
+
+def _expand_refs(result: Dict[str, Any], filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Expande las referencias de un documento deduplicado.
 
-    return formatted
+    La metadata muestra los valores de todas las referencias (o solo de las
+    que cumplen los filtros, si hay) y `refs` conserva esas referencias.
+    """
+    refs = parse_refs(result["metadata"])
+    if not refs:
+        return result
+    if filters:
+        matching = [
+            ref for ref in refs
+            if all(str(ref[k]) == str(v) for k, v in filters.items() if k in ref)
+        ]
+        refs = matching or refs
+
+    metadata = {k: v for k, v in result["metadata"].items() if k != REFS_KEY}
+    keys = list(dict.fromkeys(k for ref in refs for k in ref))
+    for key in keys:
+        values = list(dict.fromkeys(ref[key] for ref in refs if key in ref))
+        metadata[key] = ", ".join(values)
+    result["metadata"] = metadata
+    result["refs"] = refs
+    return result
 
 
 def _build_prompt(query: str, collection_name: str, results: List[Dict[str, Any]]) -> str:
     """Arma el prompt RAG con esquema + contexto + pregunta."""
+    with span("prompt.build", results=len(results)):
+        return _render_prompt(query, collection_name, results)
+
+
+def _render_prompt(query: str, collection_name: str, results: List[Dict[str, Any]]) -> str:
     schema = _build_schema_description(collection_name)
 
     context_parts = []
@@ -101,77 +505,119 @@ Pregunta: {query}
 Respuesta:"""
 
 
-def ask(query: str, collection_name: str, n_results: int = 5, filters: Optional[Dict[str, Any]] = None) -> str:
-    """
-    RAG: busca contexto relevante y genera respuesta en lenguaje natural.
-    """
+def _generate(cfg, prompt: str, name: str = "llm.generate") -> str:
+    """Genera una respuesta completa (sin streaming) con el modelo de chat."""
     import requests
-    from config import get_ollama_config
 
-    cfg = get_ollama_config()
+    with span(name, model=cfg["chat_model"], prompt_chars=len(prompt)):
+        response = requests.post(
+            f"{cfg['base_url']}/api/generate",
+            json={"model": cfg["chat_model"], "prompt": prompt, "stream": False, **request_options(cfg)}
+        )
+        if response.status_code != 200:
+            raise Exception(f"Error de Ollama: {response.text}")
+        return response.json()["response"]
+
+
+def _stream_generate(cfg, prompt: str, name: str = "llm.generate"):
+    """Genera token a token con el modelo de chat; registra el primer token en la traza."""
+    import json
+    import requests
 
-    results = search(query, collection_name, n_results=n_results, filters=filters)
+    with span(name, model=cfg["chat_model"], prompt_chars=len(prompt)) as gen_span:
+        response = requests.post(
+            f"{cfg['base_url']}/api/generate",
+            json={"model": cfg["chat_model"], "prompt": prompt, "stream": True, **request_options(cfg)},
+            stream=True
+        )
+
+        if response.status_code != 200:
+            yield f"Error de Ollama: {response.text}"
+            return
+
+        first = True
+        for line in response.iter_lines():
+            if line:
+                data = json.loads(line)
+                token = data.get("response", "")
+                if token:
+                    if first:
+                        gen_span.event("first_token")
+                        first = False
+                    yield token
+                if data.get("done", False):
+                    gen_span.set(eval_count=data.get("eval_count"))
+                    break
+
+
+def _rag_answer(query, collection_name, n_results, filters, cfg, generate, status_callback=None):
+    """
+    Busca contexto y genera la respuesta con `generate(prompt)` (iterable de
+    tokens), pasando por la caché de respuestas si la colección la habilita:
+    una pregunta parecida con los mismos documentos recuperados se responde
+    desde la caché sin llamar al modelo.
+    """
+    from answer_cache import context_key, get_answer_cache_settings, lookup, replay, store
+
+    if status_callback:
+        status_callback("searching")
+    embedding, results = _search_with_embedding(query, collection_name, n_results, filters)
 
     if not results:
-        return "No encontré información relevante para responder."
+        yield "No encontré información relevante para responder."
+        return
 
-    prompt = _build_prompt(query, collection_name, results)
+    settings = get_answer_cache_settings(collection_name)
+    context = None
+    if settings["enabled"]:
+        context = context_key(results, filters, cfg["chat_model"])
+        with span("answer_cache.lookup") as cache_span:
+            hit = lookup(collection_name, embedding, context, settings)
+            cache_span.set(hit=hit is not None)
+        if hit is not None:
+            yield from replay(hit["answer"])
+            return
 
-    response = requests.post(
-        f"{cfg['base_url']}/api/generate",
-        json={
-            "model": cfg["chat_model"],
-            "prompt": prompt,
-            "stream": False
-        }
-    )
+    if status_callback:
+        status_callback("answering")
 
-    if response.status_code != 200:
-        raise Exception(f"Error de Ollama: {response.text}")
+    prompt = _build_prompt(query, collection_name, results)
 
-    return response.json()["response"]
+    tokens = []
+    for token in generate(prompt):
+        tokens.append(token)
+        yield token
 
+    # Solo respuestas completas (un stream interrumpido no llega aquí)
+    answer = "".join(tokens)
+    if context and answer.strip() and not answer.startswith("Error de Ollama"):
+        store(collection_name, query, embedding, context, answer, settings)
 
-def ask_stream(query: str, collection_name: str, n_results: int = 5, filters: Optional[Dict[str, Any]] = None):
+
+def ask(query: str, collection_name: str, n_results: int = 5, filters: Optional[Dict[str, Any]] = None) -> str:
     """
-    RAG con streaming: busca contexto y genera respuesta token a token.
+    RAG: busca contexto relevante y genera respuesta en lenguaje natural.
     """
-    import requests
     from config import get_ollama_config
 
     cfg = get_ollama_config()
 
-    results = search(query, collection_name, n_results=n_results, filters=filters)
-
-    if not results:
-        yield "No encontré información relevante para responder."
-        return
+    with span("ask", collection=collection_name):
+        return "".join(_rag_answer(query, collection_name, n_results, filters, cfg,
+                                   lambda prompt: [_generate(cfg, prompt)]))
 
-    prompt = _build_prompt(query, collection_name, results)
 
-    response = requests.post(
-        f"{cfg['base_url']}/api/generate",
-        json={
-            "model": cfg["chat_model"],
-            "prompt": prompt,
-            "stream": True
-        },
-        stream=True
-    )
+def ask_stream(query: str, collection_name: str, n_results: int = 5, filters: Optional[Dict[str, Any]] = None):
+    """
+    RAG con streaming: busca contexto y genera respuesta token a token.
+    """
+    from config import get_ollama_config
 
-    if response.status_code != 200:
-        yield f"Error de Ollama: {response.text}"
-        return
+    cfg = get_ollama_config()
 
-    for line in response.iter_lines():
-        if line:
-            import json
-            data = json.loads(line)
-            token = data.get("response", "")
-            if token:
-                yield token
-            if data.get("done", False):
-                break
+    with span("ask", collection=collection_name):
+        yield from _rag_answer(query, collection_name, n_results, filters, cfg,
+                               lambda prompt: _stream_generate(cfg, prompt))
 
 
 def _get_sql_sources(collection_name: str) -> List[Dict[str, Any]]:
@@ -180,22 +626,18 @@ def _get_sql_sources(collection_name: str) -> List[Dict[str, Any]]:
     return [s for s in cfg["sources"] if s.get("mode") == "sql"]
 
 
-def _build_sql_schema(collection_name: str) -> str:
-    """Genera descripción del esquema SQL para el prompt de generación de consultas."""
-    sql_sources = _get_sql_sources(collection_name)
-    if not sql_sources:
-        return ""
-    parts = []
-    for source in sql_sources:
-        db_type = source["type"]
-        table = source.get("table", source["name"])
-        columns = source.get("columns", [])
-        parts.append(f"Motor: {db_type}")
-        parts.append(f"Tabla: {table}")
-        parts.append("Columnas:")
-        for col in columns:
-            parts.append(f"  - {col}")
-    return "\n".join(parts)
+def _static_sql_tables(collection_name: str) -> Dict[str, List[str]]:
+    """Tablas de las fuentes con mode: sql y sus columnas configuradas."""
+    return {
+        source.get("table", source["name"]): list(source.get("columns", []))
+        for source in _get_sql_sources(collection_name)
+    }
+
+
+def _sql_engine(collection_name: str) -> Optional[str]:
+    """Motor de la BD donde corre /sql (mode: sql o, si no hay, sql_enrich)."""
+    source = _find_sql_source(collection_name, "")
+    return source["type"] if source else None
 
 
 def _extract_sql(text: str):
@@ -215,8 +657,12 @@ def _find_sql_source(collection_name: str, sql: str):
         table = source.get("table", source["name"])
         if re.search(r'\b' + re.escape(table) + r'\b', sql, re.IGNORECASE):
             return source
-    # Fallback: primer source SQL disponible
-    return sql_sources[0] if sql_sources else None
+    # Fallback: primer source SQL disponible, o la conexión de sql_enrich
+    # (las tablas del caché de esquemas viven en esa BD)
+    if sql_sources:
+        return sql_sources[0]
+    cfg = get_collection_config(collection_name)
+    return next((s["sql_enrich"] for s in cfg["sources"] if s.get("sql_enrich")), None)
 
 
 def chat_stream(query: str, collection_name: str, n_results: int = 5,
@@ -228,8 +674,6 @@ def chat_stream(query: str, collection_name: str, n_results: int = 5,
     force_sql=True: genera SQL, ejecuta, interpreta (comando /sql).
     force_sql=False: busca en ChromaDB y responde con conocimiento (RAG).
     """
-    import json
-    import requests
     from config import get_ollama_config
 
     cfg = get_ollama_config()
@@ -240,79 +684,258 @@ def chat_stream(query: str, collection_name: str, n_results: int = 5,
         yield from _rag_path(query, collection_name, n_results, filters, cfg, status_callback)
 
 
+# Filas que lee /sql y filas que se muestran al LLM al interpretar
+_SQL_MAX_ROWS = 1000
+_SQL_PROMPT_ROWS = 20
+# Resultados de la búsqueda vectorial usados para elegir tablas del esquema
+_SQL_CONTEXT_RESULTS = 8
+
+
+# Segundos que se espera a la búsqueda especulativa después de generar el SQL
+_SPECULATIVE_WAIT = 2.0
+_SQL_CONTEXT_DOCS = 3
+
+_DATA_ROUTE_RE = re.compile(
+    r"\b(cu[aá]nt[oa]s?|total(es)?|suma|promedio|m[aá]ximo|m[ií]nimo|cantidad|top|[uú]ltim[oa]s|"
+    r"list(a|ar)|ranking|por (mes|año|d[ií]a|semana|cliente|estado)|mayor(es)?|menor(es)?|count)\b",
+    re.IGNORECASE,
+)
+_KNOWLEDGE_ROUTE_RE = re.compile(
+    r"(qu[eé] (es|son|significa)|c[oó]mo (se|funciona)|por qu[eé]|explica|diferencia|"
+    r"d[oó]nde (se|est[aá])|relaci[oó]n|regla|l[oó]gica)",
+    re.IGNORECASE,
+)
+
+
+def _classify_route(query: str) -> str:
+    """Clasificación barata (sin LLM): "datos", "conocimiento" o "mixta"."""
+    data = bool(_DATA_ROUTE_RE.search(query))
+    knowledge = bool(_KNOWLEDGE_ROUTE_RE.search(query))
+    if data and not knowledge:
+        return "datos"
+    if knowledge and not data:
+        return "conocimiento"
+    return "mixta"
+
+
+def _traced(name, parent, fn, *args, **kwargs):
+    """Corre `fn` en un hilo del pool bajo un span hijo de `parent`."""
+    with span(name, parent=parent):
+        return fn(*args, **kwargs)
+
+
+def _future_result(future, timeout=None):
+    """Resultado de un trabajo especulativo; None si falló, se canceló o no terminó a tiempo."""
+    from concurrent.futures import CancelledError, TimeoutError as FutureTimeout
+    try:
+        return future.result(timeout=timeout)
+    except (CancelledError, FutureTimeout):
+        return None
+    except Exception:
+        return None
+
+
+def _speculative_search(cancelled, query, collection_name, n_results):
+    """Búsqueda especulativa del camino SQL; None si se canceló antes de consultar ChromaDB."""
+    if cancelled.is_set():
+        return None
+    names = resolve_collections(collection_name)
+    if len(names) > 1:
+        return federated_search(query, names, n_results=n_results)
+    return _search_with_embedding(query, names[0], n_results, None, cancelled=cancelled)[1]
+
+
 def _sql_path(query, collection_name, cfg, status_callback):
     """Genera SQL, ejecuta, interpreta resultados."""
-    import json
-    import requests
-    from db_connector import execute_query
-
-    sql_schema = _build_sql_schema(collection_name)
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    with span("sql", collection=collection_name) as sql_span:
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="sql")
+        # Future.cancel() no detiene un trabajo que ya corre: el hilo revisa el flag
+        cancelled = threading.Event()
+        try:
+            yield from _sql_path_steps(query, collection_name, cfg, status_callback, sql_span, executor, cancelled)
+        finally:
+            # Lo especulativo que no se llegó a usar no se espera
+            cancelled.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _sql_path_steps(query, collection_name, cfg, status_callback, sql_span, executor, cancelled):
+    from query_cache import cached_query, get_cache_settings, is_cached
+    from sql_context import render_schema_context, select_schemas, validate_sql
+    from sql_guard import get_guard_settings, preflight
+    from sql_results import ResultSummary, ResultWriter
+
+    # Especulativo, en paralelo con la generación del SQL: búsqueda vectorial
+    # (contexto para el esquema, la validación y la interpretación) y lookup
+    # en el caché de esquemas. La ruta se clasifica con reglas, sin LLM.
+    parent = current()
+    static_tables = _static_sql_tables(collection_name)
+    retrieval = executor.submit(_traced, "sql.retrieval", parent, _speculative_search, cancelled, query,
+                                collection_name, _SQL_CONTEXT_RESULTS)
+    lookup = executor.submit(_traced, "sql.schema_lookup", parent, select_schemas, query, collection_name,
+                             static_tables=static_tables)
+    route = _classify_route(query)
+    sql_span.set(route=route)
+
+    tables = _future_result(lookup) or {}
+    # Si el caché no encontró tablas por nombre/columnas, la generación no
+    # espera a la búsqueda: usa lo que haya y las tablas que traiga la
+    # búsqueda entran en la validación y la corrección
+    needs_retrieval = len(tables) == len(static_tables)
+    if needs_retrieval and retrieval.done():
+        tables = select_schemas(query, collection_name, results=_future_result(retrieval),
+                                static_tables=static_tables)
+        needs_retrieval = False
+    sql_span.set(tables=len(tables))
+    engine = _sql_engine(collection_name) or "mssql"
+    sql_schema = render_schema_context(tables, engine)
 
     if status_callback:
         status_callback("thinking")
 
+    if engine == "mssql":
+        syntax = """Ejemplos de sintaxis MSSQL:
+- SELECT TOP 10 Number, Status FROM temp_shipment_master ORDER BY CreatedOn DESC
+- SELECT CarrierName, COUNT(*) AS total FROM temp_shipment_master GROUP BY CarrierName ORDER BY total DESC
+
+Genera SOLO el SQL dentro de ```sql ... ```. Usa SOLO tablas y columnas del esquema arriba. Sintaxis MSSQL (TOP en vez de LIMIT)."""
+    else:
+        syntax = f"Genera SOLO el SQL dentro de ```sql ... ```. Usa SOLO tablas y columnas del esquema arriba. Sintaxis {engine} (LIMIT en vez de TOP)."
+
     prompt1 = f"""Genera una consulta SQL para responder esta pregunta.
 
 {sql_schema}
 
-Ejemplos de sintaxis MSSQL:
-- SELECT TOP 10 Number, Status FROM temp_shipment_master ORDER BY CreatedOn DESC
-- SELECT CarrierName, COUNT(*) AS total FROM temp_shipment_master GROUP BY CarrierName ORDER BY total DESC
-
-Genera SOLO el SQL dentro de ```sql ... ```. Usa SOLO columnas del esquema arriba. Sintaxis MSSQL (TOP en vez de LIMIT).
+{syntax}
 
 Pregunta: {query}
 """
 
-    response1 = requests.post(
-        f"{cfg['base_url']}/api/generate",
-        json={"model": cfg["chat_model"], "prompt": prompt1, "stream": False}
-    )
-
-    if response1.status_code != 200:
-        yield f"Error de Ollama: {response1.text}"
+    try:
+        first_response = _generate(cfg, prompt1, name="llm.generate_sql")
+    except Exception as e:
+        yield str(e)
         return
 
-    first_response = response1.json()["response"]
     sql = _extract_sql(first_response)
 
     if not sql:
         yield f"No se pudo generar SQL.\n\nRespuesta del modelo:\n{first_response}"
         return
 
-    # Yield especial: el SQL para confirmación (main.py lo detecta)
-    yield ("__SQL_CONFIRM__", sql)
+    # Identificadores contra el esquema antes de ejecutar; una sola corrección.
+    # Las tablas que trajo la búsqueda especulativa también cuentan (sin
+    # tablas del caché se espera a que termine: es el único esquema).
+    with span("sql.wait_retrieval"):
+        retrieved = _future_result(retrieval, timeout=None if needs_retrieval else _SPECULATIVE_WAIT)
+    if retrieved:
+        for table, cols in select_schemas(query, collection_name, results=retrieved,
+                                          static_tables=static_tables).items():
+            tables.setdefault(table, cols)
+        sql_schema = render_schema_context(tables, engine)
+    issues = validate_sql(sql, tables)
+    if issues:
+        incr("sql.validation_failures")
+        sql_span.event("sql_invalid", issues=len(issues))
+        repair_prompt = f"""La consulta SQL tiene errores contra el esquema:
+{chr(10).join(f"- {issue}" for issue in issues)}
 
-    if status_callback:
-        status_callback("executing")
+{sql_schema}
+
+SQL:
+```sql
+{sql}
+```
+
+Corrige la consulta para responder: {query}
+Usa SOLO tablas y columnas del esquema. Genera SOLO el SQL dentro de ```sql ... ```.
+"""
+        try:
+            repaired = _extract_sql(_generate(cfg, repair_prompt, name="llm.repair_sql"))
+        except Exception:
+            repaired = None
+        if repaired:
+            incr("sql.repairs")
+            sql = repaired
+            issues = validate_sql(sql, tables)
 
     source = _find_sql_source(collection_name, sql)
     if not source:
         yield "No se encontró una fuente SQL configurada."
         return
 
+    # Pre-flight: plan estimado del motor antes de confirmar; con action=limit
+    # una consulta que excede los umbrales se ejecuta con TOP/LIMIT y timeout
+    cache = get_cache_settings(collection_name)
+    if cache["enabled"] and is_cached(source, sql, max_rows=_SQL_MAX_ROWS, ttl=cache["ttl"]):
+        estimate_text = "Resultado en caché"
+    else:
+        with span("sql.preflight"):
+            checked = preflight(source, sql, get_guard_settings(collection_name))
+        sql, source, estimate_text = checked["sql"], checked["source"], checked["message"]
+        if checked["exceeded"]:
+            incr("sql_guard.exceeded")
+    if issues:
+        estimate_text = f"⚠️  Identificadores no encontrados en el esquema: {'; '.join(issues)}\n  {estimate_text}"
+
+    # Yield especial: el SQL para confirmación (main.py lo detecta).
+    # La espera del usuario queda entre los eventos sql_confirm/sql_confirmed.
+    sql_span.event("sql_confirm")
+    yield ("__SQL_CONFIRM__", sql, estimate_text)
+    sql_span.event("sql_confirmed")
+
+    if status_callback:
+        status_callback("executing")
+
+    # Las filas se escriben por lotes a _resultado_sql.csv; al LLM solo va un
+    # resumen acotado (conteo, estadísticas por columna y primeras filas)
+    import os
+    base_dir = os.path.dirname(__file__)
+    summary = ResultSummary(head_rows=_SQL_PROMPT_ROWS)
     try:
-        df = execute_query(source, sql)
+        with ResultWriter(os.path.join(base_dir, "_resultado_sql.csv")) as writer:
+            batches = cached_query(source, sql, max_rows=_SQL_MAX_ROWS, ttl=cache["ttl"], use_cache=cache["enabled"],
+                                   on_hit=lambda entry: sql_span.event("query_cache_hit"))
+            for columns, batch in batches:
+                writer.write(columns, batch)
+                summary.update(columns, batch)
     except Exception as e:
         yield f"Error ejecutando SQL: {e}\n\nSQL generado:\n{sql}"
         return
 
-    result_text = df.to_string(index=False) if not df.empty else "(sin resultados)"
-    row_count = len(df)
+    result_text = summary.to_text(truncated=summary.row_count >= _SQL_MAX_ROWS)
 
-    # Guardar SQL y resultados en archivo
-    import os
-    log_path = os.path.join(os.path.dirname(__file__), "_resultado_sql.txt")
+    # Guardar SQL y resumen en archivo (filas completas en el CSV)
+    log_path = os.path.join(base_dir, "_resultado_sql.txt")
     with open(log_path, "w", encoding="utf-8") as f:
         f.write(f"Pregunta: {query}\n\n")
         f.write(f"SQL:\n{sql}\n\n")
-        f.write(f"Resultados ({row_count} filas):\n{result_text}\n")
+        f.write(f"Resultados ({summary.row_count} filas, completos en _resultado_sql.csv):\n{result_text}\n")
 
     # Interpretar resultados (streaming)
     if status_callback:
         status_callback("interpreting")
 
-    prompt2 = f"""Resultados de: {sql}
+    # Contexto del negocio de la búsqueda especulativa (reglas, no esquemas):
+    # para preguntas de solo datos se usa si ya está, sin esperarla
+    business = []
+    if route != "datos" or retrieval.done():
+        for r in (_future_result(retrieval, timeout=_SPECULATIVE_WAIT) or []):
+            if r["metadata"].get("kind") in ("schema", "catalog"):
+                continue
+            business.append(f"- {r['document'][:300]}")
+            if len(business) >= _SQL_CONTEXT_DOCS:
+                break
+    else:
+        cancelled.set()
+        retrieval.cancel()
+        sql_span.event("retrieval_cancelled")
+    context_block = "Contexto del negocio:\n" + "\n".join(business) + "\n\n" if business else ""
+
+    prompt2 = f"""{context_block}Resultados de: {sql}
 
 {result_text}
 
@@ -322,62 +945,14 @@ Responde en español, claro y conciso. No muestres SQL.
 
 Respuesta:"""
 
-    response2 = requests.post(
-        f"{cfg['base_url']}/api/generate",
-        json={"model": cfg["chat_model"], "prompt": prompt2, "stream": True},
-        stream=True
-    )
-
-    if response2.status_code != 200:
-        yield f"Error de Ollama: {response2.text}"
-        return
-
-    for line in response2.iter_lines():
-        if line:
-            data = json.loads(line)
-            token = data.get("response", "")
-            if token:
-                yield token
-            if data.get("done", False):
-                break
+    yield from _stream_generate(cfg, prompt2, name="llm.interpret")
 
 
 def _rag_path(query, collection_name, n_results, filters, cfg, status_callback):
     """Busca en ChromaDB y responde con conocimiento del negocio."""
-    import json
-    import requests
-
-    if status_callback:
-        status_callback("searching")
-    results = search(query, collection_name, n_results=n_results, filters=filters)
-
-    if not results:
-        yield "No encontré información relevante para responder."
-        return
-
-    if status_callback:
-        status_callback("answering")
-
-    prompt = _build_prompt(query, collection_name, results)
-
-    response = requests.post(
-        f"{cfg['base_url']}/api/generate",
-        json={"model": cfg["chat_model"], "prompt": prompt, "stream": True},
-        stream=True
-    )
-
-    if response.status_code != 200:
-        yield f"Error de Ollama: {response.text}"
-        return
-
-    for line in response.iter_lines():
-        if line:
-            data = json.loads(line)
-            token = data.get("response", "")
-            if token:
-                yield token
-            if data.get("done", False):
-                break
+    with span("rag", collection=collection_name):
+        yield from _rag_answer(query, collection_name, n_results, filters, cfg,
+                               lambda prompt: _stream_generate(cfg, prompt), status_callback)
 
 
 def print_results(results: List[Dict[str, Any]]):
@@ -0,0 +1,269 @@
+"""
+Contexto de esquema para generar SQL (/sql) y validación del SQL generado.
+
+En vez de describir columnas estáticas, el prompt de generación lleva solo
+las tablas relevantes para la pregunta, dentro de un presupuesto de tokens:
+
+  1. tablas de `mode: sql` (columnas configuradas en collections.yaml)
+  2. tablas de los documentos que devuelve la búsqueda vectorial
+     (metadata `tabla` de reglas, esquemas y catálogos), en orden de rank
+  3. tablas del caché de esquemas (data/schemas_cache.json) cuyo nombre o
+     columnas comparten palabras con la pregunta
+
+Las columnas salen del caché de esquemas (o del documento "Esquema ..."
+indexado si la tabla no está en el caché).
+
+    sql_context:
+      max_tokens: 1200     # presupuesto aproximado (4 caracteres por token)
+      max_tables: 6
+
+`validate_sql` revisa tablas y columnas del SQL generado contra ese esquema
+antes de ejecutar; search._sql_path pide una corrección al LLM a lo sumo
+una vez.
+"""
+
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+from config import get_collection_config
+
+_DEFAULTS = {"max_tokens": 1200, "max_tables": 6}
+_CHARS_PER_TOKEN = 4
+
+_LITERAL_RE = re.compile(r"N?'(?:[^']|'')*'")
+_TABLE_REF_RE = re.compile(
+    r'\b(FROM|JOIN)\s+((?:[\w\[\]"`]+\.)*[\w\[\]"`]+)(?:\s+(?:AS\s+)?([A-Za-z_]\w*))?',
+    re.IGNORECASE,
+)
+_CTE_RE = re.compile(r'(?:\bWITH|,)\s*([A-Za-z_]\w*)\s+AS\s*\(', re.IGNORECASE)
+_COLUMN_ALIAS_RE = re.compile(r'\bAS\s+(\[[^\]]+\]|"[^"]+"|[A-Za-z_]\w*)', re.IGNORECASE)
+_QUALIFIED_RE = re.compile(r'(\[[^\]]+\]|[A-Za-z_]\w*)\.(\[[^\]]+\]|"[^"]+"|[A-Za-z_]\w*)')
+_IDENTIFIER_RE = re.compile(r'(?<![\w.\]"@#])(\[[^\]]+\]|[A-Za-z_][\w$]*)(?!\s*\()(?![\w.])')
+
+# Palabras que no son identificadores (SQL, tipos, partes de fecha)
+_KEYWORDS = set("""
+select from where and or not in is null as on join inner left right full outer cross apply
+group by order having top limit offset distinct asc desc between like case when then else
+end union all exists with over partition rows range fetch next only first last any some
+true false percent ties into values set nulls preceding following unbounded current row
+int integer bigint smallint tinyint bit varchar nvarchar char nchar text ntext date datetime
+datetime2 smalldatetime time timestamp decimal numeric float real money double boolean
+year month day week quarter hour minute second millisecond dayofyear weekday yy yyyy mm m
+dd d wk ww hh mi n ss s ms qq q dw interval escape collate
+""".split())
+
+# Palabras que pueden seguir al nombre de una tabla sin ser su alias
+_CLAUSE_WORDS = set("""
+where on join inner left right full outer cross apply group order having limit union
+except intersect with offset fetch as
+""".split())
+
+_IMPLICIT_ALIAS_RE = re.compile(r'(\S+)\s+([A-Za-z_]\w*)\s*(?=,|\bFROM\b)', re.IGNORECASE)
+
+_STOPWORDS = set("""
+de del la las el los un una unos unas por para con sin que cual cuales cuanto cuantos
+cuantas como donde cuando en al y o a es son hay ver dame muestra mostrar lista listar
+total totales cada entre sobre the of and for
+""".split())
+
+
+def get_context_settings(collection_name: str) -> Dict[str, Any]:
+    try:
+        cfg = get_collection_config(collection_name).get("sql_context") or {}
+    except ValueError:
+        cfg = {}
+    return {**_DEFAULTS, **cfg}
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode()
+    return text.lower()
+
+
+def _words(text: str) -> set:
+    return {w for w in re.split(r"[^a-z0-9]+", _normalize(text)) if len(w) >= 3 and w not in _STOPWORDS}
+
+
+def _strip_identifier(name: str) -> str:
+    return name.strip('[]"`')
+
+
+def column_name(column: str) -> str:
+    """'Amount (decimal)' -> 'Amount' (formato de fetch_table_schema)."""
+    return re.sub(r"\s*\([^)]*\)\s*$", "", str(column)).strip()
+
+
+def _collection_tables(collection_name: str) -> Optional[set]:
+    """Tablas documentadas en los CSV de la colección (en minúsculas); None si no hay."""
+    import os
+    import pandas as pd
+
+    tables = set()
+    for source in get_collection_config(collection_name).get("sources", []):
+        path = source.get("path")
+        if source.get("type") != "csv" or not path or not os.path.isfile(path):
+            continue
+        df = pd.read_csv(path)
+        for column in ("tabla", "table"):
+            if column in df.columns:
+                tables.update(str(t).strip().lower() for t in df[column].dropna())
+    return tables or None
+
+
+def _tables_from_results(results: List[Dict[str, Any]]) -> List[str]:
+    tables = []
+    for result in results or []:
+        metadata = result.get("metadata") or {}
+        for table in str(metadata.get("tabla") or "").split(","):
+            table = table.strip()
+            if table and table not in tables:
+                tables.append(table)
+    return tables
+
+
+def _schema_docs(results: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """Columnas de los documentos 'Esquema <tabla>: col1, col2' de la búsqueda."""
+    schemas = {}
+    for result in results or []:
+        match = re.match(r"Esquema ([^:]+): (.*)$", result.get("document") or "", re.DOTALL)
+        if match:
+            schemas[match.group(1).strip()] = [c.strip() for c in match.group(2).split(", ") if c.strip()]
+    return schemas
+
+
+def select_schemas(query: str, collection_name: str, results: Optional[List[Dict[str, Any]]] = None,
+                   static_tables: Optional[Dict[str, List[str]]] = None,
+                   schemas: Optional[Dict[str, List[str]]] = None) -> Dict[str, List[str]]:
+    """
+    Tablas relevantes para la pregunta: {tabla: [columnas]} dentro del presupuesto.
+
+    `results` son los resultados de la búsqueda vectorial para la pregunta;
+    `static_tables` las tablas de `mode: sql`; `schemas` el caché de esquemas
+    (se lee de disco si no se pasa).
+    """
+    from schema_cache import find_table_schema, load_schemas_cache
+
+    settings = get_context_settings(collection_name)
+    if schemas is None:
+        schemas = load_schemas_cache() or {}
+    documented = _collection_tables(collection_name)
+    if documented:
+        # El caché es compartido entre colecciones: solo las tablas de esta
+        schemas = {t: cols for t, cols in schemas.items() if t.lower() in documented}
+    indexed = _schema_docs(results)
+
+    candidates = list(static_tables or {})
+    candidates += _tables_from_results(results)
+    question = _words(query)
+    lexical = []
+    for table, cols in schemas.items():
+        overlap = len(question & (_words(table.replace("_", " ")) | _words(" ".join(column_name(c) for c in cols))))
+        if overlap:
+            lexical.append((overlap, table))
+    candidates += [table for _, table in sorted(lexical, key=lambda x: -x[0])]
+
+    budget = settings["max_tokens"] * _CHARS_PER_TOKEN
+    selected: Dict[str, List[str]] = {}
+    used = 0
+    for table in candidates:
+        if len(selected) >= settings["max_tables"]:
+            break
+        if any(t.lower() == table.lower() for t in selected):
+            continue
+        if static_tables and table in static_tables:
+            name, cols = table, static_tables[table]
+        else:
+            found = find_table_schema(schemas, table)
+            if found is None:
+                found = find_table_schema(indexed, table)
+            if found is None:
+                continue
+            name, cols = found
+        size = len(name) + sum(len(c) + 2 for c in cols) + 20
+        if used + size > budget:
+            # Sin espacio para todas las columnas: se recorta esta tabla y se termina
+            remaining = budget - used - len(name) - 20
+            kept = []
+            for col in cols:
+                remaining -= len(col) + 2
+                if remaining < 0:
+                    break
+                kept.append(col)
+            if kept:
+                selected[name] = kept
+            break
+        selected[name] = list(cols)
+        used += size
+    return selected
+
+
+def render_schema_context(tables: Dict[str, List[str]], engine: str) -> str:
+    """Bloque de esquema para el prompt de generación."""
+    if not tables:
+        return ""
+    lines = [f"Motor: {engine}", "Tablas disponibles:"]
+    for table, cols in tables.items():
+        lines.append(f"- {table}: {', '.join(cols)}")
+    return "\n".join(lines)
+
+
+def validate_sql(sql: str, tables: Dict[str, List[str]]) -> List[str]:
+    """
+    Problemas de identificadores del SQL contra `tables` (lista vacía si no hay).
+
+    Revisa tablas de FROM/JOIN, columnas calificadas (alias.columna) y, si
+    todas las tablas de la consulta son conocidas, las columnas sin calificar.
+    """
+    if not tables:
+        return []
+    known = {t.lower(): {column_name(c).lower() for c in cols} for t, cols in tables.items()}
+    short = {t.split(".")[-1]: cols for t, cols in known.items()}
+    text = _LITERAL_RE.sub("''", sql)
+    ctes = {m.lower() for m in _CTE_RE.findall(text)}
+
+    issues = []
+    aliases: Dict[str, Optional[set]] = {}
+    all_known = True
+    for _, raw_table, alias in _TABLE_REF_RE.findall(text):
+        if raw_table.startswith("("):
+            continue
+        table = ".".join(_strip_identifier(p) for p in raw_table.split(".")).lower()
+        cols = known.get(table, short.get(table.split(".")[-1]))
+        if cols is None and table not in ctes:
+            issues.append(f"Tabla desconocida: {raw_table}")
+        if cols is None:
+            all_known = False
+        aliases[table.split(".")[-1]] = cols
+        if alias and alias.lower() not in _CLAUSE_WORDS:
+            aliases[alias.lower()] = cols
+    if re.search(r"\(\s*SELECT\b", text, re.IGNORECASE) or ctes:
+        # Subconsultas / CTE: sus columnas derivadas no se pueden validar sin calificar
+        all_known = False
+
+    referenced = [cols for cols in aliases.values() if cols is not None]
+    for qualifier, column in _QUALIFIED_RE.findall(text):
+        cols = aliases.get(_strip_identifier(qualifier).lower())
+        name = _strip_identifier(column)
+        if cols is not None and name != "*" and name.lower() not in cols:
+            issues.append(f"Columna desconocida: {qualifier}.{name}")
+
+    if all_known and referenced:
+        available = set().union(*referenced)
+        column_aliases = {_strip_identifier(a).lower() for a in _COLUMN_ALIAS_RE.findall(text)}
+        # Alias sin AS: "SUM(Amount) total," / "Number numero FROM"
+        for previous, alias in _IMPLICIT_ALIAS_RE.findall(text):
+            if not previous.endswith(",") and not previous.isdigit() and previous.lower() not in ("select", "distinct"):
+                column_aliases.add(alias.lower())
+        unqualified = _QUALIFIED_RE.sub(" ", text)
+        for token in _IDENTIFIER_RE.findall(unqualified):
+            name = _strip_identifier(token)
+            lower = name.lower()
+            if (lower in _KEYWORDS or lower in available or lower in aliases or lower in column_aliases
+                    or lower in known or lower in short):
+                continue
+            issue = f"Columna desconocida: {name}"
+            if issue not in issues:
+                issues.append(issue)
+    return issues
+
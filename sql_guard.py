@@ -0,0 +1,178 @@
+"""
+Pre-flight de costo para el SQL generado en /sql.
+
+Antes de pedir confirmación se obtiene el plan estimado del motor:
+    mssql    SET SHOWPLAN_XML ON   (StatementEstRows, StatementSubTreeCost)
+    mariadb  EXPLAIN               (filas examinadas = producto de `rows`)
+    duckdb   EXPLAIN (FORMAT JSON) (cardinalidad estimada de la raíz; costo =
+                                    suma de cardinalidades de los operadores)
+
+Umbrales por colección (sección `sql_guard` de collections.yaml):
+
+    sql_guard:
+      max_rows: 10000      # filas estimadas del resultado
+      max_cost: 50         # costo estimado, en unidades del motor
+      action: limit        # warn: solo avisar | limit: agregar TOP/LIMIT y timeout
+      limit_rows: 1000
+      query_timeout: 60    # segundos, al ejecutar una consulta que excede
+
+El resultado (`preflight`) trae el SQL a ejecutar (con TOP/LIMIT si se
+aplicó), la fuente (con `query_timeout` si se aplicó) y un texto para
+mostrar junto a la confirmación.
+"""
+
+import json
+import re
+from typing import Any, Dict, Optional
+
+from config import get_collection_config
+from db_connector import check_read_only, get_connection
+
+_DEFAULTS = {
+    "max_rows": 10000,
+    "max_cost": None,
+    "action": "warn",
+    "limit_rows": 1000,
+    "query_timeout": 60,
+}
+
+
+def get_guard_settings(collection_name: str) -> Dict[str, Any]:
+    try:
+        cfg = get_collection_config(collection_name).get("sql_guard") or {}
+    except ValueError:
+        cfg = {}
+    return {**_DEFAULTS, **cfg}
+
+
+def _explain_mssql(cursor, sql: str) -> Dict[str, Optional[float]]:
+    cursor.execute("SET SHOWPLAN_XML ON")
+    try:
+        cursor.execute(sql)
+        plan = cursor.fetchone()[0]
+        while cursor.nextset():
+            pass
+    finally:
+        cursor.execute("SET SHOWPLAN_XML OFF")
+    rows = re.search(r'StatementEstRows="([\d.eE+-]+)"', plan)
+    cost = re.search(r'StatementSubTreeCost="([\d.eE+-]+)"', plan)
+    return {
+        "rows": float(rows.group(1)) if rows else None,
+        "cost": float(cost.group(1)) if cost else None,
+    }
+
+
+def _explain_mariadb(cursor, sql: str) -> Dict[str, Optional[float]]:
+    cursor.execute(f"EXPLAIN {sql}")
+    columns = [d[0].lower() for d in cursor.description]
+    examined = 1.0
+    found = False
+    for row in cursor.fetchall():
+        value = row[columns.index("rows")] if "rows" in columns else None
+        if value is not None:
+            examined *= float(value)
+            found = True
+    examined = examined if found else None
+    # EXPLAIN no estima las filas del resultado; se usa el total examinado como cota
+    return {"rows": examined, "cost": examined}
+
+
+def _explain_duckdb(conn, sql: str) -> Dict[str, Optional[float]]:
+    result = conn.execute(f"EXPLAIN (FORMAT JSON) {sql}").fetchall()
+    plan = json.loads(result[0][1])
+    cardinalities = []
+
+    def walk(node):
+        value = (node.get("extra_info") or {}).get("Estimated Cardinality")
+        if value is not None:
+            try:
+                cardinalities.append(float(str(value).lstrip("~")))
+            except ValueError:
+                pass
+        for child in node.get("children", []):
+            walk(child)
+
+    root = plan[0] if isinstance(plan, list) else plan
+    walk(root)
+    root_rows = (root.get("extra_info") or {}).get("Estimated Cardinality")
+    return {
+        "rows": float(str(root_rows).lstrip("~")) if root_rows is not None else (cardinalities[0] if cardinalities else None),
+        "cost": sum(cardinalities) if cardinalities else None,
+    }
+
+
+def estimate(source: Dict[str, Any], sql: str) -> Dict[str, Optional[float]]:
+    """Filas y costo estimados por el optimizador (sin ejecutar la consulta)."""
+    check_read_only(sql)
+    conn = get_connection(source)
+    try:
+        if source["type"] == "duckdb":
+            return _explain_duckdb(conn, sql)
+        cursor = conn.cursor()
+        if source["type"] == "mssql":
+            return _explain_mssql(cursor, sql)
+        return _explain_mariadb(cursor, sql)
+    finally:
+        conn.close()
+
+
+def has_row_limit(source: Dict[str, Any], sql: str) -> bool:
+    if source["type"] == "mssql":
+        return bool(re.match(r'(?is)^\s*\(?\s*SELECT\s+(DISTINCT\s+)?TOP\b', sql))
+    return bool(re.search(r'(?i)\bLIMIT\s+\d+\s*;?\s*$', sql.strip()))
+
+
+def apply_row_limit(source: Dict[str, Any], sql: str, limit: int) -> Optional[str]:
+    """Agrega TOP/LIMIT; None si la consulta no admite hacerlo de forma segura (UNION)."""
+    if has_row_limit(source, sql):
+        return sql
+    if re.search(r'(?i)\bUNION\b', sql):
+        return None
+    if source["type"] == "mssql":
+        return re.sub(r'(?is)^(\s*SELECT\s+(?:DISTINCT\s+)?)', rf'\g<1>TOP {int(limit)} ', sql, count=1)
+    return f"{sql.strip().rstrip(';')} LIMIT {int(limit)}"
+
+
+def _fmt(value: Optional[float]) -> str:
+    if value is None:
+        return "?"
+    return f"{value:,.0f}" if value >= 100 else f"{value:,.2f}"
+
+
+def preflight(source: Dict[str, Any], sql: str, settings: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Estima el costo y aplica los umbrales.
+
+    Retorna {"sql", "source", "estimate", "exceeded", "message"}; si no se
+    pudo obtener el plan, la consulta sigue igual y el mensaje lo indica.
+    """
+    result = {"sql": sql, "source": source, "estimate": None, "exceeded": [], "message": ""}
+    try:
+        est = estimate(source, sql)
+    except Exception as e:
+        result["message"] = f"Estimación no disponible ({str(e).splitlines()[0] if str(e) else type(e).__name__})"
+        return result
+    result["estimate"] = est
+
+    exceeded = []
+    if settings.get("max_rows") is not None and est["rows"] is not None and est["rows"] > settings["max_rows"]:
+        exceeded.append(f"filas > {_fmt(settings['max_rows'])}")
+    if settings.get("max_cost") is not None and est["cost"] is not None and est["cost"] > settings["max_cost"]:
+        exceeded.append(f"costo > {_fmt(settings['max_cost'])}")
+    result["exceeded"] = exceeded
+
+    message = f"Estimado: ~{_fmt(est['rows'])} filas, costo {_fmt(est['cost'])}"
+    if exceeded:
+        message = f"⚠️  {message} ({', '.join(exceeded)})"
+        if settings.get("action") == "limit":
+            limited = apply_row_limit(source, sql, settings["limit_rows"])
+            if limited is None:
+                message += "; no se pudo agregar límite (UNION)"
+            elif limited != sql:
+                result["sql"] = limited
+                message += f"; se agregó límite de {settings['limit_rows']} filas"
+            if settings.get("query_timeout"):
+                result["source"] = {**source, "query_timeout": settings["query_timeout"]}
+                message += f", timeout {settings['query_timeout']}s"
+    result["message"] = message
+    return result
@@ -0,0 +1,346 @@
+"""
+Manejo de resultados SQL por lotes, con memoria acotada.
+
+Los resultados de `db_connector.iter_query` se consumen lote a lote:
+
+    TablePrinter   imprime las filas a medida que llegan (ancho fijo)
+    ResultWriter   escribe los lotes a CSV o Parquet (según la extensión)
+    ResultSummary  acumula conteo, estadísticas por columna y las primeras
+                   N filas; `to_text()` es lo que se envía al LLM en vez de
+                   la tabla completa
+
+`export_query` combina iter_query + ResultWriter para extracciones completas
+(`main.py sql --export`, `query_prod.py --export`): memoria constante por
+lote, sin DataFrame.
+"""
+
+import csv
+import datetime
+import decimal
+import os
+import sys
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+# Valores distintos que se rastrean por columna (después se deja de contar)
+_MAX_TRACKED_VALUES = 1000
+_CELL_WIDTH = 40
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float, decimal.Decimal)) and not isinstance(value, bool)
+
+
+def _is_temporal(value) -> bool:
+    return isinstance(value, (datetime.date, datetime.datetime, datetime.time))
+
+
+class _ColumnStats:
+    def __init__(self):
+        self.non_null = 0
+        self.minimum = None
+        self.maximum = None
+        self.total = 0.0
+        self.numeric = True
+        self.ordered = True
+        self.values = Counter()
+        self.overflow = False
+
+    def add(self, value) -> None:
+        if value is None:
+            return
+        self.non_null += 1
+        if self.numeric and not _is_number(value):
+            self.numeric = False
+        if self.ordered and not (_is_number(value) or _is_temporal(value)):
+            self.ordered = False
+        if self.numeric:
+            self.total += float(value)
+        if self.ordered:
+            try:
+                self.minimum = value if self.minimum is None or value < self.minimum else self.minimum
+                self.maximum = value if self.maximum is None or value > self.maximum else self.maximum
+            except TypeError:
+                self.ordered = False
+        key = str(value)
+        if key in self.values or len(self.values) < _MAX_TRACKED_VALUES:
+            self.values[key] += 1
+        else:
+            self.overflow = True
+
+    def describe(self) -> str:
+        if self.non_null == 0:
+            return "sin valores"
+        distinct = f">{_MAX_TRACKED_VALUES}" if self.overflow else str(len(self.values))
+        parts = [f"{self.non_null} valores", f"{distinct} distintos"]
+        if self.numeric:
+            parts.append(f"min={self.minimum} max={self.maximum} promedio={self.total / self.non_null:.2f}")
+        elif self.ordered:
+            parts.append(f"min={self.minimum} max={self.maximum}")
+        else:
+            top = ", ".join(f"{v} ({n})" for v, n in self.values.most_common(3))
+            parts.append(f"más frecuentes: {top}")
+        return "; ".join(parts)
+
+
+class ResultSummary:
+    """Resumen acotado de un resultado: conteo, estadísticas y primeras filas."""
+
+    def __init__(self, head_rows: int = 20):
+        self.head_rows = head_rows
+        self.columns: List[str] = []
+        self.row_count = 0
+        self.head: List[tuple] = []
+        self.stats: Dict[str, _ColumnStats] = {}
+
+    def update(self, columns: Sequence[str], rows: Sequence[tuple]) -> None:
+        if not self.columns:
+            self.columns = list(columns)
+            self.stats = {c: _ColumnStats() for c in self.columns}
+        for row in rows:
+            if len(self.head) < self.head_rows:
+                self.head.append(row)
+            for column, value in zip(self.columns, row):
+                self.stats[column].add(value)
+        self.row_count += len(rows)
+
+    def to_text(self, truncated: bool = False) -> str:
+        if self.row_count == 0:
+            return "(sin resultados)"
+        total = f"{self.row_count} filas" + (" (resultado truncado por el límite)" if truncated else "")
+        lines = [f"Total: {total}", "", "Columnas:"]
+        for column in self.columns:
+            lines.append(f"  {column}: {self.stats[column].describe()}")
+        shown = len(self.head)
+        title = "Filas" if shown == self.row_count else f"Primeras {shown} filas"
+        lines += ["", f"{title}:", format_table(self.columns, self.head)]
+        return "\n".join(lines)
+
+
+def _cell(value) -> str:
+    text = "" if value is None else str(value).replace("\n", " ")
+    return text if len(text) <= _CELL_WIDTH else text[:_CELL_WIDTH - 1] + "…"
+
+
+def format_table(columns: Sequence[str], rows: Sequence[tuple]) -> str:
+    """Tabla de texto con ancho por columna (como DataFrame.to_string, sin índice)."""
+    cells = [[_cell(v) for v in row] for row in rows]
+    widths = [max([len(str(c))] + [len(r[i]) for r in cells]) for i, c in enumerate(columns)]
+    lines = [" ".join(str(c).rjust(w) for c, w in zip(columns, widths))]
+    lines += [" ".join(v.rjust(w) for v, w in zip(row, widths)) for row in cells]
+    return "\n".join(lines)
+
+
+def _unique_names(columns: Sequence[str]) -> List[str]:
+    names, seen = [], Counter()
+    for column in columns:
+        seen[column] += 1
+        names.append(str(column) if seen[column] == 1 else f"{column}_{seen[column]}")
+    return names
+
+
+class TablePrinter:
+    """Imprime lotes de filas a medida que llegan; los anchos salen del primer lote."""
+
+    def __init__(self):
+        self.widths: Optional[List[int]] = None
+
+    def print_batch(self, columns: Sequence[str], rows: Sequence[tuple]) -> None:
+        if not rows:
+            return
+        cells = [[_cell(v) for v in row] for row in rows]
+        if self.widths is None:
+            self.widths = [max([len(str(c))] + [len(r[i]) for r in cells]) for i, c in enumerate(columns)]
+            print(" ".join(str(c).rjust(w) for c, w in zip(columns, self.widths)))
+        for row in cells:
+            print(" ".join(v.rjust(w) for v, w in zip(row, self.widths)))
+        sys.stdout.flush()
+
+
+# Filas que se retienen antes de abrir el Parquet mientras alguna columna
+# sigue sin valores (para fijar su tipo sin reescribir el archivo)
+_PENDING_ROWS = 50000
+
+
+def _infer_array(values: List):
+    """Arrow del lote con el tipo de sus valores; texto si los tipos se mezclan."""
+    import pyarrow as pa
+
+    try:
+        array = pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        return pa.array([None if v is None else str(v) for v in values], pa.string())
+    # La precisión del decimal se infiere de los valores del lote: se usa la
+    # máxima para que otro lote con más dígitos quepa sin cambiar el esquema
+    if pa.types.is_decimal128(array.type):
+        array = array.cast(pa.decimal128(38, array.type.scale))
+    return array
+
+
+def _merge_type(current, incoming):
+    """
+    Tipo de una columna cuando un lote trae otro tipo. Solo se ensancha ante
+    un conflicto real: enteros siguen enteros hasta que aparece un float,
+    una columna sin valores toma el primer tipo concreto, decimales de otra
+    escala pasan a la mayor, fecha y fecha-hora a timestamp; el resto a texto.
+    """
+    import pyarrow as pa
+
+    if current == incoming or pa.types.is_null(incoming):
+        return current
+    if pa.types.is_null(current):
+        return incoming
+    types = (current, incoming)
+    if all(pa.types.is_integer(t) for t in types):
+        return pa.int64()
+    if all(pa.types.is_decimal128(t) or pa.types.is_integer(t) for t in types):
+        return pa.decimal128(38, max(t.scale for t in types if pa.types.is_decimal128(t)))
+    if all(pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_decimal(t) for t in types):
+        return pa.float64()
+    if all(pa.types.is_date(t) or (pa.types.is_timestamp(t) and t.tz is None) for t in types):
+        return pa.timestamp("us")
+    return pa.string()
+
+
+def _cast(array, arrow_type):
+    import pyarrow as pa
+
+    if array.type == arrow_type:
+        return array
+    if pa.types.is_string(arrow_type):
+        # str() de Python, igual que el CSV (no el formato de cast de Arrow)
+        return pa.array([None if v is None else str(v) for v in array.to_pylist()], pa.string())
+    return array.cast(arrow_type)
+
+
+class ResultWriter:
+    """Escribe lotes de filas a CSV o Parquet (por extensión: .csv, .parquet)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.format = "parquet" if path.lower().endswith((".parquet", ".pq")) else "csv"
+        self._file = None
+        self._csv = None
+        self._parquet = None
+        self._parquet_path = None
+        self._schema = None
+        self._pending = []
+        self._pending_rows = 0
+        self.rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def write(self, columns: Sequence[str], rows: Sequence[tuple]) -> None:
+        if self.format == "csv":
+            self._write_csv(columns, rows)
+        else:
+            self._write_parquet(columns, rows)
+        self.rows += len(rows)
+
+    def _write_csv(self, columns, rows) -> None:
+        if self._csv is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, "w", encoding="utf-8", newline="")
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(columns)
+        self._csv.writerows(rows)
+
+    def _write_parquet(self, columns, rows) -> None:
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError("Para escribir Parquet instala pyarrow: pip install pyarrow")
+
+        # Parquet necesita nombres únicos (un JOIN puede repetir columnas)
+        names = _unique_names(columns)
+        arrays = [_infer_array([row[i] for row in rows]) for i in range(len(names))]
+        if self._schema is None:
+            schema = pa.schema([pa.field(n, a.type) for n, a in zip(names, arrays)])
+        else:
+            schema = pa.schema([pa.field(f.name, _merge_type(f.type, a.type)) for f, a in zip(self._schema, arrays)])
+            if schema != self._schema and self._parquet is not None:
+                self._rewrite(schema)
+        self._schema = schema
+        table = pa.Table.from_arrays([_cast(a, f.type) for a, f in zip(arrays, schema)], schema=schema)
+
+        if self._parquet is not None:
+            self._parquet.write_table(table)
+            return
+        self._pending.append(table)
+        self._pending_rows += len(rows)
+        if self._pending_rows >= _PENDING_ROWS or not any(pa.types.is_null(f.type) for f in schema):
+            self._flush_pending()
+
+    def _open_parquet(self, schema):
+        import pyarrow.parquet as pq
+
+        # Se escribe a un archivo temporal que pasa a `path` al cerrar
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._parquet_path = f"{self.path}.tmp" if self._parquet_path != f"{self.path}.tmp" else f"{self.path}.tmp2"
+        self._parquet = pq.ParquetWriter(self._parquet_path, schema)
+
+    def _flush_pending(self) -> None:
+        import pyarrow as pa
+
+        self._open_parquet(self._schema)
+        for table in self._pending:
+            arrays = [_cast(column.combine_chunks(), field.type) for column, field in zip(table.columns, self._schema)]
+            self._parquet.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+        self._pending = []
+        self._pending_rows = 0
+
+    def _rewrite(self, schema) -> None:
+        """Un lote no cabe en el tipo de una columna: se copia lo escrito con el tipo nuevo."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._parquet.close()
+        old_path = self._parquet_path
+        self._open_parquet(schema)
+        for batch in pq.ParquetFile(old_path).iter_batches():
+            arrays = [_cast(column, field.type) for column, field in zip(batch.columns, schema)]
+            self._parquet.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        os.remove(old_path)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._pending:
+            self._flush_pending()
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+            os.replace(self._parquet_path, self.path)
+
+
+def export_query(source, sql: str, path: str, max_rows: Optional[int] = None,
+                 batch_size: int = 10000, progress: bool = True) -> int:
+    """Exporta el resultado completo de un SELECT a CSV/Parquet por lotes. Retorna las filas escritas."""
+    from db_connector import iter_query
+
+    start = time.perf_counter()
+    last_report = 0.0
+    with ResultWriter(path) as writer:
+        for columns, rows in iter_query(source, sql, max_rows=max_rows, batch_size=batch_size):
+            writer.write(columns, rows)
+            elapsed = time.perf_counter() - start
+            if progress and (elapsed - last_report >= 1.0 or not rows):
+                last_report = elapsed
+                _report_progress(writer.rows, elapsed)
+    if progress:
+        _report_progress(writer.rows, time.perf_counter() - start)
+        print()
+    return writer.rows
+
+
+def _report_progress(rows: int, elapsed: float) -> None:
+    rate = rows / elapsed if elapsed > 0 else 0.0
+    sys.stdout.write(f"\r  {rows:,} filas en {elapsed:.1f}s ({rate:,.0f} filas/s)".ljust(60))
+    sys.stdout.flush()
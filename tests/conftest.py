@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+import yaml
+
+# Los módulos del proyecto están en la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def chroma_config(tmp_path, monkeypatch):
+    """collections.yaml temporal con ChromaDB en tmp_path; retorna una función para escribirlo."""
+    import config
+
+    path = tmp_path / "collections.yaml"
+    monkeypatch.setattr(config, "CONFIG_PATH", str(path))
+    monkeypatch.setattr(config, "SECRETS_PATH", str(tmp_path / "collections.secrets.yaml"))
+
+    def write(collections, **sections):
+        data = {
+            "ollama": {"base_url": "http://127.0.0.1:9", "embedding_model": "test-embed", "chat_model": "test-chat"},
+            "chroma": {"persist_directory": str(tmp_path / "chroma")},
+            "collections": collections,
+            **sections,
+        }
+        path.write_text(yaml.safe_dump(data), encoding="utf-8")
+        return data
+
+    return write
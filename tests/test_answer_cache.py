@@ -0,0 +1,23 @@
+import threading
+
+import answer_cache
+
+
+def test_concurrent_stores_and_hits_keep_every_entry(tmp_path, monkeypatch):
+    monkeypatch.setattr(answer_cache, "_cache_path", lambda name: str(tmp_path / f"{name}.json"))
+    monkeypatch.setattr(answer_cache, "index_version", lambda name: "v1")
+    settings = {**answer_cache._DEFAULTS, "enabled": True}
+    answer_cache.store("c", "base", [1.0, 0.0], "ctx", "respuesta", settings)
+
+    def work(i):
+        answer_cache.store("c", f"q{i}", [0.0, 1.0], f"ctx{i}", "respuesta", settings)
+        answer_cache.lookup("c", [1.0, 0.0], "ctx", settings)
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    entries = answer_cache._load("c")
+    assert len(entries) == 21
+    assert next(e for e in entries if e["query"] == "base")["hits"] == 20
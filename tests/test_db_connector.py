@@ -0,0 +1,49 @@
+import time
+from unittest import mock
+
+import duckdb
+import pymssql
+import pymssql._mssql
+import pytest
+
+from db_connector import QueryTimeout, cancel_query, fetch_source
+
+
+def _mssql_connection():
+    """pymssql.Connection falso con la misma interfaz (sin cancel())."""
+    conn = mock.create_autospec(pymssql.Connection, instance=True)
+    conn._conn = mock.create_autospec(pymssql._mssql.MSSQLConnection, instance=True)
+    return conn
+
+
+def test_cancel_query_mssql_cancels_underlying_connection():
+    conn = _mssql_connection()
+    cancel_query(conn, {"type": "mssql"})
+    conn._conn.cancel.assert_called_once_with()
+
+
+def test_cancel_query_duckdb_interrupts():
+    conn = mock.Mock()
+    cancel_query(conn, {"type": "duckdb"})
+    conn.interrupt.assert_called_once_with()
+
+
+def test_fetch_source_respects_duckdb_query_timeout(tmp_path):
+    db = str(tmp_path / "t.duckdb")
+    duckdb.connect(db).close()
+    source = {"type": "duckdb", "path": db, "query_timeout": 1,
+              "query": "SELECT count(*) AS n FROM range(100000000000) a"}
+    start = time.perf_counter()
+    with pytest.raises(QueryTimeout):
+        fetch_source(source)
+    assert time.perf_counter() - start < 10
+
+
+def test_fetch_source_sql_returns_dataframe(tmp_path):
+    db = str(tmp_path / "t.duckdb")
+    conn = duckdb.connect(db)
+    conn.execute("CREATE TABLE t AS SELECT i AS id, 'r' || i AS nombre FROM range(30) r(i)")
+    conn.close()
+    df = fetch_source({"type": "duckdb", "path": db, "query": "SELECT id, nombre FROM t ORDER BY id"}, limit=5)
+    assert list(df.columns) == ["id", "nombre"]
+    assert df["id"].tolist() == [0, 1, 2, 3, 4]
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from embeddings import truncate_embeddings
+from vector_store import check_embedding_dim, get_chroma_client, prepare_query_embedding
+
+
+def test_truncate_embeddings_keeps_prefix_and_renormalizes():
+    vectors = np.array([[3.0, 4.0, 12.0], [0.0, 0.0, 5.0]])
+    truncated = truncate_embeddings(vectors, 2)
+    np.testing.assert_allclose(truncated[0], [0.6, 0.8], rtol=1e-6)
+    # Un prefijo nulo queda en cero en vez de dividir por cero
+    np.testing.assert_array_equal(truncated[1], [0.0, 0.0])
+
+
+def test_truncate_embeddings_rejects_shorter_vectors():
+    with pytest.raises(ValueError, match="menos que embedding_dim"):
+        truncate_embeddings([[1.0, 2.0]], 4)
+
+
+def test_check_embedding_dim_rejects_collection_indexed_with_other_dim(chroma_config):
+    chroma_config({"col": {"embedding_dim": 2, "sources": []}})
+    collection = check_embedding_dim("col")
+    assert collection.metadata["embedding_dim"] == 2
+    collection.add(ids=["a"], embeddings=[[1.0, 0.0]], documents=["a"])
+
+    chroma_config({"col": {"embedding_dim": 3, "sources": []}})
+    with pytest.raises(ValueError, match="embedding_dim=2.*pide 3"):
+        check_embedding_dim("col")
+    with pytest.raises(ValueError, match="index --clear"):
+        prepare_query_embedding(get_chroma_client().get_collection("col"), [1.0, 0.0, 0.0, 0.0], 3)
+
+
+def test_check_embedding_dim_recreates_empty_collection(chroma_config):
+    chroma_config({"col": {"embedding_dim": 2, "sources": []}})
+    check_embedding_dim("col")
+    chroma_config({"col": {"embedding_dim": 3, "sources": []}})
+    assert check_embedding_dim("col").metadata["embedding_dim"] == 3
+
+
+def test_prepare_query_embedding_truncates_to_collection_dim(chroma_config):
+    chroma_config({"col": {"embedding_dim": 2, "sources": []}})
+    collection = check_embedding_dim("col")
+    np.testing.assert_allclose(prepare_query_embedding(collection, [3.0, 4.0, 9.0], 2), [0.6, 0.8], rtol=1e-6)
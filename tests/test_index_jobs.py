@@ -0,0 +1,74 @@
+import pandas as pd
+import pytest
+
+import vector_store
+from index_jobs import load_job, new_job, save_job
+from vector_store import get_chroma_client, index_source
+
+SOURCE = {"name": "src", "vectorize": ["texto"], "metadata": ["id"]}
+
+
+class _Embedder:
+    """get_embeddings_batch falso: cuenta los textos embebidos y falla en la llamada `fail_on`."""
+
+    def __init__(self, fail_on=None):
+        self.texts = []
+        self.calls = 0
+        self.fail_on = fail_on
+
+    def __call__(self, texts, show_progress=True):
+        self.calls += 1
+        if self.calls == self.fail_on:
+            raise ConnectionError("Ollama caído")
+        self.texts.extend(texts)
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+def _texts(n):
+    return sorted(f"texto: regla número {i}" for i in range(n))
+
+
+def _df(n):
+    return pd.DataFrame({"id": [f"r{i}" for i in range(n)], "texto": [f"regla número {i}" for i in range(n)]})
+
+
+@pytest.fixture
+def col(chroma_config):
+    chroma_config({"col": {"sources": [SOURCE]}})
+    return "col"
+
+
+def test_resume_continues_after_last_confirmed_batch(col, monkeypatch):
+    embedder = _Embedder(fail_on=3)
+    monkeypatch.setattr(vector_store, "get_embeddings_batch", embedder)
+    job = new_job(col)
+    save_job(job)
+    with pytest.raises(ConnectionError):
+        index_source(_df(25), col, SOURCE, batch_size=5, job=job)
+    assert load_job(col)["sources"]["src"]["offset"] == 10
+    assert get_chroma_client().get_collection(col).count() == 10
+
+    embedder.fail_on = None
+    index_source(_df(25), col, SOURCE, batch_size=5, job=load_job(col))
+    stored = get_chroma_client().get_collection(col).get(include=["documents"])
+    assert sorted(stored["documents"]) == _texts(25)
+    # Los 10 confirmados antes de la caída no se vuelven a embeber
+    assert sorted(embedder.texts) == _texts(25)
+    assert load_job(col)["sources"]["src"]["status"] == "done"
+
+
+def test_changed_ids_restart_from_zero_without_double_writes(col, monkeypatch):
+    embedder = _Embedder(fail_on=3)
+    monkeypatch.setattr(vector_store, "get_embeddings_batch", embedder)
+    job = new_job(col)
+    with pytest.raises(ConnectionError):
+        index_source(_df(25), col, SOURCE, batch_size=5, job=job)
+
+    # Otra lista de IDs (la fuente cambió): el offset guardado ya no vale
+    embedder.fail_on = None
+    job = load_job(col)
+    digest = job["sources"]["src"]["ids_digest"]
+    index_source(_df(30), col, SOURCE, batch_size=5, job=job)
+    assert job["sources"]["src"]["ids_digest"] != digest
+    assert get_chroma_client().get_collection(col).count() == 30
+    assert len(embedder.texts) == len(set(embedder.texts)) == 30
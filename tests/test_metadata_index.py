@@ -0,0 +1,46 @@
+import json
+import random
+
+import metadata_index
+from metadata_index import bitmap_count, bitmap_ids, load_index, match_filters, save_index, update_index
+
+
+def _docs(n, seed=0):
+    rng = random.Random(seed)
+    ids = [f"doc{i}" for i in range(n)]
+    metas = [{"numero": str(i), "cliente": rng.choice(["A", "B", "C"]), "raro": "x" if i % 500 == 0 else "y"}
+             for i in range(n)]
+    return ids, metas
+
+
+def _expected(ids, metas, filters):
+    return [doc_id for doc_id, meta in zip(ids, metas) if all(meta.get(k) == v for k, v in filters.items())]
+
+
+def test_filters_match_dense_and_sparse_values(tmp_path, monkeypatch):
+    monkeypatch.setattr(metadata_index, "_index_path", lambda name: str(tmp_path / f"{name}.json"))
+    ids, metas = _docs(3000)
+    index = None
+    for i in range(0, len(ids), 250):
+        index = update_index(index, ids[i:i + 250], metas[i:i + 250])
+    # Reemplazo de documentos existentes con otra metadata
+    metas[10] = {"numero": "10", "cliente": "Z", "raro": "x"}
+    index = update_index(index, [ids[10]], [metas[10]])
+    save_index("c", index)
+    loaded = load_index("c")
+
+    for filters in ({"cliente": "A"}, {"numero": "2999"}, {"raro": "x"}, {"cliente": "Z", "raro": "x"},
+                    {"cliente": "B", "numero": "10"}):
+        for idx in (index, loaded):
+            bits = match_filters(idx, filters)
+            assert bitmap_ids(idx, bits) == _expected(ids, metas, filters)
+            assert bitmap_count(bits) == len(_expected(ids, metas, filters))
+
+
+def test_unique_field_is_stored_sparse(tmp_path, monkeypatch):
+    monkeypatch.setattr(metadata_index, "_index_path", lambda name: str(tmp_path / f"{name}.json"))
+    ids, metas = _docs(5000)
+    save_index("c", update_index(None, ids, metas))
+    raw = json.loads((tmp_path / "c.json").read_text())
+    assert all(isinstance(entry, list) for entry in raw["fields"]["numero"].values())
+    assert all(isinstance(entry, str) for entry in raw["fields"]["cliente"].values())
@@ -0,0 +1,25 @@
+import metrics
+
+
+def test_histogram_memory_is_bounded():
+    metrics.reset()
+    for i in range(10 * metrics._RESERVOIR_SIZE):
+        metrics.observe("test.ms", float(i % 100))
+    hist = metrics.summary()["histograms"]["test.ms"]
+    assert hist["count"] == 10 * metrics._RESERVOIR_SIZE
+    assert hist["max"] == 99.0
+    assert len(metrics.snapshot()["histograms"]["test.ms"]["samples"]) == metrics._RESERVOIR_SIZE
+    metrics.reset()
+
+
+def test_merge_adds_counts_and_buckets():
+    metrics.reset()
+    metrics.observe("test.ms", 3.0)
+    other = metrics.snapshot()
+    metrics.observe("test.ms", 30.0)
+    metrics.merge(other)
+    hist = metrics.summary()["histograms"]["test.ms"]
+    assert hist["count"] == 3
+    assert hist["buckets"]["<=5"] == 2
+    assert hist["max"] == 30.0
+    metrics.reset()
@@ -0,0 +1,37 @@
+from parallel_index import _Claims, _release
+
+
+def test_claims_hand_each_id_to_one_owner():
+    claims = _Claims(["existente"])
+    assert claims.claim(["a", "b", "existente", "a"], "uno") == ["a", "b"]
+    assert claims.claim(["b", "c"], "dos") == ["c"]
+
+
+def _batch(source, ids, embedded):
+    return ("batch", source, [("col", ids, ids, [{}] * len(ids))], {i: [0.0] for i in embedded}, 0, 0)
+
+
+def test_batches_wait_for_vectors_embedded_by_another_worker():
+    homes = {}
+    applied = []
+
+    def apply(msg):
+        applied.append((msg[0], msg[1]))
+        if msg[0] == "batch":
+            for _, ids, _, _ in msg[2]:
+                homes.update(dict.fromkeys(ids, "col"))
+
+    held = {"dos": [_batch("dos", ["x", "y"], ["y"]), ("done", "dos")]}
+    _release(held, apply, homes)
+    assert applied == []
+
+    held["uno"] = [_batch("uno", ["x"], ["x"])]
+    _release(held, apply, homes)
+    assert applied == [("batch", "uno"), ("batch", "dos"), ("done", "dos")]
+
+
+def test_forced_release_applies_what_is_left():
+    applied = []
+    held = {"dos": [_batch("dos", ["x"], [])]}
+    _release(held, lambda msg: applied.append(msg[1]), {}, force=True)
+    assert applied == ["dos"]
@@ -0,0 +1,10 @@
+from partitions import SHARED_SUFFIX, partition_name
+
+
+def test_partition_names_do_not_collide_on_slug():
+    names = {partition_name("proyectos", v) for v in ("ACME S.A.", "acme s.a.", "acme-s-a", "Acme S.A.")}
+    assert len(names) == 4
+
+
+def test_partition_name_without_value_is_shared():
+    assert partition_name("proyectos", None) == f"proyectos__{SHARED_SUFFIX}"
@@ -0,0 +1,19 @@
+import threading
+
+import query_cache
+
+
+def test_concurrent_commits_keep_every_entry(tmp_path, monkeypatch):
+    monkeypatch.setattr(query_cache, "_cache_dir", lambda: str(tmp_path))
+
+    def commit(i):
+        writer = query_cache._CacheWriter(f"key{i}")
+        writer.write(["n"], [(i,)])
+        writer.commit({"sql": f"SELECT {i}", "tables": [], "columns": ["n"]})
+
+    threads = [threading.Thread(target=commit, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(query_cache._load_index()) == sorted(f"key{i}" for i in range(20))
@@ -0,0 +1,96 @@
+import pytest
+
+import search
+from metadata_index import dump_refs, load_index
+from vector_store import get_chroma_client
+
+
+def test_filter_without_index_matches_values_inside_refs(chroma_config):
+    chroma_config({"col": {"sources": []}})
+    collection = get_chroma_client().get_or_create_collection("col", metadata={"hnsw:space": "cosine"})
+    refs = dump_refs([{"_source": "s", "cliente": "ACME"}, {"_source": "s", "cliente": "SUR"}])
+    collection.add(ids=["d1", "d2"], embeddings=[[1.0, 0.0], [0.0, 1.0]], documents=["uno", "dos"],
+                   metadatas=[{"_source": "s", "cliente": "ACME", "_refs": refs}, {"_source": "s", "cliente": "SUR"}])
+    assert load_index("col") is None
+
+    results = search._query_documents("col", collection, [1.0, 0.0], 5, {"cliente": "SUR"},
+                                      search._SEARCH_DEFAULTS)
+    assert sorted(r["id"] for r in results) == ["d1", "d2"]
+    assert load_index("col") is not None
+
+
+def _result(doc_id, similarity):
+    return {"id": doc_id, "document": doc_id, "metadata": {"_source": "s"}, "distance": 1 - similarity,
+            "similarity": similarity}
+
+
+def _federated(monkeypatch, per_collection):
+    monkeypatch.setattr(search, "get_embedding", lambda text: [1.0, 0.0])
+
+    def query(name, embedding, n_results, filters):
+        outcome = per_collection[name]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return [_result(doc_id, sim) for doc_id, sim in outcome]
+
+    monkeypatch.setattr(search, "_query_collection", query)
+
+
+def test_federated_search_merges_by_similarity(monkeypatch):
+    _federated(monkeypatch, {"a": [("a1", 0.9), ("a2", 0.4)], "b": [("b1", 0.7), ("b2", 0.6)]})
+    results = search.federated_search("q", ["a", "b"], n_results=3)
+    assert [r["id"] for r in results] == ["a1", "b1", "b2"]
+    assert [r["metadata"]["_collection"] for r in results] == ["a", "b", "b"]
+
+
+def test_federated_search_deduplicates_shared_content(monkeypatch):
+    _federated(monkeypatch, {"a": [("doc", 0.5)], "b": [("doc", 0.8), ("b1", 0.6)]})
+    results = search.federated_search("q", ["a", "b"], n_results=5)
+    assert [r["id"] for r in results] == ["doc", "b1"]
+    assert results[0]["similarity"] == 0.8
+    assert results[0]["metadata"]["_collection"] == "a, b"
+
+
+def test_federated_search_skips_a_failing_collection(monkeypatch, capsys):
+    _federated(monkeypatch, {"a": RuntimeError("sin colección"), "b": [("b1", 0.6)]})
+    timings = {}
+    assert [r["id"] for r in search.federated_search("q", ["a", "b"], timings=timings)] == ["b1"]
+    assert "Colección 'a' omitida" in capsys.readouterr().out
+    assert set(timings) == {"a", "b"}
+
+    _federated(monkeypatch, {"a": RuntimeError("sin colección"), "b": RuntimeError("tampoco")})
+    with pytest.raises(RuntimeError):
+        search.federated_search("q", ["a", "b"])
+
+
+def _chunk(doc_id, parent_id, index, similarity):
+    metadata = {"_source": "s", "parent_id": parent_id, "chunk_index": index, "chunk_count": 4}
+    return {"id": doc_id, "document": f"parte {index}", "metadata": metadata, "similarity": similarity}
+
+
+def test_merge_chunks_joins_matched_siblings_in_order():
+    results = [_chunk("c3", "doc_p", 3, 0.9), _result("otro", 0.8), _chunk("c1", "doc_p", 1, 0.7)]
+    merged = search._merge_chunks(results)
+    assert [r["id"] for r in merged] == ["doc_p", "otro"]
+    assert merged[0]["document"] == "parte 1\nparte 3"
+    assert merged[0]["similarity"] == 0.9
+    assert merged[0]["metadata"]["chunks"] == "1,3"
+    assert "chunk_index" not in merged[0]["metadata"]
+
+
+def _candidates():
+    vectors = {"a": [1.0, 0.1, 0.0], "a_dup": [1.0, 0.1, 0.01], "b": [0.8, 0.0, 0.6], "c": [0.9, -0.45, 0.0]}
+    return [{"id": doc_id, "embedding": vector} for doc_id, vector in vectors.items()]
+
+
+def test_mmr_demotes_near_duplicates():
+    query = [1.0, 0.0, 0.0]
+    ids = [r["id"] for r in search._mmr_select(query, _candidates(), 4, 0.5, 1.01)]
+    assert ids[0] == "a" and ids[-1] == "a_dup"
+    # Con redundancy el casi duplicado se descarta aunque falten resultados
+    assert [r["id"] for r in search._mmr_select(query, _candidates(), 4, 0.5, 0.97)] == ["a", "c", "b"]
+
+
+def test_mmr_with_lambda_one_keeps_relevance_order():
+    ids = [r["id"] for r in search._mmr_select([1.0, 0.0, 0.0], _candidates(), 4, 1.0, 1.01)]
+    assert ids == ["a", "a_dup", "c", "b"]
@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+
+from partitions import physical_collections, split_by_partition
+from snapshot import export_collection, import_collection, read_manifest
+from vector_store import get_chroma_client
+
+
+def _index_partitioned(name, n=30, dim=8):
+    rng = np.random.default_rng(0)
+    ids = [f"doc{i}" for i in range(n)]
+    documents = [f"documento {i}" for i in range(n)]
+    metadatas = [{"cliente": ("ACME", "SUR", "NORTE")[i % 3], "n": i} for i in range(n)]
+    embeddings = rng.normal(size=(n, dim)).astype(np.float32)
+    vectors = dict(zip(ids, embeddings))
+    client = get_chroma_client()
+    for target, (part_ids, part_docs, part_metas) in split_by_partition(
+            name, "cliente", ids, documents, metadatas).items():
+        client.get_or_create_collection(target, metadata={"hnsw:space": "cosine"}).add(
+            ids=part_ids, documents=part_docs, metadatas=part_metas,
+            embeddings=np.stack([vectors[doc_id] for doc_id in part_ids]))
+    return vectors
+
+
+def _read_all(name):
+    client = get_chroma_client()
+    rows = {}
+    for physical in physical_collections(name):
+        data = client.get_collection(physical).get(include=["embeddings", "metadatas"])
+        for doc_id, meta, emb in zip(data["ids"], data["metadatas"], data["embeddings"]):
+            rows[doc_id] = (physical, meta, np.asarray(emb))
+    return rows
+
+
+@pytest.mark.parametrize("suffix", [".arrow", ".parquet"])
+def test_partitioned_export_import_round_trip(chroma_config, tmp_path, suffix):
+    chroma_config({"proy": {"partition_by": "cliente", "sources": []}})
+    vectors = _index_partitioned("proy")
+    before = _read_all("proy")
+    path = str(tmp_path / f"proy{suffix}")
+
+    manifest = export_collection("proy", path)
+    assert manifest["count"] == 30
+    assert sorted(read_manifest(path)["partitions"]) == sorted(physical_collections("proy"))
+
+    import_collection(path, "proy", clear=True)
+    after = _read_all("proy")
+    assert sorted(after) == sorted(before)
+    for doc_id, (physical, meta, emb) in after.items():
+        assert physical == before[doc_id][0]
+        assert meta == before[doc_id][1]
+        np.testing.assert_allclose(emb, vectors[doc_id], rtol=1e-6)
+
+
+def test_partitioned_snapshot_requires_partition_by_on_target(chroma_config, tmp_path):
+    chroma_config({"proy": {"partition_by": "cliente", "sources": []}, "plana": {"sources": []}})
+    _index_partitioned("proy")
+    path = str(tmp_path / "proy.arrow")
+    export_collection("proy", path)
+    with pytest.raises(ValueError, match="partition_by"):
+        import_collection(path, "plana")
+
+
+def test_tune_and_apply_on_partitioned_collection(chroma_config):
+    from hnsw_tune import apply_settings, tune
+
+    chroma_config({"proy": {"partition_by": "cliente", "sources": []}})
+    _index_partitioned("proy", n=60)
+    report = tune("proy", sample=10, k=5, grid={"M": [8], "construction_ef": [100], "search_ef": [10]})
+    assert report["documents"] == 60
+    assert report["partitions"] == 3
+
+    apply_settings("proy", {"M": 8, "construction_ef": 100, "search_ef": 10})
+    client = get_chroma_client()
+    for physical in physical_collections("proy"):
+        assert client.get_collection(physical).metadata["hnsw:M"] == 8
+    assert len(_read_all("proy")) == 60
+
+
+def test_tune_missing_collection_is_value_error(chroma_config):
+    from hnsw_tune import tune
+
+    chroma_config({"proy": {"sources": []}})
+    with pytest.raises(ValueError, match="no existe"):
+        tune("proy")
+
+
+@pytest.mark.parametrize("suffix,dtype", [(".arrow", "float32"), (".parquet", "float32"), (".arrow", "float16")])
+def test_export_import_into_fresh_store(chroma_config, tmp_path, suffix, dtype):
+    chroma_config({"col": {"sources": []}})
+    rng = np.random.default_rng(1)
+    ids = [f"doc{i}" for i in range(40)]
+    vectors = rng.normal(size=(40, 16)).astype(np.float32)
+    metadatas = [{"_source": "s", "n": i, "activo": i % 2 == 0, "nombre": f"ñandú {i}"} for i in range(40)]
+    get_chroma_client().create_collection("col", metadata={"hnsw:space": "cosine", "hnsw:M": 8}).add(
+        ids=ids, embeddings=vectors, documents=[f"texto {i}" for i in ids], metadatas=metadatas)
+    path = str(tmp_path / f"col{suffix}")
+    export_collection("col", path, dtype=dtype, batch_size=15)
+
+    # Otro directorio de ChromaDB: el snapshot es lo único que viaja
+    chroma_config({"col": {"sources": []}}, chroma={"persist_directory": str(tmp_path / "otro")})
+    manifest = import_collection(path, "copia")
+    assert manifest["count"] == 40
+    collection = get_chroma_client().get_collection("copia")
+    assert collection.metadata["hnsw:M"] == 8
+    data = collection.get(ids=ids, include=["embeddings", "metadatas", "documents"])
+    assert data["ids"] == ids
+    assert data["metadatas"] == metadatas
+    assert data["documents"] == [f"texto {i}" for i in ids]
+    np.testing.assert_allclose(np.asarray(data["embeddings"]), vectors, rtol=1e-3 if dtype == "float16" else 1e-6,
+                               atol=1e-3 if dtype == "float16" else 0)
+
+
+def test_import_rejects_other_embedding_model(chroma_config, tmp_path):
+    data = chroma_config({"col": {"sources": []}})
+    get_chroma_client().create_collection("col").add(ids=["a"], embeddings=[[1.0, 0.0]], documents=["a"])
+    path = str(tmp_path / "col.arrow")
+    export_collection("col", path)
+    chroma_config({"col": {"sources": []}}, ollama={**data["ollama"], "embedding_model": "otro-modelo"})
+    with pytest.raises(ValueError, match="--force"):
+        import_collection(path, "copia")
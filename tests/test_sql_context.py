@@ -0,0 +1,32 @@
+from sql_context import render_schema_context, validate_sql
+
+TABLES = {
+    "ventas": ["id (int)", "cliente_id (int)", "total (decimal)", "fecha (date)"],
+    "dbo.clientes": ["id (int)", "nombre (varchar)"],
+}
+
+
+def test_valid_sql_has_no_issues():
+    sql = ("SELECT c.nombre, SUM(v.total) AS monto FROM ventas v JOIN dbo.clientes c ON c.id = v.cliente_id "
+           "WHERE v.fecha >= '2024-01-01' GROUP BY c.nombre ORDER BY monto DESC")
+    assert validate_sql(sql, TABLES) == []
+
+
+def test_unknown_table_is_reported():
+    assert validate_sql("SELECT id FROM pedidos", TABLES) == ["Tabla desconocida: pedidos"]
+
+
+def test_unknown_qualified_and_unqualified_columns_are_reported():
+    assert validate_sql("SELECT v.importe FROM ventas v", TABLES) == ["Columna desconocida: v.importe"]
+    assert validate_sql("SELECT importe, total FROM ventas", TABLES) == ["Columna desconocida: importe"]
+
+
+def test_literals_aliases_and_ctes_are_not_flagged():
+    assert validate_sql("SELECT total AS importe FROM ventas WHERE fecha > 'importe'", TABLES) == []
+    assert validate_sql("WITH t AS (SELECT total FROM ventas) SELECT x FROM t", TABLES) == []
+
+
+def test_render_schema_context_lists_tables():
+    text = render_schema_context(TABLES, "mssql")
+    assert text.splitlines()[0] == "Motor: mssql"
+    assert "- ventas: id (int), cliente_id (int), total (decimal), fecha (date)" in text
@@ -0,0 +1,61 @@
+import duckdb
+import pytest
+
+from sql_guard import _DEFAULTS, apply_row_limit, estimate, preflight
+
+MSSQL = {"type": "mssql"}
+
+
+@pytest.mark.parametrize("source", [{"type": "mariadb"}, {"type": "duckdb"}])
+def test_apply_row_limit_appends_limit(source):
+    assert apply_row_limit(source, "SELECT a FROM t;", 100) == "SELECT a FROM t LIMIT 100"
+
+
+def test_apply_row_limit_uses_top_on_mssql():
+    assert apply_row_limit(MSSQL, "SELECT a FROM t", 100) == "SELECT TOP 100 a FROM t"
+    assert apply_row_limit(MSSQL, "select distinct a from t", 5) == "select distinct TOP 5 a from t"
+
+
+def test_apply_row_limit_keeps_existing_limit():
+    assert apply_row_limit(MSSQL, "SELECT TOP 10 a FROM t", 100) == "SELECT TOP 10 a FROM t"
+    assert apply_row_limit({"type": "duckdb"}, "SELECT a FROM t LIMIT 10", 100) == "SELECT a FROM t LIMIT 10"
+
+
+def test_apply_row_limit_refuses_union():
+    assert apply_row_limit({"type": "duckdb"}, "SELECT a FROM t UNION SELECT a FROM u", 100) is None
+    assert apply_row_limit(MSSQL, "SELECT a FROM t UNION ALL SELECT a FROM u", 100) is None
+
+
+@pytest.fixture
+def duckdb_source(tmp_path):
+    path = str(tmp_path / "t.duckdb")
+    conn = duckdb.connect(path)
+    conn.execute("CREATE TABLE t AS SELECT i AS id, i % 7 AS grupo FROM range(50000) r(i)")
+    conn.close()
+    return {"type": "duckdb", "path": path}
+
+
+def test_duckdb_explain_json_estimates_rows(duckdb_source):
+    est = estimate(duckdb_source, "SELECT id, grupo FROM t")
+    assert est["rows"] == pytest.approx(50000, rel=0.1)
+    assert est["cost"] >= est["rows"]
+
+
+def test_preflight_limit_action_adds_limit_and_timeout(duckdb_source):
+    settings = {**_DEFAULTS, "max_rows": 1000, "action": "limit", "limit_rows": 100, "query_timeout": 30}
+    checked = preflight(duckdb_source, "SELECT id FROM t", settings)
+    assert checked["exceeded"] == ["filas > 1,000"]
+    assert checked["sql"] == "SELECT id FROM t LIMIT 100"
+    assert checked["source"]["query_timeout"] == 30
+
+
+def test_preflight_warn_action_keeps_sql(duckdb_source):
+    checked = preflight(duckdb_source, "SELECT id FROM t", {**_DEFAULTS, "max_rows": 1000})
+    assert checked["exceeded"] and checked["sql"] == "SELECT id FROM t"
+    assert checked["message"].startswith("⚠️")
+
+
+def test_preflight_without_plan_reports_it(duckdb_source):
+    checked = preflight(duckdb_source, "SELECT nada FROM t", _DEFAULTS)
+    assert checked["estimate"] is None
+    assert checked["message"].startswith("Estimación no disponible")
@@ -0,0 +1,87 @@
+import threading
+
+import search
+import sql_context
+
+
+def _stub_sql_path(monkeypatch, retrieval):
+    monkeypatch.setattr(search, "_static_sql_tables", lambda name: {})
+    monkeypatch.setattr(search, "_sql_engine", lambda name: "duckdb")
+    monkeypatch.setattr(search, "_find_sql_source", lambda name, sql: None)
+    monkeypatch.setattr(search, "_speculative_search", retrieval)
+    monkeypatch.setattr(sql_context, "select_schemas",
+                        lambda query, name, results=None, static_tables=None:
+                        {"ventas": ["id", "total"]} if results else dict(static_tables or {}))
+    monkeypatch.setattr(sql_context, "render_schema_context", lambda tables, engine: ", ".join(tables))
+
+
+def test_generation_does_not_wait_for_retrieval(monkeypatch):
+    generating = threading.Event()
+    schemas = []
+
+    def retrieval(cancelled, query, name, n):
+        # Solo termina cuando la generación del SQL ya empezó
+        assert generating.wait(timeout=5)
+        return [{"id": "r1", "document": "ventas", "metadata": {}}]
+
+    def generate(cfg, prompt, name=None):
+        generating.set()
+        schemas.append(prompt)
+        return "```sql\nSELECT total FROM ventas\n```"
+
+    _stub_sql_path(monkeypatch, retrieval)
+    monkeypatch.setattr(search, "_generate", generate)
+    validated = []
+    monkeypatch.setattr(sql_context, "validate_sql", lambda sql, tables: validated.append(dict(tables)) or [])
+
+    output = list(search._sql_path("cuántas ventas hay", "col", {}, None))
+    assert output == ["No se encontró una fuente SQL configurada."]
+    assert "ventas" not in schemas[0].split("Pregunta:")[0]
+    assert "ventas" in validated[0]
+
+
+def test_cancelled_retrieval_skips_the_vector_query(monkeypatch):
+    queried = []
+    monkeypatch.setattr(search, "get_embedding", lambda text: [0.1, 0.2])
+    monkeypatch.setattr(search, "_query_collection", lambda *args: queried.append(args) or [])
+    monkeypatch.setattr(search, "resolve_collections", lambda spec: [spec])
+
+    cancelled = threading.Event()
+    assert search._speculative_search(cancelled, "q", "col", 5) == []
+    cancelled.set()
+    assert search._speculative_search(cancelled, "q", "col", 5) is None
+    embedding, results = search._search_with_embedding("q", "col", 5, None, cancelled=cancelled)
+    assert results is None
+    assert len(queried) == 1
+
+
+def test_invalid_sql_is_repaired_once_before_confirmation(monkeypatch):
+    import query_cache
+    import sql_guard
+
+    _stub_sql_path(monkeypatch, lambda cancelled, query, name, n: None)
+    monkeypatch.setattr(sql_context, "select_schemas",
+                        lambda query, name, results=None, static_tables=None: {"ventas": ["id", "total"]})
+    monkeypatch.setattr(search, "_find_sql_source", lambda name, sql: {"type": "duckdb"})
+    monkeypatch.setattr(query_cache, "get_cache_settings", lambda name: {"enabled": False, "ttl": 0})
+    monkeypatch.setattr(sql_guard, "get_guard_settings", lambda name: {})
+    monkeypatch.setattr(sql_guard, "preflight", lambda source, sql, settings: {
+        "sql": sql, "source": source, "message": "Estimado: ~1 filas", "exceeded": []})
+    prompts = []
+
+    def generate(cfg, prompt, name=None):
+        prompts.append((name, prompt))
+        if name == "llm.repair_sql":
+            return "```sql\nSELECT SUM(total) FROM ventas\n```"
+        return "```sql\nSELECT SUM(importe) FROM ventas\n```"
+
+    monkeypatch.setattr(search, "_generate", generate)
+    steps = search._sql_path("total de ventas", "col", {}, None)
+    confirm = next(steps)
+    steps.close()
+
+    assert confirm[0] == "__SQL_CONFIRM__"
+    assert confirm[1] == "SELECT SUM(total) FROM ventas"
+    assert [name for name, _ in prompts] == ["llm.generate_sql", "llm.repair_sql"]
+    assert "Columna desconocida: importe" in prompts[1][1]
+    assert "Identificadores no encontrados" not in confirm[2]
@@ -0,0 +1,71 @@
+import decimal
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from sql_results import ResultWriter, export_query
+
+
+def test_parquet_decimal_wider_in_later_batch(tmp_path):
+    import duckdb
+
+    db = str(tmp_path / "t.duckdb")
+    conn = duckdb.connect(db)
+    conn.execute("CREATE TABLE t AS SELECT (CASE WHEN i < 100 THEN 1.5 ELSE i * 1000000.25 END)::DECIMAL(18,2) AS d "
+                 "FROM range(200) r(i)")
+    conn.close()
+
+    path = str(tmp_path / "out.parquet")
+    assert export_query({"type": "duckdb", "path": db}, "SELECT d FROM t", path,
+                        batch_size=100, progress=False) == 200
+    values = pq.read_table(path).column("d").to_pylist()
+    assert values[-1] == decimal.Decimal("199000049.75")
+
+
+def test_parquet_int_column_stays_int_until_floats_appear(tmp_path):
+    path = str(tmp_path / "out.parquet")
+    big = 2 ** 62 + 1
+    with ResultWriter(path) as writer:
+        writer.write(["a", "b"], [(big, None)])
+        writer.write(["a", "b"], [(2, 7)])
+    table = pq.read_table(path)
+    assert table.schema.field("a").type == pa.int64()
+    assert table.schema.field("b").type == pa.int64()
+    assert table.to_pylist() == [{"a": big, "b": None}, {"a": 2, "b": 7}]
+
+
+def test_parquet_widens_written_batches_on_conflict(tmp_path, monkeypatch):
+    import sql_results
+
+    # Sin columnas nulas el primer lote ya abre el archivo: el float reescribe lo escrito
+    monkeypatch.setattr(sql_results, "_PENDING_ROWS", 1)
+    path = str(tmp_path / "out.parquet")
+    with ResultWriter(path) as writer:
+        writer.write(["a", "b"], [(1, "x")])
+        writer.write(["a", "b"], [(2.5, 3)])
+    table = pq.read_table(path)
+    assert table.schema.field("a").type == pa.float64()
+    assert table.to_pylist() == [{"a": 1.0, "b": "x"}, {"a": 2.5, "b": "3"}]
+    assert not (tmp_path / "out.parquet.tmp").exists()
+
+
+def test_parquet_round_trip_keeps_source_types(tmp_path):
+    import duckdb
+
+    db = str(tmp_path / "t.duckdb")
+    conn = duckdb.connect(db)
+    conn.execute("CREATE TABLE t AS SELECT i::BIGINT AS n, DATE '2024-01-01' + i::INTEGER AS fecha, "
+                 "(i * 1.25)::DECIMAL(12,2) AS monto, CASE WHEN i >= 150 THEN 'x' || i END AS nota "
+                 "FROM range(200) r(i)")
+    expected = conn.execute("SELECT * FROM t ORDER BY n").fetchall()
+    conn.close()
+
+    path = str(tmp_path / "out.parquet")
+    export_query({"type": "duckdb", "path": db}, "SELECT * FROM t ORDER BY n", path, batch_size=50, progress=False)
+    table = pq.read_table(path)
+    assert table.schema.field("n").type == pa.int64()
+    assert table.schema.field("fecha").type == pa.date32()
+    assert pa.types.is_decimal(table.schema.field("monto").type)
+    assert table.schema.field("monto").type.scale == 2
+    assert table.schema.field("nota").type == pa.string()
+    assert [tuple(row.values()) for row in table.to_pylist()] == expected
@@ -0,0 +1,65 @@
+import json
+import threading
+
+import pytest
+
+import tracing
+from tracing import current, event, last_trace, span
+
+
+@pytest.fixture
+def trace_file(tmp_path, monkeypatch):
+    path = tmp_path / "trace.jsonl"
+    monkeypatch.setitem(tracing._state, "enabled", True)
+    monkeypatch.setitem(tracing._state, "file", str(path))
+    monkeypatch.setitem(tracing._state, "last_trace", [])
+    return path
+
+
+def test_span_tree_is_written_as_json_lines(trace_file):
+    with span("search", collection="col") as root:
+        with span("search.embed"):
+            event("first_token")
+        parent = current()
+
+        def query():
+            # Un hilo del pool cuelga su span del padre que se le pasa
+            with span("search.query", parent=parent):
+                pass
+
+        worker = threading.Thread(target=query)
+        worker.start()
+        worker.join()
+        root.set(results=3)
+
+    records = [json.loads(line) for line in trace_file.read_text(encoding="utf-8").splitlines()]
+    assert [r["name"] for r in records] == ["search", "search.embed", "search.query"]
+    assert len({r["trace_id"] for r in records}) == 1
+    root_id = records[0]["span_id"]
+    assert records[0]["parent_id"] is None
+    assert all(r["parent_id"] == root_id for r in records[1:])
+    assert records[0]["attrs"] == {"collection": "col", "results": 3}
+    assert [e["name"] for e in records[1]["events"]] == ["first_token"]
+    assert last_trace() == records
+
+
+def test_error_is_recorded_on_the_span(trace_file):
+    with pytest.raises(RuntimeError):
+        with span("ask"):
+            raise RuntimeError("falló")
+    assert last_trace()[0]["attrs"]["error"] == "RuntimeError: falló"
+
+
+def test_disabled_tracing_is_a_no_op(tmp_path, monkeypatch):
+    path = tmp_path / "trace.jsonl"
+    monkeypatch.setitem(tracing._state, "enabled", False)
+    monkeypatch.setitem(tracing._state, "file", str(path))
+    monkeypatch.setitem(tracing._state, "last_trace", [])
+
+    with span("search") as s:
+        s.set(rows=1)
+        event("first_token")
+        assert current() is None
+    assert s is tracing._NOOP
+    assert last_trace() == []
+    assert not path.exists()
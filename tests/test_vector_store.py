@@ -0,0 +1,100 @@
+from metadata_index import load_index, match_filters, bitmap_ids, parse_refs
+from vector_store import _add_unique, _write_batch, get_chroma_client, prune_source
+
+
+def _doc(source, rule, estado):
+    return {"_source": source, "estado": estado}, {"_source": source, "rule_id": rule}
+
+
+def test_metadata_that_differs_between_rows_goes_to_each_ref():
+    store = {}
+    for rule, estado in (("r1", "activo"), ("r2", "inactivo")):
+        meta, ref = _doc("docs", rule, estado)
+        _add_unique(store, "doc_a", "texto", meta, ref)
+    refs = store["doc_a"][2]
+    assert [(r["rule_id"], r["estado"]) for r in refs] == [("r1", "activo"), ("r2", "inactivo")]
+
+
+def _write(collection, source, rules):
+    from metadata_index import dump_refs, save_index, update_index
+
+    ids = [f"doc_{r}" for r in rules]
+    metadatas = [{"_source": source, "_refs": dump_refs([{"_source": source, "rule_id": r}])} for r in rules]
+    final, _, _ = _write_batch(collection, ids, [f"texto {r}" for r in rules], metadatas,
+                               embeddings={i: [1.0, 0.0] for i in ids})
+    index = update_index(load_index(collection.name), ids, final)
+    save_index(collection.name, index)
+    return ids
+
+
+def test_prune_source_drops_content_no_longer_generated(chroma_config):
+    chroma_config({"col": {"sources": []}})
+    collection = get_chroma_client().get_or_create_collection("col")
+    _write(collection, "uno", ["a", "b", "c"])
+    _write(collection, "dos", ["c"])
+
+    assert prune_source("col", "uno", {"col": ["doc_a"]}) == 1
+    stored = collection.get(include=["metadatas"])
+    by_id = dict(zip(stored["ids"], stored["metadatas"]))
+    assert sorted(by_id) == ["doc_a", "doc_c"]
+    assert [r["_source"] for r in parse_refs(by_id["doc_c"])] == ["dos"]
+    assert by_id["doc_c"]["_source"] == "dos"
+    index = load_index("col")
+    assert bitmap_ids(index, match_filters(index, {"_source": "uno"})) == ["doc_a"]
+
+
+def test_reindex_replaces_refs_of_the_same_source(chroma_config):
+    chroma_config({"col": {"sources": []}})
+    collection = get_chroma_client().get_or_create_collection("col")
+    _write(collection, "uno", ["a"])
+    meta = {"_source": "uno", "_refs": '[{"_source": "uno", "rule_id": "nueva"}]'}
+    _write_batch(collection, ["doc_a"], ["texto a"], [meta], embeddings={})
+    stored = collection.get(ids=["doc_a"], include=["metadatas"])["metadatas"][0]
+    assert parse_refs(stored) == [{"_source": "uno", "rule_id": "nueva"}]
+
+
+def test_window_chunks_overlap_and_keep_header():
+    import pandas as pd
+
+    from vector_store import chunk_document
+
+    words = [f"w{i:03d}" for i in range(120)]
+    row = pd.Series({"entidad": "Cliente", "descripcion": " ".join(words)})
+    chunks = chunk_document(row, ["entidad", "descripcion"],
+                            {"mode": "window", "max_tokens": 40, "overlap": 10, "header": ["entidad"]})
+    assert len(chunks) > 1
+    assert all(c.startswith("entidad: Cliente | ") for c in chunks)
+    bodies = [c.split(" | ", 1)[1].split() for c in chunks]
+    for previous, current in zip(bodies, bodies[1:]):
+        # La ventana siguiente repite el final de la anterior y avanza
+        assert current[0] in previous and current[0] != previous[0]
+        assert previous[-1] in current
+    assert {w for body in bodies for w in body if w.startswith("w")} == set(words)
+
+
+def test_short_row_is_a_single_chunk():
+    import pandas as pd
+
+    from vector_store import chunk_document, prepare_document
+
+    row = pd.Series({"entidad": "Cliente", "descripcion": "corta"})
+    assert chunk_document(row, ["entidad", "descripcion"], {"max_tokens": 200}) == [
+        prepare_document(row, ["entidad", "descripcion"])
+    ]
+
+
+def test_chunks_share_parent_id_of_the_full_document():
+    import pandas as pd
+
+    from vector_store import _content_id, build_documents, prepare_document
+
+    row = {"id": 1, "entidad": "Cliente", "descripcion": " ".join(f"d{i}" for i in range(300)),
+           "notas": " ".join(f"n{i}" for i in range(300))}
+    source = {"name": "docs", "vectorize": ["entidad", "descripcion", "notas"], "metadata": ["id"],
+              "chunking": {"mode": "field", "max_tokens": 200, "header": ["entidad"]}}
+    ids, documents, metadatas, _ = build_documents(pd.DataFrame([row]), source)
+    parent_id = _content_id("doc", prepare_document(pd.Series(row), source["vectorize"]))
+    assert len(ids) > 2 and all(i.startswith("chunk_") for i in ids)
+    assert {m["parent_id"] for m in metadatas} == {parent_id}
+    assert [m["chunk_index"] for m in metadatas] == list(range(len(ids)))
+    assert {m["chunk_count"] for m in metadatas} == {len(ids)}
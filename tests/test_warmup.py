@@ -0,0 +1,44 @@
+import pytest
+import requests
+
+import warmup
+from benchmarks.stub_ollama import embed_text, start_stub
+from vector_store import get_chroma_client
+
+
+@pytest.fixture
+def stub():
+    server = start_stub(dim=64, embedding_model="test-embed", chat_model="test-chat")
+    yield server
+    server.shutdown()
+
+
+def _index(name, text):
+    collection = get_chroma_client().get_or_create_collection(name, metadata={"hnsw:space": "cosine"})
+    collection.add(ids=["d1"], documents=[text], embeddings=[embed_text(text, 64)])
+
+
+def test_warmup_touches_indexed_collections_with_keep_alive(chroma_config, stub, monkeypatch):
+    chroma_config({"ventas": {"sources": []}, "compras": {"sources": []}, "facturas": {"sources": []}},
+                  ollama={"base_url": stub.base_url, "embedding_model": "test-embed",
+                          "chat_model": "test-chat", "keep_alive": "45m"})
+    _index("ventas", "clientes activos")
+    _index("facturas", "facturas emitidas")
+
+    calls = []
+    post = requests.post
+
+    def spy(url, **kwargs):
+        calls.append((url.rsplit("/", 1)[-1], kwargs.get("json") or {}))
+        return post(url, **kwargs)
+
+    monkeypatch.setattr(requests, "post", spy)
+    rows = warmup.warmup(["ventas", "compras"])
+
+    assert all("error" not in row for row in rows)
+    assert [row["step"] for row in rows[:2]] == ["embedding", "chat"]
+    # "compras" no está indexada (y no se crea) y "facturas" no se pidió
+    assert [row["target"] for row in rows if row["step"] == "índice"] == ["ventas"]
+    assert "compras" not in [c.name for c in get_chroma_client().list_collections()]
+    assert {endpoint for endpoint, _ in calls} == {"embeddings", "generate"}
+    assert all(payload["keep_alive"] == "45m" for _, payload in calls)
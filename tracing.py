@@ -0,0 +1,189 @@
+"""
+Trazas por petición (search / ask / chat) con spans anidados.
+
+    from tracing import span, event
+
+    with span("search", collection=name):
+        with span("search.embed"):
+            ...
+        event("first_token")
+
+Desactivado por defecto: `span()` devuelve un objeto no-op compartido y el
+costo es una comprobación de bandera. Se activa con la sección `tracing` de
+collections.yaml (`enabled`, `file`) o con `/timings` en chat/interactive.
+
+Cada traza terminada (span raíz cerrado) se guarda como la última traza
+(`last_trace()`) y, si hay archivo configurado, se agrega en formato JSON
+lines: un span por línea con trace_id, span_id, parent_id, nombre, inicio,
+duración, atributos y eventos.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+# Atributos que se muestran en el desglose de /timings
+_SUMMARY_ATTRS = ("strategy", "rows", "cancelled", "error")
+
+_state = {"enabled": False, "file": None, "last_trace": []}
+_local = threading.local()
+_lock = threading.Lock()
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+    def event(self, name: str, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    def __init__(self, name: str, parent: Optional["Span"], attrs: Dict[str, Any]):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:8]
+        self.attrs = attrs
+        self.events = []
+        self.children = []
+        self.start = 0.0
+        self.duration = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self._wall = time.time()
+        stack = _stack()
+        stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        if exc_type is GeneratorExit:
+            self.attrs["cancelled"] = True
+        elif exc_type is not None:
+            self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        if self.parent is None:
+            _finish_trace(self)
+        else:
+            with _lock:
+                self.parent.children.append(self)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def event(self, name: str, **attrs):
+        """Marca un instante dentro del span (ej: primer token generado)."""
+        self.events.append({"name": name, "offset_ms": (time.perf_counter() - self.start) * 1000, **attrs})
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        records = [{
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "start": self._wall,
+            "duration_ms": self.duration * 1000,
+            "attrs": self.attrs,
+            "events": self.events,
+        }]
+        for child in sorted(self.children, key=lambda c: c.start):
+            records.extend(child.to_records())
+        return records
+
+
+def _stack() -> List[Span]:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def _finish_trace(root: Span) -> None:
+    records = root.to_records()
+    _state["last_trace"] = records
+    path = _state["file"]
+    if path:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with _lock, open(path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+
+def setup_from_config() -> None:
+    """Lee la sección `tracing` de collections.yaml (enabled, file)."""
+    from config import get_tracing_config
+    cfg = get_tracing_config()
+    _state["enabled"] = bool(cfg.get("enabled", False))
+    path = cfg.get("file")
+    if path and not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(__file__), path)
+    _state["file"] = path
+
+
+def set_enabled(enabled: bool) -> None:
+    _state["enabled"] = enabled
+
+
+def is_enabled() -> bool:
+    return _state["enabled"]
+
+
+def current() -> Optional[Span]:
+    """Span activo en este hilo (para propagarlo a otros hilos con `parent=`)."""
+    stack = _stack() if _state["enabled"] else []
+    return stack[-1] if stack else None
+
+
+def span(name: str, parent: Optional[Span] = None, **attrs):
+    """Abre un span hijo del activo en este hilo (o de `parent`)."""
+    if not _state["enabled"]:
+        return _NOOP
+    if parent is None:
+        stack = _stack()
+        parent = stack[-1] if stack else None
+    return Span(name, parent, attrs)
+
+
+def event(name: str, **attrs) -> None:
+    """Registra un evento en el span activo, si lo hay."""
+    if not _state["enabled"]:
+        return
+    stack = _stack()
+    if stack:
+        stack[-1].event(name, **attrs)
+
+
+def last_trace() -> List[Dict[str, Any]]:
+    return _state["last_trace"]
+
+
+def format_trace(records: Optional[List[Dict[str, Any]]] = None) -> str:
+    """Desglose legible de una traza: un span por línea, indentado por nivel."""
+    records = records if records is not None else _state["last_trace"]
+    if not records:
+        return "  (sin traza)"
+    depth = {}
+    lines = []
+    for record in records:
+        level = depth.get(record["parent_id"], -1) + 1
+        depth[record["span_id"]] = level
+        extra = "".join(f" | {e['name']} {e['offset_ms'] / 1000:.2f}s" for e in record["events"])
+        extra += "".join(f" | {k}={record['attrs'][k]}" for k in _SUMMARY_ATTRS if k in record["attrs"])
+        lines.append(f"  {'  ' * level}{record['name']:<{28 - 2 * level}} {record['duration_ms'] / 1000:>7.2f}s{extra}")
+    return "\n".join(lines)
@@ -1,29 +1,179 @@
 import chromadb
 from chromadb.config import Settings
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import pandas as pd
-from config import get_chroma_config
-from embeddings import get_embeddings_batch
-from db_connector import fetch_distinct_values, fetch_table_schema
+from config import get_chroma_config, get_collection_config
+from embeddings import get_embeddings_batch, truncate_embeddings
+from db_connector import QueryTimeout, fetch_distinct_values, fetch_table_schema
+from metadata_index import (
+    load_index, update_index, save_index, drop_index, rebuild_index, match_filters, bitmap_ids,
+    REFS_KEY, parse_refs, dump_refs, merge_refs
+)
+from index_jobs import source_state, save_job
+from metrics import timed, incr
+from partitions import get_partition_field, physical_collections, plan_writes
+import hashlib
+import itertools
+import json
 import re
+import threading
+
+
+# Un cliente por directorio: crearlo en paralelo desde varios hilos (búsqueda
+# federada o por particiones) no es seguro en ChromaDB
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
 
 
 def get_chroma_client():
     cfg = get_chroma_config()
-    return chromadb.PersistentClient(
-        path=cfg["persist_directory"],
-        settings=Settings(anonymized_telemetry=False)
-    )
+    path = cfg["persist_directory"]
+    with _clients_lock:
+        if path not in _clients:
+            _clients[path] = chromadb.PersistentClient(
+                path=path,
+                settings=Settings(anonymized_telemetry=False)
+            )
+        return _clients[path]
+
+
+# Sección `hnsw` de collections.yaml -> metadata de ChromaDB. M y construction_ef
+# solo se aplican al crear la colección; search_ef se puede cambiar después.
+_HNSW_KEYS = {"M": "hnsw:M", "construction_ef": "hnsw:construction_ef", "search_ef": "hnsw:search_ef"}
+
+
+def get_hnsw_settings(collection_name: str) -> Dict[str, int]:
+    """Parámetros HNSW configurados para la colección (solo los definidos)."""
+    try:
+        cfg = get_collection_config(collection_name).get("hnsw") or {}
+    except ValueError:
+        cfg = {}
+    return {key: int(cfg[key]) for key in _HNSW_KEYS if cfg.get(key) is not None}
+
+
+def get_embedding_dim(collection_name: str, cfg: Optional[Dict[str, Any]] = None) -> Optional[int]:
+    """
+    `embedding_dim` de la colección (None = vectores completos del modelo).
+    `cfg` evita releer collections.yaml si ya se tiene su configuración.
+    """
+    if cfg is None:
+        try:
+            cfg = get_collection_config(collection_name)
+        except ValueError:
+            cfg = {}
+    dim = cfg.get("embedding_dim")
+    return int(dim) if dim else None
+
+
+def collection_metadata(collection_name: str, hnsw: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """Metadata de creación de la colección: espacio coseno, parámetros HNSW y embedding_dim."""
+    settings = get_hnsw_settings(collection_name) if hnsw is None else hnsw
+    metadata = {"hnsw:space": "cosine", **{_HNSW_KEYS[k]: int(v) for k, v in settings.items()}}
+    dim = get_embedding_dim(collection_name)
+    if dim:
+        metadata["embedding_dim"] = dim
+    return metadata
 
 
 def get_or_create_collection(collection_name):
+    """Colección para escribir (index/import): la metadata de creación solo se arma aquí."""
     client = get_chroma_client()
     return client.get_or_create_collection(
         name=collection_name,
-        metadata={"hnsw:space": "cosine"}
+        metadata=collection_metadata(collection_name)
     )
 
 
+def open_collection(collection_name):
+    """Colección existente para leer (None si no se indexó), sin tocar collections.yaml."""
+    try:
+        return get_chroma_client().get_collection(collection_name)
+    except Exception:
+        return None
+
+
+def _dim_mismatch(collection_name: str, collection, configured: Optional[int]) -> Optional[str]:
+    recorded = (collection.metadata or {}).get("embedding_dim")
+    if recorded == configured:
+        return None
+    return (f"La colección '{collection_name}' se indexó con embedding_dim={recorded or 'completo'} y "
+            f"collections.yaml pide {configured or 'completo'}: reindexa con index --clear")
+
+
+def check_embedding_dim(collection_name: str):
+    """
+    Verifica que la colección guarde vectores de la dimensión configurada
+    (ValueError si tiene documentos de otra). Una colección vacía de otra
+    dimensión se recrea. Retorna la colección.
+    """
+    collection = get_or_create_collection(collection_name)
+    message = _dim_mismatch(collection_name, collection, get_embedding_dim(collection_name))
+    if message is None:
+        return collection
+    if collection.count():
+        raise ValueError(message)
+    get_chroma_client().delete_collection(collection_name)
+    return get_or_create_collection(collection_name)
+
+
+def prepare_query_embedding(collection, embedding: List[float], configured_dim: Optional[int]) -> List[float]:
+    """
+    Recorta el embedding de la pregunta a la dimensión guardada en la
+    colección ya abierta. ValueError si no coincide con `configured_dim`
+    (embedding_dim de collections.yaml).
+    """
+    message = _dim_mismatch(collection.name, collection, configured_dim)
+    if message is not None:
+        raise ValueError(message)
+    dim = (collection.metadata or {}).get("embedding_dim")
+    if not dim or len(embedding) == dim:
+        return embedding
+    return truncate_embeddings(embedding, dim).tolist()
+
+
+def current_hnsw(collection) -> Dict[str, int]:
+    """Parámetros HNSW efectivos de una colección existente."""
+    try:
+        hnsw = collection.configuration["hnsw"]
+        return {"M": hnsw["max_neighbors"], "construction_ef": hnsw["ef_construction"],
+                "search_ef": hnsw["ef_search"]}
+    except (AttributeError, KeyError, TypeError):
+        # ChromaDB < 1.0: solo la metadata (defaults de hnswlib si no se definió)
+        meta = collection.metadata or {}
+        return {"M": meta.get("hnsw:M", 16), "construction_ef": meta.get("hnsw:construction_ef", 100),
+                "search_ef": meta.get("hnsw:search_ef", 10)}
+
+
+def set_search_ef(collection, search_ef: int) -> None:
+    """Cambia search_ef de una colección existente (no requiere reconstruir)."""
+    try:
+        collection.modify(configuration={"hnsw": {"ef_search": int(search_ef)}})
+    except TypeError:
+        # ChromaDB < 1.0 no tiene `configuration`: se reescribe la metadata completa
+        collection.modify(metadata={**(collection.metadata or {}), "hnsw:search_ef": int(search_ef)})
+
+
+def sync_hnsw_settings(collection_name: str) -> List[str]:
+    """
+    Aplica `search_ef` de collections.yaml a la colección existente y
+    retorna avisos para M/construction_ef distintos (requieren reconstruir).
+    """
+    settings = get_hnsw_settings(collection_name)
+    if not settings:
+        return []
+    collection = open_collection(collection_name)
+    if collection is None:
+        return []
+    current = current_hnsw(collection)
+    if "search_ef" in settings and settings["search_ef"] != current["search_ef"]:
+        set_search_ef(collection, settings["search_ef"])
+    return [
+        f"hnsw.{key}={settings[key]} en collections.yaml pero la colección tiene {current[key]} "
+        f"(se aplica con index --clear o tune --apply)"
+        for key in ("M", "construction_ef") if key in settings and settings[key] != current[key]
+    ]
+
+
 def prepare_document(row: pd.Series, vectorize_columns: List[str]) -> str:
     parts = []
     for col in vectorize_columns:
@@ -33,6 +183,74 @@ def prepare_document(row: pd.Series, vectorize_columns: List[str]) -> str:
     return " | ".join(parts) if parts else "sin información"
 
 
+# Tokens aproximados: ~4 caracteres por token
+_CHARS_PER_TOKEN = 4
+
+
+def _has_value(value) -> bool:
+    return bool(value) and bool(str(value).strip()) and str(value).lower() not in ["none", "nan"]
+
+
+def _windows(text: str, max_tokens: int, overlap: int) -> List[str]:
+    """Divide `text` en ventanas de ~max_tokens (por palabras) que se solapan ~overlap tokens."""
+    max_chars = max(1, int(max_tokens)) * _CHARS_PER_TOKEN
+    overlap_chars = max(0, int(overlap)) * _CHARS_PER_TOKEN
+    words = text.split()
+    windows, start = [], 0
+    while start < len(words):
+        end, size = start, 0
+        while end < len(words) and (end == start or size + len(words[end]) + 1 <= max_chars):
+            size += len(words[end]) + 1
+            end += 1
+        windows.append(" ".join(words[start:end]))
+        if end >= len(words):
+            break
+        # La siguiente ventana retrocede ~overlap tokens (siempre avanza al menos una palabra)
+        back, kept = end, 0
+        while back > start + 1 and kept + len(words[back - 1]) + 1 <= overlap_chars:
+            back -= 1
+            kept += len(words[back]) + 1
+        start = back
+    return windows
+
+
+def chunk_document(row: pd.Series, vectorize_columns: List[str], chunking: Dict[str, Any]) -> List[str]:
+    """
+    Fragmentos de una fila según `chunking` de la fuente:
+
+        chunking:
+          mode: field          # field: un fragmento por columna | window: ventanas del documento
+          max_tokens: 200      # tamaño máximo (en field, las columnas largas se dividen)
+          overlap: 30          # tokens compartidos entre ventanas consecutivas
+          header: [entidad, tabla]   # columnas que se repiten al inicio de cada fragmento
+
+    Una fila corta queda en un solo fragmento (igual a prepare_document).
+    """
+    max_tokens = int(chunking.get("max_tokens", 200))
+    overlap = int(chunking.get("overlap", 30))
+    header_cols = chunking.get("header") or []
+    header = " | ".join(f"{col}: {row.get(col)}" for col in header_cols if _has_value(row.get(col)))
+    document = prepare_document(row, vectorize_columns)
+    if len(document) <= max_tokens * _CHARS_PER_TOKEN:
+        return [document]
+
+    if chunking.get("mode", "field") == "window":
+        bodies = _windows(document, max_tokens, overlap)
+    else:
+        bodies = []
+        for col in vectorize_columns:
+            value = row.get(col)
+            if col in header_cols or not _has_value(value):
+                continue
+            text = f"{col}: {value}"
+            bodies.extend(_windows(text, max_tokens, overlap) if len(text) > max_tokens * _CHARS_PER_TOKEN else [text])
+    # Las ventanas pueden cortar junto a un separador " | "
+    bodies = [b.strip(" |") for b in bodies if b.strip(" |")]
+    if not bodies:
+        return [document]
+    return [f"{header} | {body}" if header else body for body in bodies]
+
+
 def prepare_metadata(row: pd.Series, metadata_columns: List[str], source_name: str) -> Dict[str, Any]:
     metadata = {"_source": source_name}
     for col in metadata_columns:
@@ -55,35 +273,180 @@ def _split_list(value) -> List[str]:
     return [p.strip() for p in parts if p.strip()]
 
 
-def index_source(df: pd.DataFrame, collection_name: str, source_config: dict, batch_size: int = 100):
-    """Indexa los datos de un source en la colección."""
+def _content_id(kind: str, document: str) -> str:
+    """ID estable derivado del contenido: documentos idénticos comparten ID."""
+    digest = hashlib.sha1(document.encode("utf-8")).hexdigest()[:16]
+    return f"{kind}_{digest}"
+
+
+def _row_ref(row: pd.Series, source_name: str, rule_id) -> Dict[str, str]:
+    """Referencia (fuente, regla, cliente...) de un documento a la fila que lo originó."""
+    ref = {"_source": source_name, "rule_id": str(rule_id)}
+    for key in ("cliente", "proyecto", "entidad"):
+        value = row.get(key)
+        if value is not None and str(value).strip() != "" and str(value).lower() not in ["none", "nan"]:
+            ref[key] = str(value)
+    return ref
+
+
+# Metadata propia de cada fragmento: no describe la fila de origen
+_CHUNK_KEYS = ("parent_id", "chunk_index", "chunk_count")
+
+
+def _merge_row_refs(base: Dict[str, Any], refs: List[Dict[str, str]], metadata: Dict[str, Any],
+                    new_refs: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """
+    Referencias de un documento que vuelve a aparecer (otra fila u otra fuente).
+
+    La metadata escalar es la de la primera fila: un campo que otra fila trae
+    con otro valor (o que la primera no tiene) pasa a cada referencia, así
+    los filtros (índice de metadata) y `_expand_refs` ven el valor de cada fila.
+    """
+    known = {k for ref in refs for k in ref}
+    varying = [
+        k for k, v in metadata.items()
+        if k != REFS_KEY and k not in _CHUNK_KEYS and (k in known or str(base.get(k)) != str(v))
+    ]
+    old = [{**{k: str(base[k]) for k in varying if k in base and k not in ref}, **ref} for ref in refs]
+    new = [{**{k: str(metadata[k]) for k in varying if k not in ref}, **ref} for ref in new_refs]
+    return merge_refs(old, new)
+
+
+def _add_unique(store: Dict[str, list], doc_id: str, document: str, metadata: Dict[str, Any], ref: Dict[str, str]):
+    """Registra el documento una sola vez; si ya existe solo suma la referencia."""
+    if doc_id in store:
+        store[doc_id][2] = _merge_row_refs(store[doc_id][1], store[doc_id][2], metadata, [ref])
+    else:
+        store[doc_id] = [document, metadata, [ref]]
+
+
+def _write_batch(collection, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]],
+                 embeddings: Optional[Dict[str, List[float]]] = None):
+    """
+    Escribe un lote deduplicado contra lo ya almacenado.
+
+    Los IDs que ya existen en la colección (mismo contenido indexado por otra
+    fuente) no se re-embeben: solo se fusionan sus referencias. Las
+    referencias que el documento ya tenía de las mismas fuentes se reemplazan
+    por las del lote (son las de la indexación actual). `embeddings`
+    permite pasar vectores ya calculados (id -> vector), como hacen los
+    workers de la indexación en paralelo.
+    Retorna (metadatas finales, nuevos, fusionados).
+    """
+    with timed("index.write"):
+        existing = collection.get(ids=ids, include=["metadatas"])
+    stored = dict(zip(existing["ids"], existing["metadatas"]))
+
+    final_metadatas = []
+    new_idx, merged_idx = [], []
+    for i, (doc_id, meta) in enumerate(zip(ids, metadatas)):
+        if doc_id in stored:
+            merged = dict(stored[doc_id])
+            incoming = parse_refs(meta)
+            sources = {ref.get("_source") for ref in incoming}
+            others = [ref for ref in parse_refs(stored[doc_id]) if ref.get("_source") not in sources]
+            merged[REFS_KEY] = dump_refs(_merge_row_refs(stored[doc_id], others, meta, incoming))
+            final_metadatas.append(merged)
+            merged_idx.append(i)
+        else:
+            final_metadatas.append(meta)
+            new_idx.append(i)
+
+    if merged_idx:
+        with timed("index.write"):
+            collection.update(
+                ids=[ids[i] for i in merged_idx],
+                metadatas=[final_metadatas[i] for i in merged_idx]
+            )
+        incr("docs.merged", len(merged_idx))
+    if new_idx:
+        new_documents = [documents[i] for i in new_idx]
+        vectors = dict(embeddings or {})
+        missing = [i for i in new_idx if ids[i] not in vectors]
+        if missing:
+            vectors.update(zip(
+                [ids[i] for i in missing],
+                get_embeddings_batch([documents[i] for i in missing], show_progress=False)
+            ))
+        new_vectors = [vectors[ids[i]] for i in new_idx]
+        dim = (collection.metadata or {}).get("embedding_dim")
+        if dim:
+            # embedding_dim: se guardan los vectores recortados y renormalizados
+            new_vectors = truncate_embeddings(new_vectors, dim).tolist()
+        new_metadatas = [final_metadatas[i] for i in new_idx]
+        with timed("index.write"):
+            collection.add(
+                ids=[ids[i] for i in new_idx],
+                embeddings=new_vectors,
+                documents=new_documents,
+                metadatas=new_metadatas
+            )
+        incr("docs.written", len(new_idx))
+        # Estimación: texto + vectores float32 + metadata serializada
+        incr("bytes.written", sum(len(d.encode("utf-8")) for d in new_documents)
+             + sum(4 * len(v) for v in new_vectors)
+             + sum(len(json.dumps(m, ensure_ascii=False).encode("utf-8")) for m in new_metadatas))
+    return final_metadatas, len(new_idx), len(merged_idx)
+
+
+def build_documents(df: pd.DataFrame, source_config: dict, state: Optional[Dict[str, Any]] = None,
+                    on_enrich=None):
+    """
+    Prepara los documentos únicos de un source (filas + enrichment SQL).
+
+    `state` es el estado de la fuente en un job de indexación (index_jobs):
+    los esquemas/catálogos ya obtenidos se reutilizan y los nuevos se
+    registran en él; `on_enrich(tipo, clave, valor)` se invoca tras cada
+    consulta exitosa para persistir el checkpoint. Las claves que fallan no
+    se registran, así un `--resume` las vuelve a intentar.
+
+    Retorna (ids, documents, metadatas, claves de enrichment fallidas).
+    """
     source_name = source_config["name"]
     vectorize_cols = source_config["vectorize"]
     metadata_cols = source_config["metadata"]
 
-    collection = get_or_create_collection(collection_name)
+    chunking = source_config.get("chunking")
 
     print(f"  Preparando documentos de '{source_name}'...")
-    documents = [prepare_document(row, vectorize_cols) for _, row in df.iterrows()]
-    metadatas = [prepare_metadata(row, metadata_cols, source_name) for _, row in df.iterrows()]
-
-    # IDs únicos: source_name + id o índice
-    if "id" in df.columns:
-        ids = [f"{source_name}_{row['id']}" for _, row in df.iterrows()]
-    else:
-        ids = [f"{source_name}_{i}" for i in range(len(df))]
-
+    unique = {}
+    with timed("index.prepare"):
+        for idx, row in df.iterrows():
+            document = prepare_document(row, vectorize_cols)
+            rule_id = row.get("id", idx)
+            metadata = prepare_metadata(row, metadata_cols, source_name)
+            ref = _row_ref(row, source_name, rule_id)
+            chunks = chunk_document(row, vectorize_cols, chunking) if chunking else [document]
+            if len(chunks) == 1:
+                _add_unique(unique, _content_id("doc", document), document, metadata, ref)
+                continue
+            # Fragmentos de una fila larga: comparten parent_id (el id del documento completo)
+            parent_id = _content_id("doc", document)
+            for i, chunk in enumerate(chunks):
+                _add_unique(
+                    unique,
+                    _content_id("chunk", f"{parent_id}|{chunk}"),
+                    chunk,
+                    {**metadata, "parent_id": parent_id, "chunk_index": i, "chunk_count": len(chunks)},
+                    ref
+                )
+            incr("docs.chunked")
+
+    failed = 0
     sql_enrich = source_config.get("sql_enrich")
     if sql_enrich:
         max_values = int(sql_enrich.get("max_values", 50))
         include_schema = bool(sql_enrich.get("include_schema", False))
         max_columns = int(sql_enrich.get("max_columns", 200))
-        extra_documents = []
-        extra_metadatas = []
-        extra_ids = []
-        distinct_cache = {}
-        schema_cache = {}
-        schema_added = set()
+        enrich_state = state["enrich"] if state is not None else {"schema": {}, "distinct": {}}
+        schema_cache = dict(enrich_state["schema"])
+        distinct_cache = {
+            tuple(key.split("|", 1)): values for key, values in enrich_state["distinct"].items()
+        }
+        if schema_cache or distinct_cache:
+            print(f"  Enrichment reanudado: {len(schema_cache)} esquemas y "
+                  f"{len(distinct_cache)} catalogos desde el checkpoint")
+        enrich_before = len(unique)
 
         print(f"  Enriqueciendo con catalogos (max {max_values} valores)...")
         for idx, row in df.iterrows():
@@ -93,56 +456,68 @@ def index_source(df: pd.DataFrame, collection_name: str, source_config: dict, ba
             if not table or not dims:
                 table = None if not table else str(table)
             rule_id = row.get("id", idx)
+            ref = _row_ref(row, source_name, rule_id)
 
             if include_schema and table:
                 schema_key = str(table)
-                if (rule_id, schema_key) not in schema_added:
-                    if schema_key not in schema_cache:
-                        try:
+                if schema_key in schema_cache:
+                    incr("enrich.cache_hits")
+                else:
+                    try:
+                        incr("enrich.queries")
+                        with timed("index.enrich"):
                             schema_cache[schema_key] = fetch_table_schema(
                                 sql_enrich, schema_key, max_columns=max_columns
                             )
-                        except Exception as e:
-                            print(f"    Esquema omitido {schema_key}: {e}")
-                            schema_cache[schema_key] = []
-                    schema_cols = schema_cache.get(schema_key, [])
-                    if schema_cols:
-                        doc = f"Esquema {schema_key}: {', '.join(schema_cols)}"
-                        extra_documents.append(doc)
-                        extra_ids.append(f"{source_name}_{rule_id}_schema_{schema_key}")
-                        meta = {
-                            "_source": source_name,
-                            "kind": "schema",
-                            "rule_id": str(rule_id),
-                            "tabla": schema_key
-                        }
-                        for key in ("cliente", "proyecto", "entidad"):
-                            value = row.get(key)
-                            if value is not None and str(value).strip() != "":
-                                meta[key] = str(value)
-                        extra_metadatas.append(meta)
-                    schema_added.add((rule_id, schema_key))
+                        enrich_state["schema"][schema_key] = schema_cache[schema_key]
+                        if on_enrich:
+                            on_enrich("schema", schema_key, schema_cache[schema_key])
+                    except Exception as e:
+                        # Un timeout omite solo esta clave (no queda en el checkpoint: se reintenta al reanudar)
+                        print(f"    Esquema omitido {schema_key}: {e}")
+                        schema_cache[schema_key] = []
+                        failed += 1
+                        incr("enrich.timeouts" if isinstance(e, QueryTimeout) else "enrich.failures")
+                schema_cols = schema_cache.get(schema_key, [])
+                if schema_cols:
+                    doc = f"Esquema {schema_key}: {', '.join(schema_cols)}"
+                    meta = {
+                        "_source": source_name,
+                        "kind": "schema",
+                        "rule_id": str(rule_id),
+                        "tabla": schema_key
+                    }
+                    for key in ("cliente", "proyecto", "entidad"):
+                        if key in ref:
+                            meta[key] = ref[key]
+                    _add_unique(unique, _content_id("schema", doc), doc, meta, ref)
 
             if not table or not dims:
                 continue
             for dim in dims:
                 cache_key = (str(table), str(dim))
-                if cache_key not in distinct_cache:
+                if cache_key in distinct_cache:
+                    incr("enrich.cache_hits")
+                else:
                     try:
-                        distinct_cache[cache_key] = fetch_distinct_values(
-                            sql_enrich, str(table), str(dim), limit=max_values
-                        )
+                        incr("enrich.queries")
+                        with timed("index.enrich"):
+                            distinct_cache[cache_key] = fetch_distinct_values(
+                                sql_enrich, str(table), str(dim), limit=max_values
+                            )
+                        enrich_state["distinct"]["|".join(cache_key)] = distinct_cache[cache_key]
+                        if on_enrich:
+                            on_enrich("distinct", "|".join(cache_key), distinct_cache[cache_key])
                     except Exception as e:
                         print(f"    Catalogo omitido {table}.{dim}: {e}")
                         distinct_cache[cache_key] = []
+                        failed += 1
+                        incr("enrich.timeouts" if isinstance(e, QueryTimeout) else "enrich.failures")
                 values = distinct_cache[cache_key]
                 if not values:
                     continue
 
                 doc = f"Catalogo {table}.{dim}: {', '.join(values)}"
-                extra_documents.append(doc)
-                extra_ids.append(f"{source_name}_{rule_id}_catalog_{table}_{dim}")
-
                 meta = {
                     "_source": source_name,
                     "kind": "catalog",
@@ -151,49 +526,199 @@ def index_source(df: pd.DataFrame, collection_name: str, source_config: dict, ba
                     "columna": str(dim)
                 }
                 for key in ("cliente", "proyecto", "entidad"):
-                    value = row.get(key)
-                    if value is not None and str(value).strip() != "":
-                        meta[key] = str(value)
-                extra_metadatas.append(meta)
+                    if key in ref:
+                        meta[key] = ref[key]
+                _add_unique(unique, _content_id("catalog", doc), doc, meta, ref)
+
+        print(f"  Catalogos/esquemas únicos generados: {len(unique) - enrich_before}")
+
+    ids = list(unique.keys())
+    documents = [unique[doc_id][0] for doc_id in ids]
+    metadatas = []
+    for doc_id in ids:
+        meta = dict(unique[doc_id][1])
+        meta[REFS_KEY] = dump_refs(unique[doc_id][2])
+        metadatas.append(meta)
+    incr("docs.prepared", len(ids))
+    return ids, documents, metadatas, failed
+
+
+def resume_offset(state: Optional[Dict[str, Any]], ids: List[str]) -> int:
+    """
+    Offset desde el que reanudar una fuente.
+
+    Solo se respeta el offset del checkpoint si la lista de IDs es la misma
+    (digest); si cambió, el estado se reinicia a 0.
+    """
+    if state is None:
+        return 0
+    ids_digest = hashlib.sha1("\n".join(ids).encode("utf-8")).hexdigest()
+    if state.get("ids_digest") == ids_digest:
+        return min(state.get("offset", 0), len(ids))
+    state["offset"] = 0
+    state["ids_digest"] = ids_digest
+    return 0
+
+
+def index_source(df: pd.DataFrame, collection_name: str, source_config: dict, batch_size: int = 100,
+                 job: Optional[Dict[str, Any]] = None, prune: bool = False):
+    """
+    Indexa los datos de un source en la colección.
+
+    Los documentos se deduplican por contenido: cada texto único se embebe y
+    almacena una vez, con la lista de reglas/fuentes/clientes que lo generan
+    en la metadata `_refs` (ver search._expand_refs).
+
+    Con `job` (index_jobs) cada lote confirmado en ChromaDB actualiza el
+    checkpoint; si el job trae un offset para la misma lista de IDs, se
+    reanuda desde ese lote. Un lote repetido tras una caída es idempotente:
+    sus IDs ya almacenados solo fusionan referencias y no se re-embeben.
+
+    Con `partition_by` en la colección cada documento se escribe en la
+    partición de su valor (ver partitions.py).
+
+    Con `prune` (indexación completa de la fuente, sin --limit) al terminar
+    sin fallas se quitan sus referencias al contenido que ya no genera
+    (ver prune_source).
+    """
+    source_name = source_config["name"]
+
+    state = source_state(job, source_name) if job is not None else None
+
+    def checkpoint(*_):
+        if job is not None:
+            save_job(job)
+
+    ids, documents, metadatas, failed = build_documents(df, source_config, state, on_enrich=checkpoint)
 
-        if extra_documents:
-            print(f"  Catalogos generados: {len(extra_documents)}")
-            documents.extend(extra_documents)
-            metadatas.extend(extra_metadatas)
-            ids.extend(extra_ids)
+    # Lista plana (colección, posición): los lotes y el checkpoint recorren todas las particiones
+    targets, entries, keys = plan_writes(collection_name, ids, documents, metadatas)
+
+    total = len(entries)
+    start = resume_offset(state, keys)
+    if start:
+        print(f"  Reanudando '{source_name}' desde el lote confirmado {start}/{total}")
+    checkpoint()
 
     print(f"  Generando embeddings para '{source_name}'...")
-    total = len(documents)
+    collections, meta_indexes = {}, {}
+    embedded = 0
+    merged = 0
 
-    for i in range(0, total, batch_size):
+    for i in range(start, total, batch_size):
         end = min(i + batch_size, total)
 
-        batch_embeddings = get_embeddings_batch(documents[i:end], show_progress=False)
-
-        collection.add(
-            ids=ids[i:end],
-            embeddings=batch_embeddings,
-            documents=documents[i:end],
-            metadatas=metadatas[i:end]
-        )
+        for name, group in itertools.groupby(entries[i:end], key=lambda e: e[0]):
+            positions = [j for _, j in group]
+            target_ids, target_documents, target_metadatas = targets[name]
+            if name not in collections:
+                collections[name] = get_or_create_collection(name)
+                meta_indexes[name] = load_index(name)
+            batch_ids = [target_ids[j] for j in positions]
+            final_metadatas, n_new, n_merged = _write_batch(
+                collections[name], batch_ids,
+                [target_documents[j] for j in positions], [target_metadatas[j] for j in positions]
+            )
+            embedded += n_new
+            merged += n_merged
+            meta_indexes[name] = update_index(meta_indexes[name], batch_ids, final_metadatas)
+            if state is not None:
+                save_index(name, meta_indexes[name])
+
+        if state is not None:
+            state["offset"] = end
+            checkpoint()
 
         print(f"  Indexados: {end}/{total} ({end / total * 100:.1f}%)")
 
-    print(f"  '{source_name}' completado: {total} documentos")
+    for name, meta_index in meta_indexes.items():
+        if meta_index is not None:
+            save_index(name, meta_index)
+    if state is not None:
+        # Con claves de enrichment fallidas la fuente queda "partial" y un
+        # --resume la reprocesa (solo se consultan las claves pendientes)
+        state["status"] = "partial" if failed else "done"
+        checkpoint()
+    if failed:
+        print(f"  ⚠️  {failed} consultas de enrichment fallidas (se reintentan con --resume)")
+    elif prune:
+        prune_source(collection_name, source_name, {name: target[0] for name, target in targets.items()})
+    print(f"  '{source_name}' completado: {total} documentos únicos "
+          f"({embedded} nuevos, {merged} ya existentes con referencias fusionadas)")
+
+
+def prune_source(collection_name: str, source_name: str, kept: Dict[str, List[str]]) -> int:
+    """
+    Quita las referencias de `source_name` a documentos que su última
+    indexación completa ya no generó (`kept`: IDs escritos por colección
+    física). Un documento sin referencias se elimina; uno que sigue
+    referenciado por otras fuentes toma su metadata escalar de ellas.
+    Retorna cuántos documentos se eliminaron.
+    """
+    deleted = 0
+    for name in physical_collections(collection_name):
+        meta_index = load_index(name)
+        collection = open_collection(name)
+        if meta_index is None or collection is None:
+            continue
+        current = set(kept.get(name, ()))
+        stale = [doc_id for doc_id in bitmap_ids(meta_index, match_filters(meta_index, {"_source": source_name}))
+                 if doc_id not in current]
+        if not stale:
+            continue
+
+        data = collection.get(ids=stale, include=["metadatas"])
+        remove, update_ids, update_metadatas = [], [], []
+        for doc_id, meta in zip(data["ids"], data["metadatas"]):
+            remaining = [ref for ref in parse_refs(meta) if ref.get("_source") != source_name]
+            if not remaining:
+                remove.append(doc_id)
+                continue
+            meta = dict(meta)
+            for key in dict.fromkeys(k for ref in remaining for k in ref):
+                meta[key] = next(ref[key] for ref in remaining if key in ref)
+            meta[REFS_KEY] = dump_refs(remaining)
+            update_ids.append(doc_id)
+            update_metadatas.append(meta)
+        with timed("index.write"):
+            if remove:
+                collection.delete(ids=remove)
+            if update_ids:
+                collection.update(ids=update_ids, metadatas=update_metadatas)
+        rebuild_index(name, collection)
+        deleted += len(remove)
+        incr("docs.pruned", len(remove))
+        print(f"  '{source_name}' en '{name}': {len(remove)} documentos que ya no genera eliminados, "
+              f"{len(update_ids)} con sus referencias quitadas")
+    return deleted
 
 
 def get_collection_stats(collection_name):
-    collection = get_or_create_collection(collection_name)
+    if not get_partition_field(collection_name):
+        collection = open_collection(collection_name)
+        return {
+            "collection_name": collection_name,
+            "total_documents": collection.count() if collection is not None else 0
+        }
+    client = get_chroma_client()
+    partitions = {name: client.get_collection(name).count() for name in physical_collections(collection_name)}
     return {
         "collection_name": collection_name,
-        "total_documents": collection.count()
+        "total_documents": sum(partitions.values()),
+        "partitions": partitions
     }
 
 
 def clear_collection(collection_name):
     client = get_chroma_client()
-    try:
-        client.delete_collection(collection_name)
-        print(f"Colección '{collection_name}' eliminada")
-    except Exception:
-        print(f"La colección '{collection_name}' no existía")
+    names = [collection_name]
+    if get_partition_field(collection_name):
+        names += physical_collections(collection_name)
+    for name in names:
+        drop_index(name)
+        try:
+            client.delete_collection(name)
+            print(f"Colección '{name}' eliminada")
+        except Exception:
+            if name == collection_name and len(names) == 1:
+                print(f"La colección '{collection_name}' no existía")
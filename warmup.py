@@ -0,0 +1,98 @@
+"""
+Precarga de modelos de Ollama e índices de ChromaDB (python main.py warmup).
+
+La primera consulta tras un periodo inactivo paga la carga del modelo de
+embeddings, la del modelo de chat y la lectura del índice HNSW de la
+colección. warmup hace cada paso dos veces y reporta la latencia en frío
+(primera llamada) y en caliente (segunda):
+
+  - embedding de prueba con el modelo de embeddings
+  - generación de 1 token con el modelo de chat
+  - una consulta por colección configurada que ya exista en ChromaDB
+
+Las llamadas llevan `keep_alive` (sección ollama) para que los modelos
+queden cargados. mcp_server.py lo corre en segundo plano al iniciar.
+"""
+
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from config import get_ollama_config, list_collections
+from embeddings import get_embedding, request_options
+from partitions import physical_collections
+from vector_store import get_chroma_client, get_embedding_dim, prepare_query_embedding
+
+_PROMPT = "warmup"
+
+
+def _timed_twice(fn: Callable[[], Any]) -> Dict[str, Any]:
+    """Corre `fn` dos veces: {cold_ms, warm_ms} o {error}."""
+    times = []
+    try:
+        for _ in range(2):
+            start = time.perf_counter()
+            fn()
+            times.append((time.perf_counter() - start) * 1000)
+    except Exception as e:
+        return {"error": str(e).splitlines()[0] if str(e) else type(e).__name__}
+    return {"cold_ms": times[0], "warm_ms": times[1]}
+
+
+def _generate_one_token(cfg: Dict[str, Any]) -> None:
+    import requests
+
+    response = requests.post(
+        f"{cfg['base_url']}/api/generate",
+        json={"model": cfg["chat_model"], "prompt": _PROMPT, "stream": False,
+              "options": {"num_predict": 1}, **request_options(cfg)}
+    )
+    if response.status_code != 200:
+        raise Exception(f"Error de Ollama: {response.text}")
+
+
+def warmup(collections: Optional[List[str]] = None, chat: bool = True) -> List[Dict[str, Any]]:
+    """
+    Precarga modelos e índices. Retorna una fila por paso:
+    {"step", "target", "cold_ms", "warm_ms"} o {"step", "target", "error"}.
+    """
+    cfg = get_ollama_config()
+    rows = [{"step": "embedding", "target": cfg["embedding_model"], **_timed_twice(lambda: get_embedding(_PROMPT))}]
+    if chat:
+        rows.append({"step": "chat", "target": cfg["chat_model"], **_timed_twice(lambda: _generate_one_token(cfg))})
+
+    embedding = None
+    if "error" not in rows[0]:
+        embedding = get_embedding(_PROMPT)
+    client = get_chroma_client()
+    names = collections if collections is not None else list_collections()
+    for name in [p for logical in names for p in physical_collections(logical)]:
+        try:
+            collection = client.get_collection(name)
+        except Exception:
+            continue  # sin indexar: no se crea una colección vacía
+        if embedding is None:
+            # Sin Ollama: un vector cualquiera de la colección sirve para tocar el índice
+            sample = collection.get(limit=1, include=["embeddings"])
+            if len(sample["ids"]) == 0:
+                continue
+            query = list(sample["embeddings"][0])
+        else:
+            try:
+                query = prepare_query_embedding(collection, embedding, get_embedding_dim(name))
+            except ValueError as e:
+                rows.append({"step": "índice", "target": name, "error": str(e)})
+                continue
+        rows.append({"step": "índice", "target": name, **_timed_twice(
+            lambda: collection.query(query_embeddings=[query], n_results=1, include=["distances"]))})
+    return rows
+
+
+def print_warmup_report(rows: List[Dict[str, Any]], print_fn: Callable[[str], None] = print) -> None:
+    print_fn(f"\n  {'Paso':<11}{'Destino':<28}{'frío ms':>10}{'caliente ms':>13}")
+    for row in rows:
+        if "error" in row:
+            print_fn(f"  {row['step']:<11}{row['target']:<28}  ✗ {row['error']}")
+        else:
+            print_fn(f"  {row['step']:<11}{row['target']:<28}{row['cold_ms']:>10.1f}{row['warm_ms']:>13.1f}")
+    keep_alive = get_ollama_config().get("keep_alive")
+    print_fn(f"\n  keep_alive: {keep_alive if keep_alive is not None else 'default de Ollama (5m)'}")